@@ -0,0 +1,370 @@
+#----------------------------------------------------------------------------#
+# JSON API, version 1 (/api/v1).
+#
+#   GET /api/v1/venues             GET /api/v1/venues/<id>
+#   GET /api/v1/artists            GET /api/v1/artists/<id>
+#   GET /api/v1/shows              GET /api/v1/shows/<id>
+#
+# ?fields=id,name,city selects the fields of every item; only those columns
+# (and the joins they need) are SELECTed. Lists are keyset-paginated:
+# ?limit=<n> items per page and ?after=<next_cursor of the previous page>.
+#
+#   POST /api/v1/shows/recurring
+#   {"venue_id": 3, "artist_id": 7, "start_time": "2026-11-06T20:00",
+#    "end_time": "2026-11-06T23:00", "weeks": 12, "weekdays": ["FR", "SA"]}
+#
+# books a residency: the show on each of weekdays (default: the weekday of
+# start_time) for weeks weeks, at the time of start_time, each lasting as
+# long as the first (end_time defaults as for /shows/create). Every
+# occurrence is checked for conflicts (see bookings.py) in one pass; either
+# all are created, with one INSERT, or none (409 and the conflicts).
+# Bodies are serialized with orjson when it is installed (stdlib json
+# otherwise) and compressed with brotli (when the `brotli` package is
+# installed) or gzip, as the client accepts.
+#----------------------------------------------------------------------------#
+
+import base64
+import gzip
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, request
+
+from models import app, db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from sqlstats import query_budget
+from replicas import read_replica
+from cache import invalidate, show_pages
+from counters import count_shows
+from bookings import WEEKDAYS, show_end_time, check_times, weekly_times, find_conflicts, conflict_message
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class ApiError(Exception):
+
+  def __init__(self, message, status=400, details=None):
+    super().__init__(message)
+    self.message = message
+    self.status = status
+    self.details = details or {}  # more fields of the error body
+
+
+class Resource:
+
+  def __init__(self, model, columns, cursor_columns, joins=None, genre_table=None):
+    self.model = model
+    self.columns = columns                # field name -> column
+    self.cursor_columns = cursor_columns  # keyset order, unique
+    self.joins = joins or {}              # joined model -> foreign key on model
+    self.genre_table = genre_table        # association table for 'genres'
+    self.fields = list(columns) + (['genres'] if genre_table is not None else [])
+
+
+def entity_columns(model, names):
+  return {name: getattr(model, name) for name in names}
+
+ENTITY_FIELDS = ('id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website',
+                 'seeking_description', 'upcoming_shows_count', 'past_shows_count')
+
+VENUES = Resource(
+  Venue,
+  entity_columns(Venue, ENTITY_FIELDS + ('address', 'seeking_talent')),
+  [Venue.id],
+  genre_table=venue_genres)
+
+ARTISTS = Resource(
+  Artist,
+  entity_columns(Artist, ENTITY_FIELDS + ('seeking_venue',)),
+  [Artist.id],
+  genre_table=artist_genres)
+
+SHOWS = Resource(
+  Show,
+  {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'end_time': Show.end_time,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'venue_image_link': Venue.image_link,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+  },
+  [Show.start_time, Show.id],
+  joins={Venue: Show.venue_id, Artist: Show.artist_id})
+
+#----------------------------------------------------------------------------#
+# Serialization
+#----------------------------------------------------------------------------#
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+  # orjson writes datetimes in the same ISO 8601 form as json_default
+  if orjson is not None:
+    return orjson.dumps(payload)
+  return json.dumps(payload, default=json_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+  return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def encode_cursor(values):
+  return base64.urlsafe_b64encode(dumps(list(values))).decode('ascii')
+
+
+def decode_cursor(resource, cursor):
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if len(values) != len(resource.cursor_columns):
+      raise ValueError(cursor)
+    return tuple(datetime.fromisoformat(value) if column.type.python_type is datetime else int(value)
+                 for column, value in zip(resource.cursor_columns, values))
+  except (ValueError, TypeError):
+    raise ApiError('Invalid cursor.')
+
+
+def body_integer(body, name):
+  value = body.get(name)
+  if not isinstance(value, int) or isinstance(value, bool):
+    raise ApiError(f'{name} must be an integer.')
+  return value
+
+
+def body_time(body, name, required=True):
+  value = body.get(name)
+  if value is None and not required:
+    return None
+  try:
+    value = datetime.fromisoformat(value)
+  except (TypeError, ValueError):
+    raise ApiError(f'{name} must be an ISO 8601 date and time.')
+  # show times are stored as local times
+  if value.tzinfo is not None:
+    raise ApiError(f'{name} must be a local time, without a UTC offset.')
+  return value
+
+#----------------------------------------------------------------------------#
+# Queries
+#----------------------------------------------------------------------------#
+
+def requested_fields(resource):
+  fields = request.args.get('fields')
+  if not fields:
+    return resource.fields
+  names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+  unknown = [name for name in names if name not in resource.fields]
+  if unknown or not names:
+    raise ApiError(f'Unknown fields: {", ".join(unknown)}. Available fields: {", ".join(resource.fields)}.')
+  return names
+
+
+def select_items(resource, fields, filters=(), limit=None):
+  # the requested columns, followed by the cursor columns; joins are only
+  # added for the models whose columns were requested
+  columns = [resource.columns[name] for name in fields if name in resource.columns]
+  query = db.session.query(*columns, *resource.cursor_columns).select_from(resource.model)
+  for model, foreign_key in resource.joins.items():
+    if any(column.class_ is model for column in columns):
+      query = query.join(model, model.id == foreign_key)
+  query = query.filter(*filters).order_by(*resource.cursor_columns)
+  if limit is not None:
+    query = query.limit(limit)
+  rows = query.all()
+
+  names = [name for name in fields if name in resource.columns]
+  items = [dict(zip(names, row)) for row in rows]
+  cursors = [tuple(row[len(names):]) for row in rows]
+  if 'genres' in fields:
+    add_genres(resource, items, [cursor[-1] for cursor in cursors])
+  return items, cursors
+
+
+def add_genres(resource, items, ids):
+  # one query for the genres of the whole page
+  genre_table = resource.genre_table
+  entity_fk = next(column for column in genre_table.c if column.name != 'genre_id')
+  genres = {}
+  rows = db.session.query(entity_fk, Genre.name) \
+    .join(Genre, genre_table.c.genre_id == Genre.id) \
+    .filter(entity_fk.in_(ids)) \
+    .order_by(Genre.name)
+  for entity_id, name in rows:
+    genres.setdefault(entity_id, []).append(name)
+  for item, entity_id in zip(items, ids):
+    item['genres'] = genres.get(entity_id, [])
+
+
+def page_size():
+  limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+  return min(max(limit, 1), app.config['API_MAX_PAGE_SIZE'])
+
+
+def list_resource(resource):
+  fields = requested_fields(resource)
+  limit = page_size()
+  filters = []
+  after = request.args.get('after')
+  if after:
+    after = decode_cursor(resource, after)
+    keys = resource.cursor_columns
+    filters.append(db.tuple_(*keys) > after if len(keys) > 1 else keys[0] > after[0])
+  # one extra row tells whether there is a next page
+  items, cursors = select_items(resource, fields, filters, limit + 1)
+  next_cursor = None
+  if len(items) > limit:
+    items = items[:limit]
+    next_cursor = encode_cursor(cursors[limit - 1])
+  return json_response({"data": items, "next_cursor": next_cursor})
+
+
+def get_resource(resource, item_id):
+  items, cursors = select_items(resource, requested_fields(resource), [resource.model.id == item_id])
+  if not items:
+    raise ApiError(f'{resource.model.__name__} {item_id} not found.', 404)
+  return json_response({"data": items[0]})
+
+#----------------------------------------------------------------------------#
+# Routes
+#----------------------------------------------------------------------------#
+
+@api.route('/venues')
+@query_budget(2)  # genres are one more query
+@read_replica
+def list_venues():
+  return list_resource(VENUES)
+
+
+@api.route('/venues/<int:venue_id>')
+@query_budget(2)  # genres are one more query
+@read_replica
+def get_venue(venue_id):
+  return get_resource(VENUES, venue_id)
+
+
+@api.route('/artists')
+@query_budget(2)  # genres are one more query
+@read_replica
+def list_artists():
+  return list_resource(ARTISTS)
+
+
+@api.route('/artists/<int:artist_id>')
+@query_budget(2)  # genres are one more query
+@read_replica
+def get_artist(artist_id):
+  return get_resource(ARTISTS, artist_id)
+
+
+@api.route('/shows')
+@query_budget(1)
+@read_replica
+def list_shows():
+  return list_resource(SHOWS)
+
+
+@api.route('/shows/<int:show_id>')
+@query_budget(1)
+@read_replica
+def get_show(show_id):
+  return get_resource(SHOWS, show_id)
+
+
+@api.route('/shows/recurring', methods=['POST'])
+@query_budget(7)  # one more on the first booking of the process (see max_duration)
+def create_recurring_shows():
+  body = request.get_json(silent=True)
+  if not isinstance(body, dict):
+    raise ApiError('Expected a JSON object.')
+  venue_id = body_integer(body, 'venue_id')
+  artist_id = body_integer(body, 'artist_id')
+  start_time = body_time(body, 'start_time')
+  end_time = show_end_time(start_time, body_time(body, 'end_time', required=False))
+  weeks = body_integer(body, 'weeks')
+  weekdays = body.get('weekdays', [WEEKDAYS[start_time.weekday()]])
+  if not isinstance(weekdays, list) or not weekdays or not all(day in WEEKDAYS for day in weekdays):
+    raise ApiError(f'weekdays must be a list of {", ".join(WEEKDAYS)}.')
+  error = check_times(start_time, end_time)
+  if error is not None:
+    raise ApiError(error)
+  if not 0 < weeks * len(set(weekdays)) <= app.config['RECURRING_MAX_SHOWS']:
+    raise ApiError(f'weeks must be positive, for at most {app.config["RECURRING_MAX_SHOWS"]} shows.')
+  times = weekly_times(start_time, end_time, weeks, [WEEKDAYS.index(day) for day in weekdays])
+  if not times:
+    raise ApiError('No show falls in these weeks.')
+
+  venue_found, artist_found = db.session.query(
+    db.select(Venue.id).where(Venue.id == venue_id).exists(),
+    db.select(Artist.id).where(Artist.id == artist_id).exists()).one()
+  if not venue_found or not artist_found:
+    raise ApiError(f'Venue {venue_id} not found.' if not venue_found else f'Artist {artist_id} not found.', 404)
+
+  # the counters first: they hold the venue and artist until the commit
+  now = datetime.now()
+  rows = [{"venue_id": venue_id, "artist_id": artist_id, "start_time": show_start, "end_time": show_end,
+           "is_past": show_start <= now} for show_start, show_end in times]
+  count_shows([(venue_id, artist_id, row["is_past"]) for row in rows])
+  conflicts = find_conflicts(venue_id, artist_id, times)
+  if conflicts:
+    db.session.rollback()
+    raise ApiError(f'{len(conflicts)} of the {len(times)} shows conflict with other shows.', 409, {
+      "conflicts": [{"start_time": times[conflict.index][0], "end_time": times[conflict.index][1],
+                     "reason": conflict_message(conflict)} for conflict in conflicts]})
+  db.session.execute(Show.__table__.insert(), rows)
+  # no other show of the venue can start at these times
+  starts = {show_start for show_start, show_end in times}
+  listed = db.session.query(Show.id, Show.start_time, Show.end_time) \
+    .filter(Show.venue_id == venue_id, Show.start_time >= times[0][0], Show.start_time <= times[-1][0]) \
+    .order_by(Show.start_time)
+  created = [{"id": show_id, "start_time": show_start, "end_time": show_end,
+              "venue_id": venue_id, "artist_id": artist_id}
+             for show_id, show_start, show_end in listed if show_start in starts]
+  db.session.commit()
+
+  pages = set()
+  for show_start, show_end in times:
+    pages.update(show_pages(venue_id, artist_id, show_start))
+  invalidate(*pages)
+  return json_response({"data": created}, 201)
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+  return json_response({"error": error.message, **error.details}, error.status)
+
+
+@api.after_request
+def compress(response):
+  # brotli or gzip, whichever the client prefers; small bodies are sent as is
+  if response.is_streamed or response.status_code not in (200, 201) or 'Content-Encoding' in response.headers:
+    return response
+  response.vary.add('Accept-Encoding')
+  body = response.get_data()
+  if len(body) < app.config['API_COMPRESS_MIN_SIZE']:
+    return response
+  encodings = request.accept_encodings
+  if brotli is not None and encodings['br'] and encodings['br'] >= encodings['gzip']:
+    body, encoding = brotli.compress(body, quality=4), 'br'
+  elif encodings['gzip']:
+    body, encoding = gzip.compress(body, compresslevel=6), 'gzip'
+  else:
+    return response
+  response.set_data(body)
+  response.headers['Content-Encoding'] = encoding
+  return response
@@ -5,40 +5,146 @@
 import json
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
+from flask import Flask, render_template, stream_template, request, Response, flash, redirect, url_for, abort, jsonify
 import logging
 from flask_sqlalchemy import SQLAlchemy
 from logging import Formatter, FileHandler
-from flask_wtf import Form
+from flask_wtf import FlaskForm
 from forms import *
 from models import *
-from flask_migrate import Migrate
-from datetime import datetime
+from search import search_catalog
+from counters import count_new_show, discount_shows_of
+from bookings import show_end_time, check_times, find_conflicts, conflict_message
+from cache import cached_page, expire_page_at, invalidate, venue_pages, artist_pages, show_pages
+from conditional import conditional, venue_validator, artist_validator, listing_validator, shows_validator
+from api import api
+import importer  # registers `flask import`
+import exporter  # registers `flask export` and /api/v1/export
+from pool import pool_stats
+from sqlstats import query_budget
+import metrics  # serves /metrics
+from replicas import read_replica
+import choices  # serves /artists/typeahead and /venues/typeahead
+import feeds  # serves /venues/<id>/calendar.ics and /artists/<id>/calendar.ics (and .json)
+import geo  # serves /venues/near, registers `flask geocode`
+from datetime import datetime, timedelta
 import re
 from operator import itemgetter
+from itertools import groupby
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+datetime_patterns = {}
+
+def datetime_pattern(format, locale):
+  # compiled babel pattern and parsed locale, once per (format, locale)
+  key = (format, locale)
+  compiled = datetime_patterns.get(key)
+  if compiled is None:
+    compiled = datetime_patterns[key] = (
+      babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+      babel.Locale.parse(locale or babel.dates.LC_TIME))
+  return compiled
+
+def as_datetime(value):
+  # datetime objects are used as they are; strings are parsed
+  return dateutil.parser.parse(value) if isinstance(value, str) else value
+
+def format_datetime(value, format='medium', locale=None):
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(as_datetime(value), locale)
+
+def format_datetimes(values, format='medium', locale=None):
+  # formats a whole column of timestamps: the pattern is looked up once and
+  # repeated timestamps (shows at the same time) are formatted once
+  pattern, locale = datetime_pattern(format, locale)
+  formatted = {}
+  result = []
+  for value in values:
+    text = formatted.get(value)
+    if text is None:
+      text = formatted[value] = pattern.apply(as_datetime(value), locale)
+    result.append(text)
+  return result
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def all_genre_names():
+  return [name for name, in db.session.query(Genre.name).order_by(Genre.name)]
+
+def new_genre_pages(genres):
+  # both list pages show every genre name (see all_genre_names): adding a
+  # genre changes the venue list as well as the artist list. Call before
+  # committing, while new genres have no id yet.
+  return ['venues', 'artists'] if any(genre.id is None for genre in genres) else []
+
+def substring_pattern(search_term):
+  # case-insensitive substring pattern with LIKE wildcards in the term escaped
+  escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return '%' + escaped + '%'
+
+def search_by_name(model, search_term, page):
+  # one page of name matches with their upcoming show counts, plus the total
+  # number of matches. On Postgres the ILIKE is served by the pg_trgm GIN
+  # index on name; elsewhere it falls back to a scan.
+  name_filter = model.name.ilike(substring_pattern(search_term), escape='\\')
+  per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+  count = db.session.query(db.func.count(model.id)).filter(name_filter).scalar()
+  rows = db.session.query(model.id, model.name, model.upcoming_shows_count) \
+    .filter(name_filter) \
+    .order_by(model.name, model.id) \
+    .limit(per_page) \
+    .offset((page - 1) * per_page) \
+    .all()
+  return {
+    "count": count,
+    "data": [{
+      "id": entity_id,
+      "name": name,
+      "num_upcoming_shows": num_upcoming_shows
+    } for entity_id, name, num_upcoming_shows in rows],
+    "page": page,
+    "has_next": page * per_page < count
+  }
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+# JSON API (see api.py)
+app.register_blueprint(api)
+
+@app.route('/pool/stats')
+def database_pool_stats():
+  return jsonify(pool_stats(db.engine))
+
 @app.route('/')
 def index():
   return render_template('pages/home.html')
 
+@app.route('/search')
+# building the in-process search index takes 4, on first use and once every
+# SEARCH_INDEX_TTL seconds (see search.py)
+@query_budget(4)
+def search():
+  # ranked full-text search across venues and artists: name, city, state,
+  # genres and seeking description.
+  search_term = request.args.get('q', '').strip()
+  page = max(request.args.get('page', 1, type=int), 1)
+  results = search_catalog(search_term, page, app.config['SEARCH_RESULTS_PER_PAGE'])
+  return render_template('pages/search.html', results=results, search_term=search_term)
+
 #----------------------------------------------------------------------------#
 # Venues
 #----------------------------------------------------------------------------#
@@ -74,12 +180,15 @@ def create_venue_submission():
     return redirect(url_for('create_venue_submission'))
   else:
     error_in_insert = False
+    pages = ['venues']
 
     # try insert form data into db
     try:
+      genre_rows = get_or_create_genres(genres)
+      pages += new_genre_pages(genre_rows)
       new_venue = Venue(name=name, city=city, state=state, address=address, phone=phone, \
                 seeking_talent=seeking_talent, seeking_description=seeking_description, image_link=image_link, \
-                website=website, facebook_link=facebook_link, genres=genres)
+                website=website, facebook_link=facebook_link, genres=genre_rows)
 
       db.session.add(new_venue)
       db.session.commit()
@@ -92,6 +201,7 @@ def create_venue_submission():
       db.session.close()
 
     if not error_in_insert:
+      invalidate(*pages)
       # on successful db insert, flash success
       flash('Venue ' + request.form['name'] + ' was successfully listed!')
       return render_template('pages/home.html')
@@ -106,41 +216,31 @@ def create_venue_submission():
 # Read
 # ----------------------------------------------------------------
 @app.route('/venues')
+@query_budget(4)
+@read_replica
+@conditional(listing_validator(Venue))
+@cached_page('venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  venues = Venue.query.all()
-  data = []
-  city_states_set = set()
-  for venue in venues:
-    city_states_set.add((venue.city, venue.state))
-
-  city_states_set = list(city_states_set)
-  city_states_set.sort(key=itemgetter(1,0))
-
-  current_datetime = datetime.now()
-  for location in city_states_set:
-    venue_list = []
-    for venue in venues:
-      if (venue.city == location[0]) and (venue.state == location[1]):
-        venue_shows = Show.query.filter_by(venue_id=venue.id).all()
-        num_upcoming_shows = 0
-        for show in venue_shows:
-          if show.start_time > current_datetime:
-            num_upcoming_shows += 1
-
-        venue_list.append({
-          "id":venue.id,
-          "name":venue.name,
-          "num_upcoming_shows": num_upcoming_shows
-        })
+  # one query: every venue with its (denormalized) upcoming show count,
+  # already ordered by area so the listing can be built in a single pass.
+  # ?genre=<name> keeps only the venues in that genre.
+  genre = request.args.get('genre')
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count)
+  if genre:
+    query = query.filter(Venue.genres.any(Genre.name == genre))
+  rows = query.order_by(Venue.state, Venue.city, Venue.id).all()
 
+  data = []
+  for (city, state), area_rows in groupby(rows, key=itemgetter(2, 3)):
     data.append({
-      "city": location[0],
-      "state": location[1],
-      "venues": venue_list
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue_id,
+        "name": name,
+        "num_upcoming_shows": count
+      } for venue_id, name, _, _, count in area_rows]
       })
-  print(data)
   # data=[{
   #   "city": "San Francisco",
   #   "state": "CA",
@@ -149,31 +249,18 @@ def venues():
   #     "name": "The Musical Hop",
   #     "num_upcoming_shows": 0,
   # }]
-  return render_template('pages/venues.html', areas=data)
+  return render_template('pages/venues.html', areas=data, genres=all_genre_names(), genre=genre)
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
+@query_budget(2)
+@read_replica
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial string search on venue name, paginated.
   # search for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form.get('search_term', '').strip()
-  search_word = '%' + search_term +'%'
-  venues = Venue.query.filter(Venue.name.ilike(search_word)).all()
-  venue_list = []
-  current_datetime = datetime.now()
-  for venue in venues:
-    venue_show = Show.query.filter_by(venue_id=venue.id).all()
-    num_upcoming_shows = 0
-    for show in venue_show:
-      if show.start_time > current_datetime:
-        num_upcoming_shows += 1
-
-    venue_list.append({
-      "id":venue.id,
-      "name":venue.name,
-      "num_upcoming_shows":num_upcoming_shows
-    })
-
+  search_term = request.values.get('search_term', '').strip()
+  page = request.args.get('page', 1, type=int)
+  response = search_by_name(Venue, search_term, max(page, 1))
   # response={
   #   "count": 1,
   #   "data": [{
@@ -182,44 +269,44 @@ def search_venues():
   #     "num_upcoming_shows": 0,
   #   }]
   # }
-  response = {
-    "count": len(venues),
-    "data": venue_list
-  }
   return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@query_budget(3)
+@read_replica
+@conditional(venue_validator)
+@cached_page(lambda venue_id: f'venue:{venue_id}')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.get(venue_id)
-  print(venue)
+  venue = Venue.query.options(db.joinedload(Venue.genres)).get(venue_id)
   if not venue:
     return redirect(url_for('index'))
   else:
-    genres = ((venue.genres.replace('{','')).replace('}','')).split(',')
+    genres = venue.genre_names
     past_shows = []
-    past_shows_count = 0
     upcoming_shows = []
-    upcoming_shows_count = 0
+    # the artist side of every show comes back in the same query, and the
+    # past/upcoming split is computed by the database.
     current_datetime = datetime.now()
-    for show in venue.shows:
-      if show.start_time < current_datetime:
-        past_shows_count += 1
-        past_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": format_datetime(str(show.start_time))
-          })
-      if show.start_time > current_datetime:
-        upcoming_shows_count += 1
-        upcoming_shows.append({
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": format_datetime(str(show.start_time))
-          })
+    venue_shows = db.session.query(Show.artist_id, Artist.name, Artist.image_link, Show.start_time,
+                                   (Show.start_time > current_datetime).label('is_upcoming')) \
+      .join(Artist, Show.artist_id == Artist.id) \
+      .filter(Show.venue_id == venue_id) \
+      .order_by(Show.start_time) \
+      .all()
+    # cached until the next upcoming show starts and moves to the past
+    expire_page_at(next((show.start_time for show in venue_shows if show.is_upcoming), None))
+    start_times = format_datetimes([show.start_time for show in venue_shows], 'full')
+    for show, start_time in zip(venue_shows, start_times):
+      (upcoming_shows if show.is_upcoming else past_shows).append({
+        "artist_id": show.artist_id,
+        "artist_name": show.name,
+        "artist_image_link": show.image_link,
+        "start_time": start_time
+        })
+    past_shows_count = len(past_shows)
+    upcoming_shows_count = len(upcoming_shows)
     data = {
       "id": venue_id,
       "name": venue.name,
@@ -266,13 +353,15 @@ def show_venue(venue_id):
 # Update
 # ----------------------------------------------------------------
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(2)
 def edit_venue(venue_id):
   venue = Venue.query.get(venue_id)
   if not venue:
     return redirect(url_for('index'))
   else:
     form = VenueForm(obj=venue)
-    genres = ((venue.genres.replace('{','')).replace('}','')).split(',')
+    genres = venue.genre_names
+    form.genres.data = genres
     venue={
     "id": venue_id,
     "name": venue.name,
@@ -330,6 +419,7 @@ def edit_venue_submission(venue_id):
     error_in_update = False
 
     try:
+      pages = venue_pages(venue_id)
       venue = Venue.query.get(venue_id)
       venue.name = name
       venue.city = city
@@ -337,12 +427,15 @@ def edit_venue_submission(venue_id):
       venue.address = address
       venue.city = city
       venue.phone = phone
-      venue.genres = genres
+      venue.genres = get_or_create_genres(genres)
+      pages += new_genre_pages(venue.genres)
       venue.image_link = image_link
       venue.facebook_link = facebook_link
       venue.website = website
       venue.seeking_talent =seeking_talent
       venue.seeking_description = seeking_description
+      # set explicitly: a genres-only edit does not update the Venue row
+      venue.updated_at = datetime.utcnow()
 
       db.session.commit()
 
@@ -355,6 +448,7 @@ def edit_venue_submission(venue_id):
       db.session.close()
 
     if not error_in_update:
+      invalidate(*pages)
       flash('Venue ' + request.form['name'] + ' was successfully updated')
       return redirect(url_for('show_venue', venue_id=venue_id))
     else:
@@ -376,6 +470,8 @@ def delete_venue(venue_id):
     error_on_delete = False
     venue_name = venue.name
     try:
+      pages = venue_pages(venue_id)
+      discount_shows_of(Show.venue_id, venue_id)
       db.session.delete(venue)
       db.session.commit()
     except:
@@ -384,6 +480,7 @@ def delete_venue(venue_id):
     finally:
       db.session.close()
     if not error_on_delete:
+      invalidate(*pages)
       flash(f'{venue_name} deleted successfully!')
       return redirect(url_for('venues'))
     else:
@@ -426,12 +523,15 @@ def create_artist_submission():
     return redirect(url_for('create_artist_submission'))
   else:
     error_in_insert = False
+    pages = ['artists']
 
     # try insert form data into db
     try:
+      genre_rows = get_or_create_genres(genres)
+      pages += new_genre_pages(genre_rows)
       new_artist = Artist(name=name, city=city, state=state, phone=phone, \
                 seeking_venue=seeking_venue, seeking_description=seeking_description, image_link=image_link, \
-                website=website, facebook_link=facebook_link, genres=genres)
+                website=website, facebook_link=facebook_link, genres=genre_rows)
 
       db.session.add(new_artist)
       db.session.commit()
@@ -445,6 +545,7 @@ def create_artist_submission():
       db.session.close()
 
     if not error_in_insert:
+      invalidate(*pages)
       # on successful db insert, flash success
       flash('Artist ' + request.form['name'] + ' was successfully listed!')
       return render_template('pages/home.html')
@@ -458,48 +559,39 @@ def create_artist_submission():
 # Read
 # ----------------------------------------------------------------
 @app.route('/artists')
+@query_budget(4)
+@read_replica
+@conditional(listing_validator(Artist))
+@cached_page('artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  artists = Artist.query.order_by(Artist.name).all()
+  # ?genre=<name> keeps only the artists in that genre.
+  genre = request.args.get('genre')
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+    query = query.filter(Artist.genres.any(Genre.name == genre))
 
   data = []
-  for artist in artists:
+  for artist_id, name in query.order_by(Artist.name):
     data.append({
-      "id":artist.id,
-      "name":artist.name
+      "id":artist_id,
+      "name":name
     })
   # data=[{
   #   "id": 4,
   #   "name": "Guns N Petals",
   # }]
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, genres=all_genre_names(), genre=genre)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@query_budget(2)
+@read_replica
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial string search on artist name, paginated.
   # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  search_term = request.form.get('search_term', '').strip()
-  search_word = '%' + search_term +'%'
-  artists = Artist.query.filter(Artist.name.ilike(search_word)).all()
-  artist_list = []
-  current_datetime = datetime.now()
-  for artist in artists:
-    artist_show = Show.query.filter_by(artist_id=artist.id).all()
-    num_upcoming_shows = 0
-    for show in artist_show:
-      if show.start_time > current_datetime:
-        num_upcoming_shows += 1
-
-    artist_list.append({
-      "id":artist.id,
-      "name":artist.name,
-      "num_upcoming_shows":num_upcoming_shows
-    })
-    response = {
-    "count": len(artists),
-    "data": artist_list
-  }
+  search_term = request.values.get('search_term', '').strip()
+  page = request.args.get('page', 1, type=int)
+  response = search_by_name(Artist, search_term, max(page, 1))
   # response={
   #   "count": 1,
   #   "data": [{
@@ -511,37 +603,42 @@ def search_artists():
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@query_budget(3)
+@read_replica
+@conditional(artist_validator)
+@cached_page(lambda artist_id: f'artist:{artist_id}')
 def show_artist(artist_id):
 
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
-  artist = Artist.query.get(artist_id)
+  artist = Artist.query.options(db.joinedload(Artist.genres)).get(artist_id)
   if not artist:
     return redirect(url_for('index'))
   else:
-    genres = ((artist.genres.replace('{','')).replace('}','')).split(',')
+    genres = artist.genre_names
     past_shows = []
-    past_shows_count = 0
     upcoming_shows = []
-    upcoming_shows_count = 0
+    # the venue side of every show comes back in the same query, and the
+    # past/upcoming split is computed by the database.
     current_datetime = datetime.now()
-    for show in artist.shows:
-      if show.start_time < current_datetime:
-        past_shows_count += 1
-        past_shows.append({
-          "venue_id": show.venue_id,
-          "venue_name": show.venue.name,
-          "venue_image_link": show.venue.image_link,
-          "start_time": format_datetime(str(show.start_time))
-          })
-      if show.start_time > current_datetime:
-        upcoming_shows_count += 1
-        upcoming_shows.append({
-          "venue_id": show.venue_id,
-          "venue_name": show.venue.name,
-          "venue_image_link": show.venue.image_link,
-          "start_time": format_datetime(str(show.start_time))
-          })
+    artist_shows = db.session.query(Show.venue_id, Venue.name, Venue.image_link, Show.start_time,
+                                    (Show.start_time > current_datetime).label('is_upcoming')) \
+      .join(Venue, Show.venue_id == Venue.id) \
+      .filter(Show.artist_id == artist_id) \
+      .order_by(Show.start_time) \
+      .all()
+    # cached until the next upcoming show starts and moves to the past
+    expire_page_at(next((show.start_time for show in artist_shows if show.is_upcoming), None))
+    start_times = format_datetimes([show.start_time for show in artist_shows], 'full')
+    for show, start_time in zip(artist_shows, start_times):
+      (upcoming_shows if show.is_upcoming else past_shows).append({
+        "venue_id": show.venue_id,
+        "venue_name": show.name,
+        "venue_image_link": show.image_link,
+        "start_time": start_time
+        })
+    past_shows_count = len(past_shows)
+    upcoming_shows_count = len(upcoming_shows)
     data = {
       "id": artist_id,
       "name": artist.name,
@@ -587,6 +684,7 @@ def show_artist(artist_id):
 # Update
 # ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(2)
 def edit_artist(artist_id):
 
   artist = Artist.query.get(artist_id)
@@ -594,7 +692,8 @@ def edit_artist(artist_id):
     return redirect(url_for('index'))
   else:
     form = ArtistForm(obj=artist)
-    genres = ((artist.genres.replace('{','')).replace('}','')).split(',')
+    genres = artist.genre_names
+    form.genres.data = genres
     artist={
       "id": artist_id,
       "name": artist.name,
@@ -648,17 +747,21 @@ def edit_artist_submission(artist_id):
     error_in_update = False
 
     try:
+      pages = artist_pages(artist_id)
       artist = Artist.query.get(artist_id)
       artist.name = name
       artist.city = city
       artist.state = state
       artist.phone = phone
-      artist.genres = genres
+      artist.genres = get_or_create_genres(genres)
+      pages += new_genre_pages(artist.genres)
       artist.image_link = image_link
       artist.facebook_link = facebook_link
       artist.website = website
       artist.seeking_venue = seeking_venue
       artist.seeking_description = seeking_description
+      # set explicitly: a genres-only edit does not update the Artist row
+      artist.updated_at = datetime.utcnow()
 
       db.session.commit()
 
@@ -671,6 +774,7 @@ def edit_artist_submission(artist_id):
       db.session.close()
 
     if not error_in_update:
+      invalidate(*pages)
       flash('Artist ' + request.form['name'] + 'was successfully updated!')
       return redirect(url_for('show_artist', artist_id=artist_id))
     else:
@@ -681,15 +785,17 @@ def edit_artist_submission(artist_id):
 # Delete
 # ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/delete', methods=['GET', 'POST'])
-def delete_artist(venue_id):
+def delete_artist(artist_id):
 
-  artist = Artist.query.get(venue_id)
+  artist = Artist.query.get(artist_id)
   if not artist:
     return redirect(url_for('artists'))
   else:
     error_on_delete = False
     artist_name = artist.name
     try:
+      pages = artist_pages(artist_id)
+      discount_shows_of(Show.artist_id, artist_id)
       db.session.delete(artist)
       db.session.commit()
     except:
@@ -698,10 +804,11 @@ def delete_artist(venue_id):
     finally:
       db.session.close()
     if not error_on_delete:
+      invalidate(*pages)
       flash(f'{artist_name} deleted successfully!')
-      return redirect(url_for('artist'))
+      return redirect(url_for('artists'))
     else:
-      flash(f'An error occurred deleting venue {artist}.')
+      flash(f'An error occurred deleting artist {artist_name}.')
       print("Error in delete_artist()")
       abort(500)
 
@@ -712,11 +819,11 @@ def delete_artist(venue_id):
 # Create
 # ----------------------------------------------------------------
 @app.route('/shows/create', methods=['GET'])
+@query_budget(0)
 def create_shows():
   # renders form. do not touch.
+  # artists and venues are looked up by name as the user types (see choices.py)
   form = ShowForm()
-  form.artist_id.choices =[(artist.id, artist.name) for artist in Artist.query.order_by(Artist.id).all()]
-  form.venue_id.choices =[(venue.id, venue.name) for venue in Venue.query.order_by(Venue.id).all()]
   return render_template('forms/new_show.html', form=form)
 
 @app.route('/shows/create', methods=['POST'])
@@ -725,23 +832,58 @@ def create_show_submission():
   # TODO: insert form data as a new Show record in the db, instead
   form =ShowForm()
 
-  artist_id = form.artist_id.data.strip()
-  venue_id = form.venue_id.data.strip()
+  def refuse(field=None, message=None):
+    # back to the form, with the user's input and the error on its field
+    if field is not None:
+      field.errors.append(message)
+    flash(form.errors)
+    return render_template('forms/new_show.html', form=form), 400
+
+  if not form.validate():
+    return refuse()
+
+  artist_id = int(form.artist_id.data)
+  venue_id = int(form.venue_id.data)
   start_time = form.start_time.data
+  end_time = show_end_time(start_time, form.end_time.data)
+
+  # both in one query
+  venue_found, artist_found = db.session.query(
+    db.select(Venue.id).where(Venue.id == venue_id).exists(),
+    db.select(Artist.id).where(Artist.id == artist_id).exists()).one()
+  if not venue_found:
+    return refuse(form.venue_id, f'Venue {venue_id} not found.')
+  if not artist_found:
+    return refuse(form.artist_id, f'Artist {artist_id} not found.')
+  message = check_times(start_time, end_time)
+  if message is not None:
+    return refuse(form.end_time, message)
 
   error_in_insert = False
+  conflict = None
 
   try:
-    new_show = Show(start_time=start_time, artist_id=artist_id, venue_id=venue_id)
+    new_show = Show(start_time=start_time, end_time=end_time, artist_id=artist_id, venue_id=venue_id)
     db.session.add(new_show)
-    db.session.commit()
+    count_new_show(new_show)
+    # checked once the show and its counters are written (see bookings.py)
+    db.session.flush()
+    conflicts = find_conflicts(venue_id, artist_id, [(start_time, end_time)], exclude_ids=[new_show.id])
+    if conflicts:
+      conflict = conflicts[0]
+      db.session.rollback()
+    else:
+      db.session.commit()
 
-  except:
+  except Exception as e:
     error_in_insert = True
     print(f'Exception "{e}" in create_show_submission()')
     db.session.rollback()
 
+  if conflict is not None:
+    return refuse(form[f'{conflict.side}_id'], f'Show could not be listed. {conflict_message(conflict)}')
   if not error_in_insert:
+    invalidate(*show_pages(venue_id, artist_id, start_time))
     # on successful db insert, flash success
     flash('Show was successfully listed!')
     return render_template('pages/home.html')
@@ -749,27 +891,103 @@ def create_show_submission():
     # TODO: on unsuccessful db insert, flash an error instead.
     flash('An error occurred. Show could not be listed.')
     print("Error in create_show_submission")
+    abort(500)
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
 
 # Read
 # ----------------------------------------------------------------
+def encode_show_cursor(start_time, show_id):
+  return f'{start_time.isoformat()}_{show_id}'
+
+def decode_show_cursor(cursor):
+  # cursors look like "<start_time isoformat>_<show id>"
+  try:
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+  except ValueError:
+    abort(400)
+
+def parse_show_time(value, end=False):
+  # "2026-05-01" or "2026-05-01T20:00"; a day ending a range is included
+  try:
+    parsed = datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+  if end and 'T' not in value and ' ' not in value:
+    parsed += timedelta(days=1)
+  return parsed
+
+SHOW_FILTERS = ('from', 'to', 'city', 'genre', 'venue_id', 'artist_id')
+
+def show_filters(args):
+  # (criteria, the non-empty filters as given). start_time bounds are range
+  # scans on ix_Show_start_time_id, or on the (venue_id / artist_id,
+  # start_time) indexes with an id; a city goes through ix_Venue_city, a
+  # genre (the artist's) is a probe of artist_genres per show.
+  given = {name: args[name].strip() for name in SHOW_FILTERS if args.get(name, '').strip()}
+  criteria = []
+  if 'from' in given:
+    criteria.append(Show.start_time >= parse_show_time(given['from']))
+  if 'to' in given:
+    criteria.append(Show.start_time < parse_show_time(given['to'], end=True))
+  for name, column in (('venue_id', Show.venue_id), ('artist_id', Show.artist_id)):
+    if name in given:
+      if not given[name].isdigit():
+        abort(400)
+      criteria.append(column == int(given[name]))
+  if 'city' in given:
+    criteria.append(Venue.city == given['city'])
+  if 'genre' in given:
+    genre_id = db.select(Genre.id).where(Genre.name == given['genre']).scalar_subquery()
+    criteria.append(db.exists().where(artist_genres.c.artist_id == Show.artist_id,
+                                      artist_genres.c.genre_id == genre_id))
+  return criteria, given
+
+def iter_shows_page(after, page, criteria=()):
+  # keyset pagination on (start_time, id): one joined query per page, no
+  # OFFSET scan. One extra row is fetched to know whether a next page exists.
+  query = db.session.query(Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'),
+                           Show.artist_id, Artist.name.label('artist_name'), Artist.image_link) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(*criteria)
+  if after:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+  shows = query.order_by(Show.start_time, Show.id).limit(page["size"] + 1).all()
+
+  if len(shows) > page["size"]:
+    shows = shows[:page["size"]]
+    page["next_cursor"] = encode_show_cursor(shows[-1].start_time, shows[-1].id)
+  start_times = format_datetimes([show.start_time for show in shows], 'full')
+  for show, start_time in zip(shows, start_times):
+    yield {
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.image_link,
+      "start_time": start_time
+    }
+
 @app.route('/shows')
+@query_budget(2)
+@read_replica
+@conditional(shows_validator)
+@cached_page('shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  shows = Show.query.all()
-
-  for show in shows:
-    data.append({
-      "venue_id": show.venue.id,
-      "venue_name": show.venue.name,
-      "artist_id": show.artist.id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": format_datetime(str(show.start_time))
-    })
+  # displays one page of shows at /shows, ordered by start time.
+  # ?after=<cursor> continues from the last show of the previous page.
+  # ?from=&to= (dates or date-times), ?city=, ?genre=, ?venue_id= and
+  # ?artist_id= narrow the shows listed (see show_filters).
+  after = request.args.get('after')
+  criteria, filters = show_filters(request.args)
+  page = {
+    "size": app.config['SHOWS_PER_PAGE'],
+    "after": after,
+    "filters": filters,
+    "next_cursor": None
+  }
+  data = iter_shows_page(decode_show_cursor(after) if after else None, page, criteria)
   # data=[{
   #   "venue_id": 1,
   #   "venue_name": "The Musical Hop",
@@ -778,7 +996,11 @@ def shows():
   #   "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
   #   "start_time": "2019-05-21T21:30:00.000Z"
   # }]
-  return render_template('pages/shows.html', shows=data)
+  if app.config['STREAM_SHOWS']:
+    # the page head is flushed before the query runs and each tile is sent
+    # as soon as it is rendered.
+    return Response(stream_template('pages/shows.html', shows=data, page=page))
+  return render_template('pages/shows.html', shows=data, page=page)
 
 #----------------------------------------------------------------------------#
 # Error Handlers
@@ -794,13 +1016,15 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
+    # to stderr (Flask's default handler), and to LOG_FILE when it is set
     app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    if app.config['LOG_FILE']:
+        file_handler = FileHandler(app.config['LOG_FILE'])
+        file_handler.setFormatter(
+            Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
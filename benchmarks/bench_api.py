@@ -0,0 +1,49 @@
+#----------------------------------------------------------------------------#
+# /api/v1 against the HTML pages it replaces for API clients: time per
+# request and bytes on the wire, uncompressed and gzip-compressed.
+#
+#   python benchmarks/bench_api.py [num_venues]
+#----------------------------------------------------------------------------#
+
+import sys
+import time
+
+from common import app, reset_db, seed
+
+PAGE_SIZE = 30
+
+ROUTES = [
+  '/shows',
+  f'/api/v1/shows?limit={PAGE_SIZE}',
+  f'/api/v1/shows?limit={PAGE_SIZE}&fields=id,start_time,artist_name,venue_name',
+  '/venues',
+  '/api/v1/venues?limit=500&fields=id,name,city,state,upcoming_shows_count',
+]
+
+
+def measure(client, url, headers, repeat=5):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, (url, response.status_code)
+    best = elapsed if best is None else min(best, elapsed)
+  return best, len(response.data)
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+  app.config['SHOWS_PER_PAGE'] = PAGE_SIZE
+  reset_db()
+  seed(num_venues)
+  client = app.test_client()
+  print(f'{"route":<72} {"ms":>7} {"bytes":>8} {"gzip":>8}')
+  for url in ROUTES:
+    ms, size = measure(client, url, {})
+    _, compressed = measure(client, url, {'Accept-Encoding': 'gzip'})
+    print(f'{url:<72} {ms:>7.1f} {size:>8} {compressed:>8}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,161 @@
+#----------------------------------------------------------------------------#
+# Booking conflict checks (see bookings.py) on a large Show table.
+#
+# Venue 1 gets a long history on top of the seeded shows. For it and for a
+# venue with a short history this prints the time of the index range read
+# for a booking, of the same read without the SHOW_MAX_MINUTES bound, which
+# has to go through every earlier show of the venue, of the whole check
+# (venue and artist) and its plan. The check must agree with a scan of the
+# venue's shows on random bookings. Bookings through /shows/create must be
+# refused when they overlap, also when several are made at the same time.
+#
+#   python benchmarks/bench_bookings.py [num_venues] [shows_per_venue] [history]
+#----------------------------------------------------------------------------#
+
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import app, reset_db, seed
+from models import db, Show
+from bookings import booked, find_conflicts, max_duration
+
+REPEAT = 200
+
+
+def add_history(venue_id, count, num_artists):
+  # back-to-back three hour shows every four hours, ending now
+  start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=4 * count)
+  with app.app_context():
+    for first in range(0, count, 50000):
+      db.session.execute(Show.__table__.insert(), [{
+        "venue_id": venue_id,
+        "artist_id": n % num_artists + 1,
+        "start_time": start + timedelta(hours=4 * n),
+        "end_time": start + timedelta(hours=4 * n + 3),
+        "is_past": True,
+      } for n in range(first, min(first + 50000, count))])
+      db.session.commit()
+
+
+def unbounded_conflict(venue_id, start_time, end_time):
+  # the check without a lower bound on start_time
+  return db.session.query(Show.id) \
+    .filter(Show.venue_id == venue_id, Show.start_time < end_time, Show.end_time > start_time).first()
+
+
+def median_us(function, *args):
+  times = []
+  for _ in range(REPEAT):
+    started = time.perf_counter()
+    function(*args)
+    times.append((time.perf_counter() - started) * 1e6)
+  return statistics.median(times)
+
+
+def query_plan(venue_id, start_time, end_time):
+  statements = []
+  with app.app_context():
+    record = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    find_conflicts(venue_id, 1, [(start_time, end_time)])
+    event.remove(db.engine, 'before_cursor_execute', record)
+    connection = db.engine.raw_connection()
+    statement, parameters = statements[0]
+    plan = connection.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    connection.close()
+  return ' / '.join(row[-1] for row in plan)
+
+
+def book(client, venue_id, artist_id, start_time, end_time=None):
+  data = {"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S')}
+  if end_time is not None:
+    data["end_time"] = end_time.strftime('%Y-%m-%d %H:%M:%S')
+  return client.post('/shows/create', data=data)
+
+
+def count_shows(venue_id, start_time):
+  with app.app_context():
+    return db.session.query(Show).filter(Show.venue_id == venue_id, Show.start_time == start_time).count()
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+  shows_per_venue = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+  history = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+  reset_db()
+  started = time.perf_counter()
+  seed(num_venues, shows_per_venue=shows_per_venue)
+  add_history(1, history, max(1, num_venues // 2))
+  with app.app_context():
+    total = db.session.query(db.func.count(Show.id)).scalar()
+    venue_shows = {venue_id: db.session.query(Show.start_time, Show.end_time).filter(Show.venue_id == venue_id).all()
+                   for venue_id in (1, 2)}
+  print(f'{total} shows, seeded in {time.perf_counter() - started:.0f} s')
+
+  # a free slot and a taken one, in the venue's last week
+  now = datetime.now().replace(minute=0, second=0, microsecond=0)
+  print(f'{"venue":>6} {"shows":>8} {"range us":>9} {"unbounded us":>13} {"check us":>9}  plan')
+  for venue_id in (1, 2):
+    latest = max(start_time for start_time, end_time in venue_shows[venue_id] if start_time < now)
+    start_time, end_time = latest + timedelta(hours=1), latest + timedelta(hours=2)
+    with app.app_context():
+      bounded = median_us(booked, Show.venue_id, venue_id, start_time - max_duration(), end_time)
+      unbounded = median_us(unbounded_conflict, venue_id, start_time, end_time)
+      check = median_us(find_conflicts, venue_id, 1, [(start_time, end_time)])
+    print(f'{venue_id:>6} {len(venue_shows[venue_id]):>8} {bounded:>9.0f} {unbounded:>13.0f} {check:>9.0f}'
+          f'  {query_plan(venue_id, latest, latest + timedelta(hours=1))}')
+
+  # random bookings against a scan of venue 1's shows
+  pick = random.Random(1)
+  first, last = min(venue_shows[1])[0], max(venue_shows[1])[0]
+  conflicting = 0
+  with app.app_context():
+    for _ in range(500):
+      start_time = first + timedelta(minutes=pick.randrange(int((last - first).total_seconds() // 60)))
+      end_time = start_time + timedelta(minutes=pick.randrange(1, int(max_duration().total_seconds() // 60)))
+      expected = any(start < end_time and end > start_time for start, end in venue_shows[1])
+      found = any(conflict.side == 'venue' for conflict in find_conflicts(1, 10**9, [(start_time, end_time)]))
+      assert found == expected, (start_time, end_time)
+      conflicting += expected
+  print(f'500 random bookings at venue 1: {conflicting} conflicts, all found')
+
+  client = app.test_client()
+  slot = now + timedelta(days=3, hours=2)
+  assert book(client, 2, 1, slot).status_code == 200
+  response = book(client, 2, 2, slot + timedelta(hours=1))
+  assert response.status_code == 400 and count_shows(2, slot + timedelta(hours=1)) == 0
+  assert 'already has a show' in response.get_data(as_text=True)
+  assert book(client, 3, 1, slot + timedelta(hours=2)).status_code == 400, 'the artist is double booked'
+  assert book(client, 2, 3, slot + timedelta(hours=3)).status_code == 200, 'back-to-back shows conflict'
+  assert book(client, 2, 4, slot + timedelta(days=1), slot + timedelta(days=1, hours=-1)).status_code == 400
+  times = []
+  for day in range(10, 60):
+    started = time.perf_counter()
+    assert book(client, 1, day, now + timedelta(days=day, hours=12)).status_code == 200
+    times.append((time.perf_counter() - started) * 1000)
+  print(f'/shows/create at venue 1: {statistics.median(times):.1f} ms; overlaps refused, back-to-back accepted')
+
+  # bookings of the same slot at the same time: one is accepted
+  slot = now + timedelta(days=5, hours=2)
+  statuses = []
+
+  def book_slot(artist_id):
+    statuses.append(book(app.test_client(), 4, artist_id, slot).status_code)
+
+  threads = [threading.Thread(target=book_slot, args=(artist_id,)) for artist_id in range(10, 18)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert count_shows(4, slot) == 1, count_shows(4, slot)
+  print(f'8 bookings of one slot at once: 1 show listed (responses: {sorted(statuses)})')
+
+
+if __name__ == '__main__':
+  main()
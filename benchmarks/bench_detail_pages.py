@@ -0,0 +1,35 @@
+#----------------------------------------------------------------------------#
+# /venues/<id> and /artists/<id>: query count regression check.
+#
+# A detail page checks its validator (conditional.py), loads the entity and
+# then all of its shows, joined to the other side of each show, so it must
+# stay within the query budget its view declares (three) no matter how many
+# shows the venue or artist has. Revalidating with the page's ETag takes the
+# validator query alone and answers 304.
+#----------------------------------------------------------------------------#
+
+from common import app, reset_db, seed, time_get
+from sqlstats import check_query_budget
+
+REVALIDATE_BUDGET = 1
+
+
+def main():
+  print(f'{"shows":>8} {"route":>14} {"ms":>10} {"304 ms":>10}')
+  for shows_per_venue in (1, 10, 100, 500):
+    reset_db()
+    # a single venue and a single artist share every show
+    seed(1, num_artists=1, shows_per_venue=shows_per_venue)
+    client = app.test_client()
+    for url in ('/venues/1', '/artists/1'):
+      response = check_query_budget(client, url)
+      assert response.status_code == 200, (url, response.status_code)
+      headers = {'If-None-Match': response.headers['ETag']}
+      revalidated = check_query_budget(client, url, REVALIDATE_BUDGET, headers=headers)
+      assert revalidated.status_code == 304, (url, revalidated.status_code)
+      print(f'{shows_per_venue:>8} {url:>14} {time_get(client, url):>10.1f}'
+            f' {time_get(client, url, headers=headers):>10.1f}')
+
+
+if __name__ == '__main__':
+  main()
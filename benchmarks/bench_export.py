@@ -0,0 +1,40 @@
+#----------------------------------------------------------------------------#
+# Bulk export: throughput and peak Python memory per format as the Show
+# table grows. Peak memory should stay flat: rows are streamed in batches of
+# EXPORT_BATCH_SIZE, not loaded at once.
+#
+#   python benchmarks/bench_export.py
+#----------------------------------------------------------------------------#
+
+import time
+import tracemalloc
+
+from common import app, reset_db, seed
+from exporter import export_chunks, import_pyarrow
+
+FORMATS = ['csv', 'jsonl'] + (['parquet'] if import_pyarrow() else [])
+
+
+def measure(output_format):
+  with app.app_context():
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in export_chunks('shows', output_format, app.config['EXPORT_BATCH_SIZE']))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return elapsed, size, peak
+
+
+def main():
+  print(f'{"shows":>8} {"format":>8} {"s":>7} {"MB out":>8} {"peak MB":>8}')
+  for num_venues in (1000, 10000, 50000):
+    reset_db()
+    seed(num_venues, shows_per_venue=4)
+    for output_format in FORMATS:
+      elapsed, size, peak = measure(output_format)
+      print(f'{num_venues * 4:>8} {output_format:>8} {elapsed:>7.2f} {size / 1e6:>8.1f} {peak / 1e6:>8.1f}')
+
+
+if __name__ == '__main__':
+  main()
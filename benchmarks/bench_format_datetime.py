@@ -0,0 +1,64 @@
+#----------------------------------------------------------------------------#
+# format_datetime: the show start time filter over a column of 10k rows.
+#
+# "legacy" is the filter as it was: the view formats str(start_time) and the
+# template parses that string back and formats it again. "per row" is
+# format_datetime() on the datetime itself with the cached pattern, and
+# "batch" is format_datetimes() over the whole column. All three must render
+# the same text.
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from common import app  # noqa: F401 (configures the app before importing it)
+from app import format_datetime, format_datetimes
+
+ROWS = 10000
+
+LEGACY_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  return babel.dates.format_datetime(date, LEGACY_FORMATS.get(format, format))
+
+
+def best_ms(function, repeat=5):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    result = function()
+    elapsed = (time.perf_counter() - start) * 1000
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+def main():
+  rng = random.Random(0)
+  start = datetime(2026, 1, 1, 18, 0)
+  # shows start on the hour or half hour, so times repeat across a column
+  start_times = [start + timedelta(days=rng.randrange(365), minutes=30 * rng.randrange(12))
+                 for _ in range(ROWS)]
+
+  legacy_ms, legacy = best_ms(lambda: [legacy_format_datetime(legacy_format_datetime(str(value)), 'full')
+                                       for value in start_times], repeat=1)
+  per_row_ms, per_row = best_ms(lambda: [format_datetime(value, 'full') for value in start_times])
+  batch_ms, batch = best_ms(lambda: format_datetimes(start_times, 'full'))
+  assert legacy == per_row == batch
+
+  print(f'{ROWS} rows, {len(set(start_times))} distinct start times')
+  print(f'{"legacy":>10} {legacy_ms:>10.1f} ms')
+  print(f'{"per row":>10} {per_row_ms:>10.1f} ms  ({legacy_ms / per_row_ms:.0f}x)')
+  print(f'{"batch":>10} {batch_ms:>10.1f} ms  ({legacy_ms / batch_ms:.0f}x)')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,125 @@
+#----------------------------------------------------------------------------#
+# Venue geocoding and "near me" searches (see geo.py) at 100k venues.
+#
+# Venues are spread over the cities of the centroid table and geocoded with
+# `flask geocode`; their locations are then scattered around the centroids
+# (as street-level geocoding would) so that the grid index has distinct
+# points to sort out. For a few points and radii this prints the time of a
+# grid index search and of a scan of every venue location, whose results
+# must be the same, and the time of /venues/near.
+#
+#   python benchmarks/bench_near.py [num_venues]
+#----------------------------------------------------------------------------#
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import app, reset_db, seed, time_get
+from models import db, Venue, Show
+from counters import rebuild_show_counters
+from geo import get_centroids, get_grid_index, drop_locations, distance_km, near_venues
+from sqlstats import check_query_budget
+
+RADII = (5, 25, 100)
+
+
+def place_venues(num_venues):
+  # every venue in a city of the centroid table; two venues in three have
+  # an upcoming show
+  cities = sorted(get_centroids())
+  table = Venue.__table__
+  with app.app_context():
+    db.session.execute(
+      table.update().where(table.c.id == db.bindparam('venue_id'))
+      .values(city=db.bindparam('new_city'), state=db.bindparam('new_state')),
+      [{"venue_id": venue_id, "new_city": cities[venue_id % len(cities)][0].title(),
+        "new_state": cities[venue_id % len(cities)][1]} for venue_id in range(1, num_venues + 1)])
+    tomorrow = datetime.now() + timedelta(days=1)
+    db.session.execute(Show.__table__.insert(), [
+      {"venue_id": venue_id, "artist_id": 1, "start_time": tomorrow}
+      for venue_id in range(1, num_venues + 1) if venue_id % 3])
+    db.session.commit()
+    rebuild_show_counters()
+
+
+def scatter_venues():
+  # up to ~30 km from the centroid
+  table = Venue.__table__
+  jitter = random.Random(1)
+  with app.app_context():
+    rows = db.session.query(Venue.id, Venue.latitude, Venue.longitude).all()
+    db.session.execute(
+      table.update().where(table.c.id == db.bindparam('venue_id'))
+      .values(latitude=db.bindparam('new_latitude'), longitude=db.bindparam('new_longitude')),
+      [{"venue_id": venue_id, "new_latitude": latitude + jitter.uniform(-0.2, 0.2),
+        "new_longitude": longitude + jitter.uniform(-0.25, 0.25)} for venue_id, latitude, longitude in rows])
+    db.session.commit()
+    drop_locations()
+    return db.session.query(Venue.id, Venue.latitude, Venue.longitude).all()
+
+
+def scan(locations, latitude, longitude, km):
+  found = []
+  for venue_id, venue_latitude, venue_longitude in locations:
+    distance = distance_km(latitude, longitude, venue_latitude, venue_longitude)
+    if distance <= km:
+      found.append((distance, venue_id))
+  found.sort()
+  return found
+
+
+def timed(function, *args):
+  started = time.perf_counter()
+  result = function(*args)
+  return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  reset_db()
+  seed(num_venues, num_artists=100, shows_per_venue=0)
+  place_venues(num_venues)
+
+  result, geocode_ms = timed(app.test_cli_runner().invoke, None, ['geocode'])
+  assert result.exit_code == 0, result.output
+  print(f'{num_venues} venues; flask geocode: {geocode_ms:.0f} ms ({result.output.splitlines()[0]})')
+
+  locations = scatter_venues()
+  with app.app_context():
+    index, load_ms = timed(get_grid_index)
+  print(f'grid index load: {load_ms:.0f} ms, {len(index.cells)} cells')
+
+  centroids = get_centroids()
+  points = [centroids[('new york', 'NY')], centroids[('salt lake city', 'UT')],
+            centroids[('anchorage', 'AK')], (44.0, -103.0)]
+  print(f'{"point":>20} {"km":>5} {"venues":>7} {"grid ms":>8} {"scan ms":>8} {"/venues/near ms":>16}')
+  client = app.test_client()
+  for latitude, longitude in points:
+    for km in RADII:
+      with app.app_context():
+        found, grid_ms = timed(index.near, latitude, longitude, km)
+      expected, scan_ms = timed(scan, locations, latitude, longitude, km)
+      assert [venue_id for distance, venue_id in found] == [venue_id for distance, venue_id in expected], \
+        (latitude, longitude, km)
+      url = f'/venues/near?lat={latitude}&lng={longitude}&km={km}&upcoming=1'
+      check_query_budget(client, url)
+      print(f'{latitude:>9.3f},{longitude:>9.3f} {km:>5} {len(found):>7} {grid_ms:>8.2f} {scan_ms:>8.1f}'
+            f' {time_get(client, url):>16.1f}')
+
+  with app.app_context():
+    venues = near_venues(*points[0], 25, True, 1000)
+    assert venues and all(venue["num_upcoming_shows"] > 0 for venue in venues)
+    assert [venue["distance_km"] for venue in venues] == sorted(venue["distance_km"] for venue in venues)
+    # a new venue is located from its city, and found once committed
+    venue = Venue(name='The New Venue', city='Boise', state='ID', address='1 Main Street')
+    db.session.add(venue)
+    db.session.commit()
+    assert (venue.latitude, venue.longitude) == centroids[('boise', 'ID')]
+    assert venue.id in {venue_id for distance, venue_id in get_grid_index().near(*centroids[('boise', 'ID')], 1)}
+  print('a new venue is located from its city and found by the next search')
+
+
+if __name__ == '__main__':
+  main()
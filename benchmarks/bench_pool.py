@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Connection pool under concurrent load: checkout waits, overflow and
+# timeouts as reported by /pool/stats, for a few pool sizes. Each pool size
+# runs in its own process (the pool is built from DB_POOL_* at start-up)
+# against the same seeded database.
+#
+#   python benchmarks/bench_pool.py [threads] [requests per thread]
+#----------------------------------------------------------------------------#
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from common import app, reset_db, seed
+
+URL = '/venues/1'
+
+POOLS = [(1, 0), (4, 0), (4, 12), (16, 0)]
+
+
+def run(threads, requests_per_thread):
+  errors = []
+
+  def worker():
+    client = app.test_client()
+    for _ in range(requests_per_thread):
+      response = client.get(URL)
+      if response.status_code != 200:
+        errors.append(response.status_code)
+
+  start = time.perf_counter()
+  workers = [threading.Thread(target=worker) for _ in range(threads)]
+  for thread in workers:
+    thread.start()
+  for thread in workers:
+    thread.join()
+  elapsed = time.perf_counter() - start
+
+  stats = app.test_client().get('/pool/stats').get_json()
+  wait = stats["checkout_wait_seconds"]
+  waited = wait["count"] - wait["buckets"]["0.001"]
+  print(f'{stats["size"]:>5} {stats["max_overflow"]:>9} {threads * requests_per_thread / elapsed:>8.0f} '
+        f'{wait["count"]:>10} {1000 * wait["sum"] / wait["count"]:>12.3f} {waited:>9} '
+        f'{stats["timeouts"]:>8} {stats["connects"]:>8} {len(errors):>7}')
+
+
+def main():
+  threads = sys.argv[1] if len(sys.argv) > 1 else '16'
+  requests_per_thread = sys.argv[2] if len(sys.argv) > 2 else '50'
+  reset_db()
+  seed(100, shows_per_venue=10)
+  print(f'{"size":>5} {"overflow":>9} {"req/s":>8} {"checkouts":>10} {"mean wait ms":>12} {"> 1 ms":>9} '
+        f'{"timeouts":>8} {"connects":>8} {"errors":>7}')
+  for pool_size, max_overflow in POOLS:
+    env = dict(os.environ, DB_POOL_SIZE=str(pool_size), DB_MAX_OVERFLOW=str(max_overflow))
+    subprocess.run([sys.executable, __file__, '--run', threads, requests_per_thread], env=env, check=True)
+
+
+if __name__ == '__main__':
+  if sys.argv[1:2] == ['--run']:
+    run(int(sys.argv[2]), int(sys.argv[3]))
+  else:
+    main()
@@ -0,0 +1,118 @@
+#----------------------------------------------------------------------------#
+# Residencies through POST /api/v1/shows/recurring against the same shows
+# listed one at a time through /shows/create.
+#
+# For residencies of growing length this prints the time of the request and
+# the statements it ran; then checks that an overlapping residency creates
+# nothing (409, counters untouched), and that of two overlapping residencies
+# posted at the same time only one is created.
+#
+#   python benchmarks/bench_recurring.py [num_venues] [shows_per_venue]
+#----------------------------------------------------------------------------#
+
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from common import app, reset_db, seed
+from models import db, Show
+from counters import check_show_counters
+from sqlstats import captured_queries
+
+ONE_BY_ONE = 100  # shows listed through /shows/create for comparison
+
+
+def residency(venue_id, artist_id, start_time, weeks, weekdays=None, **fields):
+  body = {"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time.isoformat(), "weeks": weeks}
+  if weekdays is not None:
+    body["weekdays"] = weekdays
+  body.update(fields)
+  return body
+
+
+def post(client, body):
+  with captured_queries() as statements:
+    started = time.perf_counter()
+    response = client.post('/api/v1/shows/recurring', json=body)
+    elapsed = (time.perf_counter() - started) * 1000
+  return response, elapsed, len(statements)
+
+
+def count_shows(venue_id):
+  with app.app_context():
+    return db.session.query(db.func.count(Show.id)).filter(Show.venue_id == venue_id).scalar()
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  shows_per_venue = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+  reset_db()
+  seed(num_venues, shows_per_venue=shows_per_venue)
+  client = app.test_client()
+  # the seeded shows are a week apart, at midnight
+  first = (datetime.now() + timedelta(days=400)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+  times = []
+  for day in range(ONE_BY_ONE):
+    started = time.perf_counter()
+    response = client.post('/shows/create', data={
+      "venue_id": 1, "artist_id": 1, "start_time": (first + timedelta(days=day)).strftime('%Y-%m-%d %H:%M:%S')})
+    assert response.status_code == 200
+    times.append((time.perf_counter() - started) * 1000)
+  one_by_one = statistics.median(times)
+  print(f'/shows/create: {one_by_one:.1f} ms per show')
+
+  print(f'{"weeks":>6} {"days":>5} {"shows":>6} {"ms":>8} {"queries":>8} {"one by one ms":>14}')
+  for venue_id, weeks, weekdays in ((2, 12, None), (3, 52, ['TU', 'FR', 'SA']), (4, 300, ['FR', 'SA']),
+                                    (5, 714, list(('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')))):
+    response, elapsed, queries = post(client, residency(venue_id, venue_id, first, weeks, weekdays))
+    assert response.status_code == 201, response.get_json()
+    created = response.get_json()["data"]
+    assert len({show["id"] for show in created}) == len(created) == count_shows(venue_id) - shows_per_venue
+    print(f'{weeks:>6} {len(weekdays or [None]):>5} {len(created):>6} {elapsed:>8.1f} {queries:>8}'
+          f' {one_by_one * len(created):>14.0f}')
+  with app.app_context():
+    assert not check_show_counters()
+
+  # a residency overlapping one show of another creates nothing
+  before = count_shows(6)
+  response, elapsed, queries = post(client, residency(
+    6, 5, first + timedelta(weeks=100, hours=1), 52, ['MO', 'TH'],
+    end_time=(first + timedelta(weeks=100, hours=2)).isoformat()))
+  assert response.status_code == 409, response.status_code
+  conflicts = response.get_json()["conflicts"]
+  assert len(conflicts) >= 103 and all(conflict["reason"].startswith('The artist') for conflict in conflicts)
+  assert count_shows(6) == before
+  with app.app_context():
+    assert not check_show_counters()
+  print(f'an overlapping residency: 409 in {elapsed:.1f} ms, nothing created')
+
+  for body, status in ((residency(7, 7, first, 0), 400), (residency(7, 7, first, 5001), 400),
+                       (residency(7, 7, first, 4, ['XX']), 400), (residency(10**9, 7, first, 4), 404),
+                       (residency(7, 7, first, 4, end_time=first.isoformat()), 400),
+                       (dict(residency(7, 7, first, 4), start_time='2026-11-06T20:00:00+01:00'), 400)):
+    assert post(client, body)[0].status_code == status, body
+
+  # two residencies of one artist at the same time: one is created
+  responses = []
+
+  def book(venue_id):
+    responses.append(app.test_client().post('/api/v1/shows/recurring', json=residency(
+      venue_id, 8, first + timedelta(weeks=1), 52, ['WE', 'SU'])))
+
+  threads = [threading.Thread(target=book, args=(venue_id,)) for venue_id in (8, 9)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  statuses = sorted(response.status_code for response in responses)
+  assert statuses == [201, 409], statuses
+  created = next(response for response in responses if response.status_code == 201).get_json()["data"]
+  assert count_shows(8) + count_shows(9) == 2 * shows_per_venue + len(created)
+  print(f'two overlapping residencies at once: {statuses}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Read replica routing check (see replicas.py), with two SQLite files as
+# the primary and its replica. "Replication" is an explicit copy of the
+# primary file, so the replica lags until it is called.
+#
+# Read views must read from the replica and writes must go to the primary
+# only. A client that has just written reads from the primary for
+# READ_YOUR_WRITES_SECONDS and then from the replica again. Pages read from
+# the lagging replica right after a write must not be cached.
+#----------------------------------------------------------------------------#
+
+import os
+import sqlite3
+import tempfile
+import time
+
+directory = tempfile.mkdtemp(prefix='fyyur-replicas-')
+PRIMARY = os.path.join(directory, 'primary.db')
+REPLICA = os.path.join(directory, 'replica.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + PRIMARY
+os.environ['DATABASE_REPLICA_URLS'] = 'sqlite:///' + REPLICA
+os.environ['READ_YOUR_WRITES_SECONDS'] = '1'
+os.environ['CACHE_BACKEND'] = 'memory'
+
+from sqlalchemy import event
+
+from common import app, reset_db, seed
+from models import db
+
+NEW_VENUE = {
+  "name": "Replica Lag Lounge",
+  "city": "Springfield",
+  "state": "CA",
+  "address": "1 Lag Street",
+  "phone": "415-555-0199",
+  "genres": ["Jazz"],
+  "image_link": "",
+  "facebook_link": "https://www.facebook.com/replicalag",
+  "website": "",
+  "seeking_talent": "No",
+  "seeking_description": "",
+}
+
+
+def replicate():
+  source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+  source.backup(target)
+  source.close()
+  target.close()
+
+
+def statements_on(engine):
+  statements = []
+  event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+  return statements
+
+
+def lists_venue(client):
+  return NEW_VENUE["name"] in client.get('/venues').get_data(as_text=True)
+
+
+def main():
+  reset_db()
+  seed(20)
+  replicate()
+  with app.app_context():
+    primary_statements = statements_on(db.engine)
+    replica_statements = statements_on(db.engines['replica_0'])
+
+  writer, reader = app.test_client(), app.test_client()
+  for url in ('/venues', '/venues/1', '/artists', '/artists/1', '/shows',
+              '/venues/search?search_term=Venue', '/artists/search?search_term=Artist'):
+    del primary_statements[:], replica_statements[:]
+    assert reader.get(url).status_code == 200, url
+    assert replica_statements and not primary_statements, f'{url} did not read from the replica'
+    print(f'{url:>40}: {len(replica_statements)} queries on the replica')
+
+  del replica_statements[:]
+  assert writer.post('/venues/create', data=NEW_VENUE).status_code == 200
+  writes = [statement for statement in replica_statements if not statement.lstrip().upper().startswith('SELECT')]
+  assert not writes, f'writes reached the replica: {writes}'
+  assert not lists_venue(reader), 'the replica is expected to lag'
+  replicate()
+  assert lists_venue(reader), 'a page read from the lagging replica was cached'
+  print('after a write: others read from the lagging replica, and its pages are not cached')
+
+  assert writer.post('/venues/create', data=dict(NEW_VENUE, name='Second Lag Lounge')).status_code == 200
+  assert 'Second Lag Lounge' in writer.get('/venues').get_data(as_text=True), \
+    'the writer does not read its own write'
+  print('after a write: the writer reads from the primary')
+
+  time.sleep(app.config['READ_YOUR_WRITES_SECONDS'] + 0.1)
+  del primary_statements[:]
+  writer.get('/venues/1')
+  assert not primary_statements, 'the writer still reads from the primary'
+  print(f'after {app.config["READ_YOUR_WRITES_SECONDS"]:g}s: the writer reads from the replica again')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# /search full-text index vs the name ILIKE path of search_venues and
+# search_artists, at 100k venues + artists.
+#
+# On SQLite this exercises the in-process inverted index; run it with
+# DATABASE_URL pointing at Postgres to measure the tsvector path instead.
+#----------------------------------------------------------------------------#
+
+import time
+
+from common import app, reset_db, seed
+from models import Venue, Artist
+import search
+from app import search_by_name
+
+QUERIES = ['venue 4242', 'artist 12', 'jazz', 'springfield ca', 'riverside blues 777']
+PER_PAGE = 20
+
+
+def best_ms(fn, repeat=20):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  reset_db()
+  seed(50000, num_artists=50000, shows_per_venue=1)
+  with app.test_request_context():
+    if not search.using_postgres():
+      start = time.perf_counter()
+      search.get_memory_index()
+      print(f'in-process index built in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+    print(f'{"query":>22} {"fulltext ms":>12} {"ilike ms":>10}')
+    for query in QUERIES:
+      fulltext = best_ms(lambda: search.search_catalog(query, 1, PER_PAGE))
+      ilike = best_ms(lambda: (search_by_name(Venue, query, 1),
+                               search_by_name(Artist, query, 1)), repeat=3)
+      print(f'{query:>22} {fulltext:>12.2f} {ilike:>10.2f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,73 @@
+#----------------------------------------------------------------------------#
+# /shows/create and the artist / venue typeahead (see choices.py).
+#
+# The form page used to load every artist and venue as ORM objects and
+# ship them as <option>s; it now runs no query and its fields look names up
+# as the user types. For each catalog size this prints the time of the
+# legacy choice lists, the size and time of the page, and the time of a
+# typeahead lookup (the first one loads the names). Lookups must agree
+# with a prefix query on the database, and see renames once committed.
+#----------------------------------------------------------------------------#
+
+import time
+
+from common import app, reset_db, seed, time_get
+from models import db, Artist, Venue
+from choices import drop_names
+from sqlstats import check_query_budget
+
+
+def legacy_choices():
+  # what create_shows() used to do on every GET
+  started = time.perf_counter()
+  artists = [(artist.id, artist.name) for artist in Artist.query.order_by(Artist.id).all()]
+  venues = [(venue.id, venue.name) for venue in Venue.query.order_by(Venue.id).all()]
+  elapsed = (time.perf_counter() - started) * 1000
+  options = sum(len(f'<option value="{entity_id}">{name}</option>') for entity_id, name in artists + venues)
+  return elapsed, options
+
+
+def check_prefixes(client):
+  for model, url in ((Artist, '/artists/typeahead'), (Venue, '/venues/typeahead')):
+    for term in ('artist 1', 'VENUE 2', 'venue 99', 'nobody'):
+      with app.app_context():
+        expected = [name for name, in db.session.query(model.name)
+                    .filter(db.func.lower(model.name).startswith(term.lower()))
+                    .order_by(db.func.lower(model.name)).limit(10)]
+      names = [entry["name"] for entry in client.get(url, query_string={"q": term}).get_json()]
+      assert names == expected, (url, term, names, expected)
+
+
+def check_rename(client):
+  with app.app_context():
+    db.session.get(Artist, 1).name = 'Zz Renamed Artist'
+    db.session.commit()
+  names = client.get('/artists/typeahead?q=zz').get_json()
+  assert names == [{"id": 1, "name": 'Zz Renamed Artist'}], names
+
+
+def main():
+  # the form templates render a CSRF token; this script only GETs
+  app.config['WTF_CSRF_ENABLED'] = True
+  print(f'{"catalog":>8} {"legacy ms":>10} {"legacy KB":>10} {"page ms":>8} {"page KB":>8}'
+        f' {"first lookup ms":>16} {"lookup ms":>10}')
+  for size in (1000, 10000, 40000):
+    reset_db()
+    seed(size, num_artists=size, shows_per_venue=0)
+    drop_names(Artist, Venue)  # seeded without the ORM
+    client = app.test_client()
+    with app.app_context():
+      legacy_ms, legacy_bytes = legacy_choices()
+    page = check_query_budget(client, '/shows/create')
+    started = time.perf_counter()
+    check_query_budget(client, '/artists/typeahead?q=artist%201')
+    first_ms = (time.perf_counter() - started) * 1000
+    print(f'{size:>8} {legacy_ms:>10.1f} {legacy_bytes / 1024:>10.0f} {time_get(client, "/shows/create"):>8.1f}'
+          f' {len(page.get_data()) / 1024:>8.1f} {first_ms:>16.1f}'
+          f' {time_get(client, "/artists/typeahead?q=artist%201234"):>10.2f}')
+    check_prefixes(client)
+    check_rename(client)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,52 @@
+#----------------------------------------------------------------------------#
+# Route latency on a large Show table, without and with the Show indexes
+# (migration e83f1a4c5d27).
+#
+#   python benchmarks/bench_show_indexes.py [num_venues] [shows_per_venue]
+#----------------------------------------------------------------------------#
+
+import sys
+
+from common import app, reset_db, seed, time_get
+from models import db, Show
+
+ROUTES = [
+  '/venues',
+  '/venues/1',
+  '/artists/1',
+  '/shows',
+  '/venues/search?search_term=venue 12',
+  '/artists/search?search_term=artist 12',
+]
+
+
+def measure(client):
+  return {route: time_get(client, route) for route in ROUTES}
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  shows_per_venue = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+  reset_db()
+  seed(num_venues, shows_per_venue=shows_per_venue)
+  client = app.test_client()
+
+  with app.app_context():
+    engine = db.engine
+  indexes = list(Show.__table__.indexes)
+
+  for index in indexes:
+    index.drop(engine)
+  before = measure(client)
+  for index in indexes:
+    index.create(engine)
+  after = measure(client)
+
+  print(f'{num_venues * shows_per_venue} shows')
+  print(f'{"route":>40} {"before ms":>10} {"after ms":>10}')
+  for route in ROUTES:
+    print(f'{route:>40} {before[route]:>10.1f} {after[route]:>10.1f}')
+
+
+if __name__ == '__main__':
+  main()
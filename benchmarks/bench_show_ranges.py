@@ -0,0 +1,168 @@
+#----------------------------------------------------------------------------#
+# /shows filters and the venue / artist calendar feeds (see feeds.py) on a
+# large Show table.
+#
+# For each filter this prints the time of the first page, and the SQLite
+# plan of its query: bounded filters must search an index rather than scan
+# the Show table. Following the pages of a filter must list exactly the
+# shows it selects. For a feed it prints the time and queries of a first
+# (cold) request, a poll of the unchanged feed, a conditional poll, and a
+# poll after a new show, which must read back only the new show's month.
+#
+#   python benchmarks/bench_show_ranges.py [num_venues] [shows_per_venue]
+#----------------------------------------------------------------------------#
+
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import app, reset_db, seed, time_get, GENRES
+import cache
+import feeds
+from cache import calendar_month
+from feeds import month_of, month_start
+from models import db, Venue, Show, artist_genres
+from sqlstats import check_query_budget, captured_queries
+
+JAZZ = GENRES.index('Jazz') + 1
+
+
+def statements_of(client, url):
+  # (statement, parameters) of each query of a GET
+  statements = []
+
+  def record(conn, cursor, statement, parameters, *args):
+    statements.append((statement, parameters))
+
+  with app.app_context():
+    engine = db.engine
+  event.listen(engine, 'before_cursor_execute', record)
+  try:
+    assert client.get(url).status_code == 200, url
+  finally:
+    event.remove(engine, 'before_cursor_execute', record)
+  return statements
+
+
+def query_plan(statement, parameters):
+  with app.app_context():
+    connection = db.engine.raw_connection()
+  try:
+    rows = connection.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+  finally:
+    connection.close()
+  return [row[-1] for row in rows]
+
+
+def listed_shows(client, url):
+  # follow the pages of url; the number of shows listed
+  listed = 0
+  while url:
+    page = client.get(url).get_data(as_text=True)
+    listed += page.count('tile-show')
+    next_page = re.search(r'<li class="next"><a href="([^"]+)"', page)
+    url = next_page.group(1).replace('&amp;', '&') if next_page else None
+  return listed
+
+
+def main():
+  num_venues = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  shows_per_venue = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+  reset_db()
+  seed(num_venues, shows_per_venue=shows_per_venue)
+  with app.app_context():
+    # some of the artists play jazz too
+    artist_ids = [artist_id for artist_id, in db.session.query(Show.artist_id).distinct()]
+    db.session.execute(artist_genres.insert(), [{"artist_id": artist_id, "genre_id": JAZZ}
+                                                for artist_id in artist_ids if artist_id % 7 == 0])
+    db.session.commit()
+    shows = db.session.query(Show.start_time, Show.venue_id, Show.artist_id, Venue.city) \
+      .join(Venue, Show.venue_id == Venue.id).all()
+  jazz = {artist_id for artist_id in artist_ids if artist_id % 7 == 0}
+  client = app.test_client()
+
+  today = datetime.now().date()
+  week = (today, today + timedelta(days=6))
+  month = (today, today + timedelta(days=30))
+  filters = [
+    ('all shows', {}, None),
+    ('one week', {"from": week[0], "to": week[1]},
+     lambda show: week[0] <= show.start_time.date() <= week[1]),
+    ('one venue, one month', {"venue_id": 1, "from": month[0], "to": month[1]},
+     lambda show: show.venue_id == 1 and month[0] <= show.start_time.date() <= month[1]),
+    ('one artist, from today', {"artist_id": 2, "from": today},
+     lambda show: show.artist_id == 2 and show.start_time.date() >= today),
+    ('one city, one week', {"city": 'Salem', "from": week[0], "to": week[1]},
+     lambda show: show.city == 'Salem' and week[0] <= show.start_time.date() <= week[1]),
+    ('jazz, one week', {"genre": 'Jazz', "from": week[0], "to": week[1]},
+     lambda show: show.artist_id in jazz and week[0] <= show.start_time.date() <= week[1]),
+  ]
+
+  with app.app_context():
+    started = time.perf_counter()
+    Show.query.all()
+    scan_ms = (time.perf_counter() - started) * 1000
+  print(f'{len(shows)} shows; loading them all to filter them takes {scan_ms:.0f} ms')
+  print(f'{"filter":>24} {"ms":>7}  plan')
+  for name, args, selects in filters:
+    url = '/shows?' + '&'.join(f'{key}={value}' for key, value in args.items())
+    check_query_budget(client, url)
+    statement, parameters = statements_of(client, url)[-1]
+    plan = query_plan(statement, parameters)
+    print(f'{name:>24} {time_get(client, url):>7.1f}  {" / ".join(plan)}')
+    if selects is not None:
+      assert not any(re.match(r'SCAN Show\b', step) for step in plan), f'{name} scans the Show table'
+      page_size = app.config['SHOWS_PER_PAGE']
+      app.config['SHOWS_PER_PAGE'] = 1000
+      listed, expected = listed_shows(client, url), sum(1 for show in shows if selects(show))
+      app.config['SHOWS_PER_PAGE'] = page_size
+      assert listed == expected, f'{name}: listed {listed} shows, expected {expected}'
+  assert client.get('/shows?from=tomorrow').status_code == 400
+
+  # feeds, with a page cache
+  cache.page_cache = feeds.page_cache = cache.PageCache(cache.MemoryBackend(100000, 3600))
+  current = month_of(today)
+  past, future = app.config['CALENDAR_PAST_MONTHS'], app.config['CALENDAR_FUTURE_MONTHS']
+  # the longest window a feed may cover, ending where the default one does
+  first_month = calendar_month(month_start(current + future - app.config['CALENDAR_MAX_MONTHS'] + 1))
+  print(f'\n{"feed":>44} {"ms":>7} {"queries":>8}')
+  for url in ('/venues/1/calendar.ics', '/artists/2/calendar.json', f'/venues/3/calendar.ics?from={first_month}'):
+    with captured_queries() as statements:
+      started = time.perf_counter()
+      cold = client.get(url)
+      cold_ms = (time.perf_counter() - started) * 1000
+    print(f'{url + " (cold)":>44} {cold_ms:>7.1f} {len(statements):>8}')
+    with captured_queries() as statements:
+      warm = time_get(client, url)
+    assert not statements, f'{url} ran queries when cached'
+    print(f'{url + " (poll)":>44} {warm:>7.1f} {0:>8}')
+    etag = cold.headers['ETag']
+    print(f'{url + " (304)":>44} {time_get(client, url, headers={"If-None-Match": etag}):>7.1f} {0:>8}')
+
+  # a new show in three months' time: only its month is read again
+  url = '/venues/1/calendar.ics'
+  start_time = datetime.combine(today.replace(day=1) + timedelta(days=95), datetime.min.time()).replace(hour=21)
+  response = client.post('/shows/create', data={"venue_id": 1, "artist_id": 2,
+                                                "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S')})
+  assert response.status_code == 200
+  statements = statements_of(client, url)
+  shows_query = [parameters for statement, parameters in statements if 'FROM "Show"' in statement]
+  assert len(shows_query) == 1, statements
+  bounds = [value for value in shows_query[0] if isinstance(value, str) and re.match(r'\d{4}-\d\d-\d\d ', value)]
+  assert len(bounds) == 2 and bounds[0][:7] == start_time.strftime('%Y-%m'), bounds
+  body = client.get(url).get_data(as_text=True)
+  with app.app_context():
+    show_id = db.session.query(db.func.max(Show.id)).scalar()
+    expected = db.session.query(Show).filter(Show.venue_id == 1,
+                                             Show.start_time >= month_start(current - past),
+                                             Show.start_time < month_start(current + future + 1)).count()
+  assert f'UID:show-{show_id}@fyyur' in body, 'the new show is not in the feed'
+  assert body.count('BEGIN:VEVENT') == expected, (body.count('BEGIN:VEVENT'), expected)
+  print(f'after a new show: 1 query, for {bounds[0][:7]} only; {expected} events in {past + future + 1} months')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Startup: time to import the app, as a worker (wsgi.py) and as the `flask`
+# command (app.py, with Flask-Migrate), each in a fresh interpreter; then
+# the slowest imports of app.py, from python -X importtime.
+#----------------------------------------------------------------------------#
+
+import os
+import statistics
+import subprocess
+import sys
+
+from common import ROOT
+
+RUNS = 15
+TIMER = 'import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)'
+
+
+def environment(**extra):
+  return dict(os.environ, SECRET_KEY='bench', **extra)
+
+
+def import_times(module, env):
+  times = []
+  for run in range(RUNS):
+    output = subprocess.run([sys.executable, '-c', TIMER.format(module=module)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    times.append(float(output) * 1000)
+  return times
+
+
+def slowest_imports(env, count=12):
+  # (cumulative ms, module) of the modules app.py imports directly
+  stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True).stderr
+  imports = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    self_time, cumulative, name = line[len('import time:'):].split('|')
+    imports.append((len(name) - len(name.lstrip()), int(cumulative) / 1000, name.strip()))
+  # a module is listed after everything it imports, one level deeper
+  app_index = next(index for index, (depth, cumulative, name) in enumerate(imports) if name == 'app')
+  app_depth = imports[app_index][0]
+  children = []
+  for depth, cumulative, name in reversed(imports[:app_index]):
+    if depth <= app_depth:
+      break
+    if depth == app_depth + 2:
+      children.append((cumulative, name))
+  return sorted(children, reverse=True)[:count]
+
+
+def main():
+  print(f'{"entry point":>28} {"min ms":>8} {"median ms":>10}')
+  for label, module, env in (('wsgi (gunicorn workers)', 'wsgi', environment()),
+                             ('app (flask command)', 'app', environment(MIGRATIONS='1'))):
+    times = import_times(module, env)
+    print(f'{label:>28} {min(times):>8.0f} {statistics.median(times):>10.0f}')
+  print('\nslowest imports of app.py in a worker (cumulative ms, under -X importtime):')
+  for cumulative, name in slowest_imports(environment(MIGRATIONS='0')):
+    print(f'{cumulative:>8.1f}  {name}')
+
+
+if __name__ == '__main__':
+  main()
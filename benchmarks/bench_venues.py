@@ -0,0 +1,27 @@
+#----------------------------------------------------------------------------#
+# /venues: query count and latency as the number of venues grows.
+#
+# The area listing is built from one grouped query, so the number of SQL
+# statements per request must not depend on the number of venues.
+#----------------------------------------------------------------------------#
+
+from common import app, reset_db, seed, count_queries, time_get
+
+
+def main():
+  print(f'{"venues":>8} {"queries":>8} {"ms":>10}')
+  query_counts = set()
+  for num_venues in (10, 100, 1000, 5000):
+    reset_db()
+    seed(num_venues)
+    client = app.test_client()
+    with count_queries() as counter:
+      client.get('/venues')
+    query_counts.add(counter["queries"])
+    print(f'{num_venues:>8} {counter["queries"]:>8} {time_get(client, "/venues"):>10.1f}')
+
+  assert len(query_counts) == 1, f'query count grew with venue count: {sorted(query_counts)}'
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# Shared helpers for the benchmark scripts.
+#
+# Every script runs against a throwaway SQLite file unless DATABASE_URL is
+# already set, so they can be run from a checkout without a local Postgres:
+#
+#   python benchmarks/bench_venues.py
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+# measure the routes themselves, not the page cache, unless asked to
+os.environ.setdefault('CACHE_BACKEND', 'none')
+
+if 'DATABASE_URL' not in os.environ:
+  _db_file = os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'bench.db')
+  os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file
+
+from sqlalchemy import event
+
+from app import app
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from counters import rebuild_show_counters
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'MA', 'CO']
+CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Clinton', 'Salem']
+GENRES = ['Jazz', 'Blues', 'Rock n Roll', 'Folk']
+
+
+def reset_db():
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+
+
+def seed(num_venues, num_artists=None, shows_per_venue=2):
+  """Fill the database with synthetic venues, artists and shows."""
+  num_artists = num_artists or max(1, num_venues // 2)
+  now = datetime.now()
+  with app.app_context():
+    db.session.bulk_insert_mappings(Venue, [{
+      "id": i + 1,
+      "name": f"Venue {i}",
+      "city": CITIES[i % len(CITIES)],
+      "state": STATES[i % len(STATES)],
+      "address": f"{i} Main Street",
+      "phone": "415-555-0100",
+      "seeking_talent": bool(i % 2),
+    } for i in range(num_venues)])
+    db.session.bulk_insert_mappings(Artist, [{
+      "id": i + 1,
+      "name": f"Artist {i}",
+      "city": CITIES[i % len(CITIES)],
+      "state": STATES[i % len(STATES)],
+      "phone": "415-555-0100",
+    } for i in range(num_artists)])
+    db.session.bulk_insert_mappings(Genre, [{"id": i + 1, "name": name} for i, name in enumerate(GENRES)])
+    # venues are Jazz and Blues, artists Rock n Roll
+    db.session.execute(venue_genres.insert(), [{"venue_id": i + 1, "genre_id": genre_id}
+                                               for i in range(num_venues) for genre_id in (1, 2)])
+    db.session.execute(artist_genres.insert(), [{"artist_id": i + 1, "genre_id": 3}
+                                                for i in range(num_artists)])
+    db.session.bulk_insert_mappings(Show, [{
+      "venue_id": v + 1,
+      "artist_id": (v * shows_per_venue + n) % num_artists + 1,
+      "start_time": now + timedelta(days=(n - shows_per_venue // 2) * 7 + 1),
+    } for v in range(num_venues) for n in range(shows_per_venue)])
+    db.session.commit()
+    rebuild_show_counters()
+
+
+@contextmanager
+def count_queries():
+  """Count the SQL statements issued on the app's engine inside the block."""
+  counter = {"queries": 0}
+
+  def before_cursor_execute(*args):
+    counter["queries"] += 1
+
+  with app.app_context():
+    engine = db.engine
+  event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+  try:
+    yield counter
+  finally:
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def time_get(client, url, repeat=5, headers=None):
+  """Return the best-of-`repeat` wall time in milliseconds for a GET."""
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    elapsed = (time.perf_counter() - start) * 1000
+    expected = 304 if headers and 'If-None-Match' in headers else 200
+    assert response.status_code == expected, (url, response.status_code)
+    best = elapsed if best is None else min(best, elapsed)
+  return best
@@ -0,0 +1,162 @@
+#----------------------------------------------------------------------------#
+# Show bookings: a venue, and an artist, play one show at a time.
+#
+# A show runs from start_time to end_time (SHOW_DEFAULT_MINUTES later when
+# not given) and lasts at most SHOW_MAX_MINUTES. Two shows of the same venue
+# or of the same artist conflict when their times overlap; one may start
+# when the other ends.
+#
+# As no show is longer than max_duration(), the only shows that can overlap
+# [start, end) are those starting after start - max_duration() and before
+# end: a bounded range of the (venue_id, start_time) and (artist_id,
+# start_time) indexes, found in O(log n) however long the venue's or the
+# artist's history, instead of a scan of all of its earlier shows.
+# max_duration() is SHOW_MAX_MINUTES, or the longest show stored when that
+# is longer (booked before the setting was lowered): read once per process,
+# as no show longer than the setting can be booked since.
+#
+# Check once the counters of the new shows (see counters.py) are written,
+# with the shows or before them: those writes hold the venue and artist rows
+# (the whole database on SQLite) until the transaction ends, so that
+# concurrent bookings of the same venue or artist are checked one after the
+# other.
+#----------------------------------------------------------------------------#
+
+import bisect
+import math
+import threading
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from models import app, db, Show
+
+# the position of the new show in the list checked, 'venue' or 'artist',
+# and the times and id of the show it overlaps (None for another new show)
+Conflict = namedtuple('Conflict', 'index side start_time end_time show_id')
+
+SIDES = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')  # as in RRULE BYDAY
+
+
+longest_show = None  # minutes, of the longest show stored
+longest_show_lock = threading.Lock()
+
+
+def stored_max_minutes():
+  # one scan of the Show table
+  if db.engine.dialect.name == 'postgresql':
+    minutes = db.func.extract('epoch', Show.end_time - Show.start_time) / 60
+  else:
+    minutes = (db.func.julianday(Show.end_time) - db.func.julianday(Show.start_time)) * 24 * 60
+  return math.ceil(db.session.query(db.func.max(minutes)).scalar() or 0)
+
+
+def max_duration():
+  # the longest a show can be, booked now or before
+  global longest_show
+  if longest_show is None:
+    with longest_show_lock:
+      if longest_show is None:
+        longest_show = stored_max_minutes()
+  return timedelta(minutes=max(app.config['SHOW_MAX_MINUTES'], longest_show))
+
+
+def show_end_time(start_time, end_time=None):
+  return end_time or start_time + timedelta(minutes=app.config['SHOW_DEFAULT_MINUTES'])
+
+
+def check_times(start_time, end_time):
+  # an error message, or None
+  if end_time <= start_time:
+    return 'A show must end after it starts.'
+  if end_time - start_time > timedelta(minutes=app.config['SHOW_MAX_MINUTES']):
+    return f'A show may last at most {app.config["SHOW_MAX_MINUTES"]} minutes.'
+  return None
+
+
+def weekly_times(start_time, end_time, weeks, weekdays):
+  # [(start_time, end_time)] of a show repeated on weekdays (0 is Monday) of
+  # weeks weeks from the week of start_time, at its time of day; as with an
+  # RRULE, the days of the first week before start_time are skipped
+  duration = end_time - start_time
+  monday = start_time - timedelta(days=start_time.weekday())
+  times = []
+  for week in range(weeks):
+    for weekday in sorted(set(weekdays)):
+      occurrence = monday + timedelta(days=7 * week + weekday)
+      if occurrence >= start_time:
+        times.append((occurrence, occurrence + duration))
+  return times
+
+
+def conflict_message(conflict):
+  other = 'a show' if conflict.show_id is not None else 'another of these shows'
+  return (f'The {conflict.side} already has {other} from {conflict.start_time:%Y-%m-%d %H:%M}'
+          f' to {conflict.end_time:%Y-%m-%d %H:%M}.')
+
+
+class Schedule:
+  # the shows of one venue or artist, as (start_time, end_time, show_id) in
+  # start time order
+
+  def __init__(self, shows=()):
+    self.shows = sorted(shows, key=lambda show: show[0])
+    self.starts = [show[0] for show in self.shows]
+
+  def conflict(self, start_time, end_time):
+    # the first show overlapping [start_time, end_time), or None
+    first = bisect.bisect_right(self.starts, start_time - max_duration())
+    last = bisect.bisect_left(self.starts, end_time)
+    for show in self.shows[first:last]:
+      if show[1] > start_time:
+        return show
+    return None
+
+  def add(self, start_time, end_time, show_id=None):
+    position = bisect.bisect_right(self.starts, start_time)
+    self.starts.insert(position, start_time)
+    self.shows.insert(position, (start_time, end_time, show_id))
+
+
+def booked(entity_fk, entity_id, after, before, exclude_ids=()):
+  # the Schedule of the shows of a venue or artist starting between after
+  # and before, one index range
+  query = db.session.query(Show.start_time, Show.end_time, Show.id) \
+    .filter(entity_fk == entity_id, Show.start_time > after, Show.start_time < before)
+  if exclude_ids:
+    query = query.filter(Show.id.notin_(exclude_ids))
+  return Schedule(tuple(row) for row in query)
+
+
+def booked_schedules(entity_fk, entity_ids, after, before):
+  # {entity_id: Schedule} of the shows of several venues or artists starting
+  # between after and before, one query; empty for the others
+  shows = defaultdict(list)
+  rows = db.session.query(entity_fk, Show.start_time, Show.end_time, Show.id) \
+    .filter(entity_fk.in_(entity_ids), Show.start_time > after, Show.start_time < before)
+  for entity_id, start_time, end_time, show_id in rows:
+    shows[entity_id].append((start_time, end_time, show_id))
+  schedules = defaultdict(Schedule)
+  schedules.update((entity_id, Schedule(entity_shows)) for entity_id, entity_shows in shows.items())
+  return schedules
+
+
+def find_conflicts(venue_id, artist_id, times, exclude_ids=()):
+  # the Conflicts of new shows of a venue and an artist, [(start_time,
+  # end_time)], with the shows booked (but those of exclude_ids) and with
+  # each other; two queries however many shows
+  if not times:
+    return []
+  after = min(start_time for start_time, end_time in times) - max_duration()
+  before = max(end_time for start_time, end_time in times)
+  conflicts = []
+  for (side, entity_fk), entity_id in zip(SIDES, (venue_id, artist_id)):
+    schedule = booked(entity_fk, entity_id, after, before, exclude_ids)
+    for index, (start_time, end_time) in enumerate(times):
+      show = schedule.conflict(start_time, end_time)
+      if show is None:
+        schedule.add(start_time, end_time)
+      else:
+        conflicts.append(Conflict(index, side, *show))
+  return sorted(conflicts, key=lambda conflict: conflict.index)
@@ -0,0 +1,248 @@
+#----------------------------------------------------------------------------#
+# Rendered page cache.
+#
+# Read views decorated with @cached_page store their rendered HTML under a
+# namespace per route and entity ('venues', 'venue:<id>', 'shows', ...) and a
+# key per URL (so every ?after= page of /shows is its own entry). A write
+# handler invalidates exactly the namespaces whose pages it changes; a
+# namespace is invalidated by bumping its version, which orphans all of its
+# entries at once. Writes that touch every page (see rebuild_show_counters)
+# call invalidate_all(), which bumps a generation that is part of every key.
+#
+# Nothing is written when a show starts, so a page that splits shows into
+# upcoming and past calls expire_page_at() with its next upcoming start time,
+# and is cached no longer than that.
+#
+# CACHE_BACKEND selects the store:
+#   'memory' - per-process LRU, bounded by CACHE_MAX_ENTRIES and CACHE_TTL.
+#              Invalidations only reach the worker that made the write, so
+#              other workers may serve a page up to CACHE_TTL seconds old.
+#   'redis'  - CACHE_REDIS_URL (any Redis-compatible server; needs the
+#              `redis` package). Shared by all workers.
+#   'none'   - caching disabled.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import g, request, session, jsonify
+
+from models import app, db, Show
+from replicas import replica_may_lag
+
+
+class MemoryBackend:
+
+  def __init__(self, max_entries, ttl):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.entries = OrderedDict()  # key -> (expires_at, value)
+    self.versions = {}
+    self.evictions = 0
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      if entry[0] < time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return entry[1]
+
+  def set(self, key, value, ttl=None):
+    with self.lock:
+      self.entries[key] = (time.monotonic() + min(ttl or self.ttl, self.ttl), value)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+        self.evictions += 1
+
+  def version(self, namespace):
+    return self.versions.get(namespace, 0)
+
+  def versions_of(self, *namespaces):
+    return [self.versions.get(namespace, 0) for namespace in namespaces]
+
+  def bump(self, namespace):
+    with self.lock:
+      self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+  def size(self):
+    return len(self.entries)
+
+
+class RedisBackend:
+
+  def __init__(self, url, ttl):
+    import redis
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.evictions = 0  # evictions are Redis' own (maxmemory policy)
+
+  def get(self, key):
+    value = self.client.get('fyyur:page:' + key)
+    return value.decode('utf-8') if value is not None else None
+
+  def set(self, key, value, ttl=None):
+    self.client.setex('fyyur:page:' + key, min(ttl or self.ttl, self.ttl), value.encode('utf-8'))
+
+  def version(self, namespace):
+    return int(self.client.get('fyyur:version:' + namespace) or 0)
+
+  def versions_of(self, *namespaces):
+    # one round trip
+    return [int(value or 0) for value in self.client.mget(['fyyur:version:' + namespace for namespace in namespaces])]
+
+  def bump(self, namespace):
+    self.client.incr('fyyur:version:' + namespace)
+
+  def size(self):
+    return None
+
+
+# the namespace whose version is part of every key
+GENERATION = '*'
+
+
+class PageCache:
+
+  def __init__(self, backend):
+    self.backend = backend
+    self.stats = {"hits": 0, "misses": 0, "sets": 0, "invalidations": 0}
+
+  def entry_key(self, namespace, key):
+    version, generation = self.backend.versions_of(namespace, GENERATION)
+    return f'{namespace}:{version}.{generation}:{key}'
+
+  def get(self, namespace, key):
+    value = self.backend.get(self.entry_key(namespace, key))
+    self.stats["hits" if value is not None else "misses"] += 1
+    return value
+
+  def set(self, namespace, key, value, ttl=None):
+    self.backend.set(self.entry_key(namespace, key), value, ttl)
+    self.stats["sets"] += 1
+
+  def version(self, namespace):
+    return self.backend.version(namespace)
+
+  def invalidate(self, *namespaces):
+    for namespace in set(namespaces):
+      self.backend.bump(namespace)
+      self.stats["invalidations"] += 1
+
+  def snapshot(self):
+    return dict(self.stats, evictions=self.backend.evictions, entries=self.backend.size())
+
+
+def create_page_cache(config):
+  backend = config['CACHE_BACKEND']
+  if backend == 'none':
+    return None
+  if backend == 'redis':
+    return PageCache(RedisBackend(config['CACHE_REDIS_URL'], config['CACHE_TTL']))
+  return PageCache(MemoryBackend(config['CACHE_MAX_ENTRIES'], config['CACHE_TTL']))
+
+page_cache = create_page_cache(app.config)
+
+#----------------------------------------------------------------------------#
+# Views
+#----------------------------------------------------------------------------#
+
+def cached_page(namespace):
+  # namespace is a string, or a function of the view arguments for per-entity
+  # pages, e.g. lambda venue_id: f'venue:{venue_id}'
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # pages rendered with pending flash messages are user specific
+      if page_cache is None or session.get('_flashes'):
+        return view(**kwargs)
+      entry_namespace = namespace(**kwargs) if callable(namespace) else namespace
+      page = page_cache.get(entry_namespace, request.full_path)
+      if page is None:
+        page = view(**kwargs)
+        # only fully rendered pages are stored; redirects and streamed
+        # responses are passed through, as are pages read from a replica
+        # that may still be behind a recent write
+        ttl = page_ttl()
+        if isinstance(page, str) and not replica_may_lag() and (ttl is None or ttl > 0):
+          page_cache.set(entry_namespace, request.full_path, page, ttl)
+      return page
+    return wrapper
+  return decorator
+
+
+def expire_page_at(when):
+  # the page being rendered is out of date at `when` (naive local time, like
+  # Show.start_time); None for never
+  if when is not None:
+    g.page_expires_at = min(when, g.get('page_expires_at', when))
+
+
+def page_ttl():
+  # seconds the page being rendered may be cached for, or None for CACHE_TTL
+  expires_at = g.get('page_expires_at')
+  if expires_at is None:
+    return None
+  return int((expires_at - datetime.now()).total_seconds())
+
+
+def invalidate(*namespaces):
+  # call after the write has been committed
+  if page_cache is not None:
+    page_cache.invalidate(*namespaces)
+
+
+def invalidate_all():
+  # every cached page, in every namespace
+  invalidate(GENERATION)
+
+# Pages affected by a write. Compute them before the write (deletes remove
+# the rows they are derived from) and invalidate them after committing.
+#
+# The calendar feeds (see feeds.py) are cached a month at a time: a feed's
+# '<kind>-calendar:<id>' namespace holds its name and is bumped when any
+# entity it shows changes, '<kind>-calendar:<id>:<YYYY-MM>' holds the events
+# of a month and is bumped when a show of that month is added.
+
+def calendar_month(start_time):
+  return start_time.strftime('%Y-%m')
+
+
+def venue_pages(venue_id):
+  # the venue page, list and feed, /shows (venue names), and the pages and
+  # feeds of the artists that play there
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  pages = ['venues', f'venue:{venue_id}', f'venue-calendar:{venue_id}', 'shows']
+  for artist_id, in artist_ids:
+    pages += [f'artist:{artist_id}', f'artist-calendar:{artist_id}']
+  return pages
+
+
+def artist_pages(artist_id):
+  # the artist page, list and feed, /shows (artist names and images), and
+  # the pages and feeds of the venues and venue list (upcoming counts) it
+  # plays at
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  pages = ['artists', f'artist:{artist_id}', f'artist-calendar:{artist_id}', 'shows', 'venues']
+  for venue_id, in venue_ids:
+    pages += [f'venue:{venue_id}', f'venue-calendar:{venue_id}']
+  return pages
+
+
+def show_pages(venue_id, artist_id, start_time):
+  month = calendar_month(start_time)
+  return ['shows', 'venues', f'venue:{venue_id}', f'artist:{artist_id}',
+          f'venue-calendar:{venue_id}:{month}', f'artist-calendar:{artist_id}:{month}']
+
+
+@app.route('/cache/stats')
+def cache_stats():
+  return jsonify(page_cache.snapshot() if page_cache is not None else {"backend": "none"})
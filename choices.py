@@ -0,0 +1,116 @@
+#----------------------------------------------------------------------------#
+# Artist and venue names for the create-show form.
+#
+# The form does not list every artist and venue: its fields look them up
+# by name as the user types (static/js/script.js), through
+#
+#   GET /artists/typeahead?q=gun      GET /venues/typeahead?q=the%20mus
+#
+# which answer [{"id": 4, "name": "Guns N Petals"}, ...], the first
+# TYPEAHEAD_LIMIT names starting with q (ignoring case) in name order.
+# Lookups are answered from a per-process sorted list of (id, name) tuples
+# per model, loaded with one column-only query. It is dropped when a
+# commit adds, renames or deletes a venue or artist (and by the bulk
+# importer); other workers catch up within CHOICES_TTL seconds.
+#----------------------------------------------------------------------------#
+
+import bisect
+import threading
+import time
+from itertools import islice
+
+from flask import request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import app, db, Venue, Artist
+from api import json_response
+from sqlstats import query_budget
+
+MODELS = (Venue, Artist)
+
+
+class NameIndex:
+
+  def __init__(self, rows, ttl):
+    self.entries = sorted((name.casefold(), name, entity_id) for entity_id, name in rows)
+    self.keys = [key for key, name, entity_id in self.entries]
+    self.expires_at = time.monotonic() + ttl
+
+  def prefix(self, term, limit):
+    term = term.casefold()
+    start = bisect.bisect_left(self.keys, term)
+    matches = []
+    for key, name, entity_id in islice(self.entries, start, start + limit):
+      if not key.startswith(term):
+        break
+      matches.append({"id": entity_id, "name": name})
+    return matches
+
+
+name_indexes = {}  # model -> NameIndex
+name_indexes_lock = threading.Lock()
+
+
+def get_name_index(model):
+  index = name_indexes.get(model)
+  if index is None or index.expires_at < time.monotonic():
+    with name_indexes_lock:
+      index = name_indexes.get(model)
+      if index is None or index.expires_at < time.monotonic():
+        # name is nullable; a row without one cannot be looked up by it
+        rows = db.session.query(model.id, model.name).filter(model.name.isnot(None)).all()
+        index = name_indexes[model] = NameIndex(rows, app.config['CHOICES_TTL'])
+  return index
+
+
+def drop_names(*models):
+  # rows written without the ORM (bulk import): reloaded on the next lookup
+  for model in models:
+    name_indexes.pop(model, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_name_changes(session, flush_context):
+  if not name_indexes:
+    return
+  changed = session.info.setdefault('names_changed', set())
+  for entity in session.new | session.deleted:
+    if isinstance(entity, MODELS):
+      changed.add(type(entity))
+  for entity in session.dirty:
+    if isinstance(entity, MODELS) and inspect(entity).attrs.name.history.has_changes():
+      changed.add(type(entity))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_name_changes(session):
+  drop_names(*session.info.pop('names_changed', ()))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_name_changes(session, previous_transaction):
+  session.info.pop('names_changed', None)
+
+#----------------------------------------------------------------------------#
+# Endpoints
+#----------------------------------------------------------------------------#
+
+def typeahead(model):
+  term = request.args.get('q', '').strip()
+  if not term:
+    return json_response([])
+  limit = min(max(request.args.get('limit', app.config['TYPEAHEAD_LIMIT'], type=int), 1), 100)
+  return json_response(get_name_index(model).prefix(term, limit))
+
+
+@app.route('/artists/typeahead')
+@query_budget(1)  # only when the names are (re)loaded
+def artist_typeahead():
+  return typeahead(Artist)
+
+
+@app.route('/venues/typeahead')
+@query_budget(1)  # only when the names are (re)loaded
+def venue_typeahead():
+  return typeahead(Venue)
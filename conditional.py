@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# HTTP conditional requests (ETag) for the read pages.
+#
+# Each page has a validator: one aggregate query over the rows the page is
+# rendered from, returning the values that change whenever the page does
+# (row counts, latest updated_at, ...). A request whose If-None-Match still
+# matches is answered 304 before the page cache is consulted or a template
+# rendered.
+#
+# No Last-Modified is sent: deleting a row or a genre leaves every remaining
+# updated_at as it was, so no time taken from the rows moves on every
+# change, and an If-Modified-Since check would answer 304 with the deleted
+# row still on the page. The row counts in the ETag do change.
+#----------------------------------------------------------------------------#
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, session, make_response
+
+from models import db, Venue, Artist, Show, Genre
+
+
+def as_utc(value):
+  # updated_at columns hold naive UTC
+  return value.replace(tzinfo=timezone.utc) if value is not None else None
+
+
+def local_as_utc(value):
+  # start_time holds naive local time, like datetime.now() in the views
+  return value.astimezone(timezone.utc) if value is not None else None
+
+
+def conditional(validator):
+  # validator(**view_args) -> state, or None to skip (e.g. when the entity
+  # does not exist and the view redirects)
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # pages rendered with pending flash messages are user specific
+      if session.get('_flashes'):
+        return view(**kwargs)
+      state = validator(**kwargs)
+      if state is None:
+        return view(**kwargs)
+      etag = hashlib.sha1(repr((request.full_path, state)).encode('utf-8')).hexdigest()
+      not_modified = etag in request.if_none_match
+      response = make_response('', 304) if not_modified else make_response(view(**kwargs))
+      response.set_etag(etag)
+      # shared caches may store the page but must revalidate it
+      response.cache_control.public = True
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+def entity_validator(model, entity_fk, other_model, other_fk, entity_id):
+  # detail page: the entity, its shows and the other side of each show. The
+  # past/upcoming split changes whenever one of its shows starts, so the
+  # latest start time that has passed is part of the state.
+  now = datetime.now()
+  row = db.session.query(
+      model.updated_at,
+      db.func.count(Show.id),
+      db.func.max(Show.updated_at),
+      db.func.max(other_model.updated_at),
+      db.func.max(db.case((Show.start_time <= now, Show.start_time))),
+    ) \
+    .select_from(model) \
+    .outerjoin(Show, entity_fk == model.id) \
+    .outerjoin(other_model, other_model.id == other_fk) \
+    .filter(model.id == entity_id) \
+    .group_by(model.id, model.updated_at) \
+    .first()
+  return tuple(row) if row is not None else None
+
+
+def venue_validator(venue_id):
+  return entity_validator(Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+
+
+def artist_validator(artist_id):
+  return entity_validator(Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+
+
+def listing_validator(model):
+  # list page: the rows of the table and the genre filter pills
+  def validator():
+    count, updated_at = db.session.query(db.func.count(model.id), db.func.max(model.updated_at)).one()
+    genre_count = db.session.query(db.func.count(Genre.id)).scalar()
+    return count, updated_at, genre_count
+  return validator
+
+
+def shows_validator():
+  row = db.session.query(
+      db.func.count(Show.id),
+      db.func.max(Show.updated_at),
+      db.select(db.func.max(Venue.updated_at)).scalar_subquery(),
+      db.select(db.func.max(Artist.updated_at)).scalar_subquery(),
+    ).one()
+  return tuple(row)
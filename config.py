@@ -1,11 +1,111 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie (flash messages, read-your-writes): every worker,
+# and every restart, must use the same key. wsgi.py refuses to start
+# without one; a random key is only good for a single development process.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
-DEBUG = True
+DEBUG = os.environ.get('FLASK_DEBUG', '0') == '1'
+# Outside debug mode the app logs to stderr, and also to this file if set
+LOG_FILE = os.environ.get('LOG_FILE', '')
+# Set up Flask-Migrate for `flask db`; the web workers (wsgi.py) start
+# faster without it (and Alembic)
+MIGRATIONS = os.environ.get('MIGRATIONS', '1') == '1'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Connect to the database
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://postgres:x@localhost:5432/dbfyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://postgres:x@localhost:5432/dbfyyur')
+
+# Connection pool (QueuePool; see pool.py). The defaults are SQLAlchemy's.
+# Keep pool_size + max_overflow per worker times the number of workers under
+# the server's max_connections. In-memory SQLite is a single shared
+# connection (a StaticPool), which DB_POOL_OPTIONS do not apply to.
+DB_POOL_OPTIONS = {
+  'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+  'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+  # seconds to wait for a connection before raising
+  'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+}
+SQLALCHEMY_ENGINE_OPTIONS = {
+  # seconds after which a connection is replaced on checkout (-1: never);
+  # set below the server's or proxy's idle timeout
+  'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', -1)),
+  # test each connection on checkout and transparently replace dead ones
+  'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '0') == '1',
+}
+
+# Shows listing
+SHOWS_PER_PAGE = int(os.environ.get('SHOWS_PER_PAGE', 30))
+# Stream the /shows page to the client while it is being rendered.
+STREAM_SHOWS = os.environ.get('STREAM_SHOWS', '') == '1'
+
+# Search results
+SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
+# seconds before a worker rebuilds its in-process search index (other
+# workers' writes; not used on Postgres, see search.py)
+SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', 60))
+
+# Rendered page cache (see cache.py): 'memory', 'redis' or 'none'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+
+# JSON API (see api.py)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+# bodies smaller than this are not compressed
+API_COMPRESS_MIN_SIZE = int(os.environ.get('API_COMPRESS_MIN_SIZE', 500))
+# the most shows one POST /api/v1/shows/recurring may create
+RECURRING_MAX_SHOWS = int(os.environ.get('RECURRING_MAX_SHOWS', 5000))
+
+# Bulk export (see exporter.py): rows per server-side fetch
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+
+# Per-request SQL statistics (see sqlstats.py)
+# send SQL count / time and total time in Server-Timing response headers
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') == '1'
+# log statements slower than this, in milliseconds
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+
+# Prometheus metrics (see metrics.py): with several worker processes, a
+# directory shared by all of them, emptied before the server starts
+METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+# how often each worker writes its metrics there, in seconds
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+# Read replicas (see replicas.py): comma-separated database URLs
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+SQLALCHEMY_BINDS = {f'replica_{number}': url for number, url in enumerate(DATABASE_REPLICA_URLS)}
+# after writing, a client reads from the primary for this many seconds
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+
+# Artist / venue name lookups of the create-show form (see choices.py)
+TYPEAHEAD_LIMIT = int(os.environ.get('TYPEAHEAD_LIMIT', 10))
+# seconds before a worker reloads the names (other workers' writes)
+CHOICES_TTL = int(os.environ.get('CHOICES_TTL', 60))
+
+# Venue / artist calendar feeds (see feeds.py): months before and after the
+# current one in a feed, unless ?from= / ?to= ask for others
+CALENDAR_PAST_MONTHS = int(os.environ.get('CALENDAR_PAST_MONTHS', 1))
+CALENDAR_FUTURE_MONTHS = int(os.environ.get('CALENDAR_FUTURE_MONTHS', 12))
+# longest window a feed request may ask for, in months
+CALENDAR_MAX_MONTHS = int(os.environ.get('CALENDAR_MAX_MONTHS', 36))
+
+# Venue locations and "near me" searches (see geo.py)
+# CSV of city,state,latitude,longitude that venues are geocoded from
+CITY_CENTROIDS = os.environ.get('CITY_CENTROIDS', os.path.join(basedir, 'data', 'city_centroids.csv'))
+NEAR_DEFAULT_KM = float(os.environ.get('NEAR_DEFAULT_KM', 25))
+NEAR_MAX_KM = float(os.environ.get('NEAR_MAX_KM', 500))
+NEAR_RESULTS = int(os.environ.get('NEAR_RESULTS', 50))
+# grid index cell size, in degrees, and seconds before a worker reloads it
+# (other workers' writes)
+GEO_CELL_DEGREES = float(os.environ.get('GEO_CELL_DEGREES', 0.5))
+GEO_INDEX_TTL = int(os.environ.get('GEO_INDEX_TTL', 60))
+
+# Show bookings (see bookings.py): the length of a show given no end time,
+# and the longest a show may be, in minutes
+SHOW_DEFAULT_MINUTES = int(os.environ.get('SHOW_DEFAULT_MINUTES', 180))
+SHOW_MAX_MINUTES = int(os.environ.get('SHOW_MAX_MINUTES', 24 * 60))
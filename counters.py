@@ -0,0 +1,160 @@
+#----------------------------------------------------------------------------#
+# Denormalized show counters.
+#
+# Venue and Artist carry upcoming_shows_count / past_shows_count so that list
+# and search pages read them per row instead of aggregating Show. Each Show
+# records in is_past which of the two counters it is currently counted in.
+#
+# Writes that add or remove shows adjust the counters in the same
+# transaction. Shows whose start time has passed are moved from upcoming to
+# past by the periodic roll-over job, e.g. from cron every few minutes:
+#
+#   flask rollover-shows
+#
+# and `flask check-show-counters [--rebuild]` verifies (or recomputes) every
+# counter from the Show table.
+#----------------------------------------------------------------------------#
+
+from collections import Counter
+from datetime import datetime
+
+import click
+
+from models import app, db, Venue, Artist, Show
+from cache import invalidate, invalidate_all
+
+COUNTED_BY = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def update_counters(model, deltas):
+  # deltas: {entity_id: (upcoming delta, past delta)}, applied as increments
+  # so that concurrent writers never overwrite each other
+  if not deltas:
+    return
+  table = model.__table__
+  db.session.execute(
+    table.update()
+      .where(table.c.id == db.bindparam('entity_id'))
+      .values(upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+              past_shows_count=table.c.past_shows_count + db.bindparam('past')),
+    [{"entity_id": entity_id, "upcoming": upcoming, "past": past}
+     for entity_id, (upcoming, past) in deltas.items()]
+  )
+
+
+def count_shows(shows, sign=1):
+  # adjust the counters for (venue_id, artist_id, is_past) tuples being added
+  # (sign=1) or removed (sign=-1)
+  venue_deltas, artist_deltas = Counter(), Counter()
+  for venue_id, artist_id, is_past in shows:
+    venue_deltas[venue_id, is_past] += sign
+    artist_deltas[artist_id, is_past] += sign
+  for model, deltas in ((Venue, venue_deltas), (Artist, artist_deltas)):
+    by_entity = {}
+    for (entity_id, is_past), delta in deltas.items():
+      upcoming, past = by_entity.get(entity_id, (0, 0))
+      by_entity[entity_id] = (upcoming, past + delta) if is_past else (upcoming + delta, past)
+    update_counters(model, by_entity)
+
+
+def count_new_show(show, now=None):
+  # call before committing a new Show; sets its is_past flag
+  show.is_past = show.start_time <= (now or datetime.now())
+  count_shows([(int(show.venue_id), int(show.artist_id), show.is_past)])
+
+
+def discount_shows_of(entity_fk, entity_id):
+  # call before deleting a venue or artist: its shows go away with it, so
+  # the entities on the other side of those shows lose them from their counts
+  rows = db.session.query(Show.venue_id, Show.artist_id, Show.is_past, db.func.count(Show.id)) \
+    .filter(entity_fk == entity_id) \
+    .group_by(Show.venue_id, Show.artist_id, Show.is_past)
+  shows = []
+  for venue_id, artist_id, is_past, count in rows:
+    shows.extend([(venue_id, artist_id, is_past)] * count)
+  count_shows(shows, sign=-1)
+
+#----------------------------------------------------------------------------#
+# Roll-over and consistency check
+#----------------------------------------------------------------------------#
+
+def roll_over_shows(now=None):
+  # move every show that has started since the last run from upcoming to
+  # past; served by the partial index on not-yet-past shows. The counters
+  # follow the rows this update flipped: a run overlapping another (cron and
+  # a manual run) waits on the rows the other is flipping, then finds them
+  # past and leaves them, so no show is moved twice.
+  now = now or datetime.now()
+  table = Show.__table__
+  flipped = db.session.execute(
+    table.update()
+      .where(table.c.is_past == False, table.c.start_time <= now)
+      .values(is_past=True)
+      .returning(table.c.venue_id, table.c.artist_id)
+  ).all()
+  pages = ['venues']
+  for model, column in ((Venue, 0), (Artist, 1)):
+    moved = Counter(row[column] for row in flipped)
+    update_counters(model, {entity_id: (-count, count) for entity_id, count in moved.items()})
+    pages.extend(f'{model.__name__.lower()}:{entity_id}' for entity_id in moved)
+  db.session.commit()
+  if flipped:
+    invalidate(*pages)
+  return len(flipped)
+
+
+def counted_shows(model, entity_fk, is_past):
+  return db.select(db.func.count(Show.id)) \
+    .where(entity_fk == model.id, Show.is_past == is_past) \
+    .correlate(model) \
+    .scalar_subquery()
+
+
+def check_show_counters():
+  # (model name, id, stored (upcoming, past), actual (upcoming, past)) for
+  # every entity whose counters disagree with its shows
+  mismatches = []
+  for model, entity_fk in COUNTED_BY:
+    upcoming = counted_shows(model, entity_fk, False)
+    past = counted_shows(model, entity_fk, True)
+    rows = db.session.query(model.id, model.upcoming_shows_count, model.past_shows_count, upcoming, past) \
+      .filter(db.or_(model.upcoming_shows_count != upcoming, model.past_shows_count != past))
+    for entity_id, stored_upcoming, stored_past, actual_upcoming, actual_past in rows:
+      mismatches.append((model.__name__, entity_id, (stored_upcoming, stored_past), (actual_upcoming, actual_past)))
+  return mismatches
+
+
+def rebuild_show_counters(now=None):
+  # recompute every is_past flag and counter from scratch
+  now = now or datetime.now()
+  db.session.execute(Show.__table__.update().values(is_past=Show.start_time <= now))
+  for model, entity_fk in COUNTED_BY:
+    db.session.execute(model.__table__.update().values(
+      upcoming_shows_count=counted_shows(model, entity_fk, False),
+      past_shows_count=counted_shows(model, entity_fk, True)))
+  db.session.commit()
+  # every page showing a count or an upcoming/past split may have changed
+  invalidate_all()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('rollover-shows')
+def rollover_shows_command():
+  """Move shows that have started from upcoming to past counters."""
+  click.echo(f'{roll_over_shows()} shows rolled over')
+
+
+@app.cli.command('check-show-counters')
+@click.option('--rebuild', is_flag=True, help='Recompute all counters from the Show table.')
+def check_show_counters_command(rebuild):
+  """Report venues/artists whose show counters disagree with their shows."""
+  if rebuild:
+    rebuild_show_counters()
+  mismatches = check_show_counters()
+  for name, entity_id, stored, actual in mismatches:
+    click.echo(f'{name} {entity_id}: stored upcoming/past {stored}, actual {actual}')
+  click.echo(f'{len(mismatches)} mismatched counters')
+  if mismatches:
+    raise SystemExit(1)
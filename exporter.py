@@ -0,0 +1,272 @@
+#----------------------------------------------------------------------------#
+# Streaming export of venues, artists and shows as CSV, JSONL or Parquet.
+#
+#   flask export venues venues.csv
+#   flask export shows - --format jsonl | gzip > shows.jsonl.gz
+#   GET /api/v1/export/shows?format=parquet
+#
+# Rows are read with a server-side cursor (yield_per) as plain column
+# tuples, never as ORM objects, and written out one batch at a time, so
+# memory stays flat whatever the size of the table. Genres are aggregated
+# by the database in the same query.
+#
+# The columns are the /api/v1 fields of each resource. CSV output can be
+# fed back to `flask import`: genres are comma-separated and booleans are
+# "Yes"/"No". Parquet needs the optional `pyarrow` package.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import os
+import sys
+import zlib
+from datetime import datetime
+
+import click
+from flask import Response, request, stream_with_context
+
+from models import app, db, Genre
+from api import api, ApiError, VENUES, ARTISTS, SHOWS, dumps
+from sqlstats import query_budget
+from replicas import read_replica
+
+pyarrow = None  # imported on the first Parquet export (see import_pyarrow)
+
+RESOURCES = {'venues': VENUES, 'artists': ARTISTS, 'shows': SHOWS}
+
+FORMATS = {
+  'csv': 'text/csv',
+  'jsonl': 'application/x-ndjson',
+  'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def genres_column(resource):
+  # the entity's genre names, aggregated by the database ("Blues, Jazz")
+  genre_table = resource.genre_table
+  entity_fk = next(column for column in genre_table.c if column.name != 'genre_id')
+  return db.select(db.func.aggregate_strings(Genre.name, ', ')) \
+    .select_from(genre_table.join(Genre, genre_table.c.genre_id == Genre.id)) \
+    .where(entity_fk == resource.model.id) \
+    .scalar_subquery()
+
+
+def export_statement(resource):
+  # (field names, SELECT of every field in keyset order)
+  names = list(resource.columns)
+  columns = list(resource.columns.values())
+  if resource.genre_table is not None:
+    names.append('genres')
+    columns.append(genres_column(resource).label('genres'))
+  statement = db.select(*columns).select_from(resource.model)
+  for model, foreign_key in resource.joins.items():
+    statement = statement.join(model, model.id == foreign_key)
+  return names, statement.order_by(*resource.cursor_columns)
+
+
+def iter_batches(resource, batch_size):
+  # lists of row tuples, read through a server-side cursor
+  names, statement = export_statement(resource)
+  result = db.session.execute(statement.execution_options(yield_per=batch_size))
+  genres_index = names.index('genres') if 'genres' in names else None
+  for rows in result.partitions():
+    if genres_index is not None:
+      rows = [row[:genres_index] + (split_genres(row[genres_index]),) + row[genres_index + 1:] for row in rows]
+    yield rows
+
+
+def split_genres(genres):
+  return sorted(genres.split(', ')) if genres else []
+
+#----------------------------------------------------------------------------#
+# Writers: each turns batches of rows into chunks of bytes
+#----------------------------------------------------------------------------#
+
+def csv_value(value):
+  if value is None:
+    return ''
+  if isinstance(value, bool):
+    return 'Yes' if value else 'No'
+  if isinstance(value, list):
+    return ', '.join(value)
+  if isinstance(value, datetime):
+    return value.isoformat()
+  return value
+
+
+def write_csv(names, batches):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(names)
+  for rows in batches:
+    writer.writerows([csv_value(value) for value in row] for row in rows)
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_jsonl(names, batches):
+  for rows in batches:
+    yield b''.join(dumps(dict(zip(names, row))) + b'\n' for row in rows)
+
+
+class ChunkSink:
+  # write-only file for pyarrow that hands out what was written since the
+  # last drain, while reporting the total position for the Parquet footer
+
+  def __init__(self):
+    self.chunks = []
+    self.position = 0
+    self.closed = False
+
+  def write(self, data):
+    self.chunks.append(bytes(data))
+    self.position += len(data)
+    return len(data)
+
+  def tell(self):
+    return self.position
+
+  def flush(self):
+    pass
+
+  def close(self):
+    self.closed = True
+
+  def drain(self):
+    data = b''.join(self.chunks)
+    self.chunks = []
+    return data
+
+
+def import_pyarrow():
+  # pyarrow is slow to import and only Parquet exports need it
+  global pyarrow
+  if pyarrow is None:
+    try:
+      import pyarrow.parquet
+    except ImportError:
+      return False
+  return True
+
+
+def arrow_type(column):
+  python_type = column.type.python_type
+  if python_type is bool:
+    return pyarrow.bool_()
+  if python_type is int:
+    return pyarrow.int64()
+  if python_type is datetime:
+    return pyarrow.timestamp('us')
+  return pyarrow.string()
+
+
+def parquet_schema(resource):
+  fields = [(name, arrow_type(column)) for name, column in resource.columns.items()]
+  if resource.genre_table is not None:
+    fields.append(('genres', pyarrow.list_(pyarrow.string())))
+  return pyarrow.schema(fields)
+
+
+def write_parquet(names, batches, schema):
+  # one row group per batch
+  sink = ChunkSink()
+  writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode='w'), schema)
+  for rows in batches:
+    writer.write_table(pyarrow.Table.from_pylist([dict(zip(names, row)) for row in rows], schema=schema))
+    yield sink.drain()
+  writer.close()
+  yield sink.drain()
+
+
+def export_chunks(kind, output_format, batch_size, progress=None):
+  # the whole export as an iterator of byte chunks
+  resource = RESOURCES[kind]
+  names, statement = export_statement(resource)
+  batches = iter_batches(resource, batch_size)
+  if progress is not None:
+    batches = counted(batches, progress)
+  if output_format == 'csv':
+    return write_csv(names, batches)
+  if output_format == 'jsonl':
+    return write_jsonl(names, batches)
+  if not import_pyarrow():
+    raise RuntimeError('Parquet export needs the pyarrow package.')
+  return write_parquet(names, batches, parquet_schema(resource))
+
+
+def counted(batches, progress):
+  total = 0
+  for rows in batches:
+    total += len(rows)
+    yield rows
+    progress(total)
+
+#----------------------------------------------------------------------------#
+# Endpoint
+#----------------------------------------------------------------------------#
+
+def gzip_stream(chunks):
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+  for chunk in chunks:
+    data = compressor.compress(chunk)
+    if data:
+      yield data
+  yield compressor.flush()
+
+
+@api.route('/export/<kind>')
+@query_budget(1)
+@read_replica
+def export(kind):
+  if kind not in RESOURCES:
+    raise ApiError(f'Unknown export {kind}. Available: {", ".join(RESOURCES)}.', 404)
+  output_format = request.args.get('format', 'csv')
+  if output_format not in FORMATS:
+    raise ApiError(f'Unknown format {output_format}. Available: {", ".join(FORMATS)}.')
+  try:
+    chunks = export_chunks(kind, output_format, app.config['EXPORT_BATCH_SIZE'])
+  except RuntimeError as e:
+    raise ApiError(str(e), 501)
+
+  headers = {'Content-Disposition': f'attachment; filename={kind}.{output_format}'}
+  # Parquet is compressed already
+  if output_format != 'parquet' and request.accept_encodings['gzip']:
+    chunks = gzip_stream(chunks)
+    headers['Content-Encoding'] = 'gzip'
+  response = Response(stream_with_context(chunks), mimetype=FORMATS[output_format], headers=headers)
+  response.vary.add('Accept-Encoding')
+  return response
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(list(RESOURCES)))
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'output_format', type=click.Choice(list(FORMATS)),
+              help='Output format; defaults to the file extension.')
+@click.option('--batch-size', default=None, type=int,
+              help='Rows per fetch (and per Parquet row group); defaults to EXPORT_BATCH_SIZE.')
+def export_command(kind, path, output_format, batch_size):
+  """Export venues, artists or shows to a CSV, JSONL or Parquet file ('-' for stdout)."""
+  extension = os.path.splitext(path)[1].lower().lstrip('.')
+  output_format = output_format or (extension if extension in FORMATS else 'csv')
+
+  def progress(total):
+    click.echo(f'{kind}: {total} rows exported', err=True)
+
+  try:
+    chunks = export_chunks(kind, output_format, batch_size or app.config['EXPORT_BATCH_SIZE'], progress)
+  except RuntimeError as e:
+    raise click.ClickException(str(e))
+  output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+  try:
+    for chunk in chunks:
+      output.write(chunk)
+  finally:
+    if output is not sys.stdout.buffer:
+      output.close()
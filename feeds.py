@@ -0,0 +1,230 @@
+#----------------------------------------------------------------------------#
+# Calendar feeds of the shows of a venue or an artist.
+#
+#   GET /venues/<id>/calendar.ics     GET /artists/<id>/calendar.ics
+#   GET /venues/<id>/calendar.json    GET /artists/<id>/calendar.json
+#
+# A feed covers whole months: CALENDAR_PAST_MONTHS before the current one
+# to CALENDAR_FUTURE_MONTHS after it, or ?from=YYYY-MM&to=YYYY-MM (at most
+# CALENDAR_MAX_MONTHS). It is put together from one rendered chunk per
+# month, kept in the page cache until a show of that month is added or an
+# entity it shows changes (see cache.py). Only the months missing from the
+# cache are read, with one range query on the (venue_id / artist_id,
+# start_time) index, so a calendar client polling an unchanged feed runs no
+# query at all, and one after a new show reads back just that month. Feeds
+# carry an ETag: an unchanged feed is answered 304.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+from flask import Response, request, abort
+
+from models import app, db, Venue, Artist, Show
+from cache import page_cache, calendar_month
+from conditional import as_utc, local_as_utc
+from api import dumps
+from replicas import read_replica, replica_may_lag
+from sqlstats import query_budget
+
+
+class Feed:
+
+  def __init__(self, kind, model, entity_fk):
+    self.kind = kind              # 'venue' or 'artist', as in the cache namespaces
+    self.model = model
+    self.entity_fk = entity_fk    # Show column selecting the entity's shows
+
+  def namespace(self, entity_id, month=None):
+    namespace = f'{self.kind}-calendar:{entity_id}'
+    return namespace if month is None else f'{namespace}:{calendar_month(month_start(month))}'
+
+VENUE_FEED = Feed('venue', Venue, Show.venue_id)
+ARTIST_FEED = Feed('artist', Artist, Show.artist_id)
+
+#----------------------------------------------------------------------------#
+# Months, numbered year * 12 + month - 1
+#----------------------------------------------------------------------------#
+
+def month_of(value):
+  return value.year * 12 + value.month - 1
+
+
+def month_start(month):
+  return datetime(month // 12, month % 12 + 1, 1)
+
+
+def parse_month(value):
+  # "2026-05", or a date in that month
+  try:
+    return month_of(datetime.strptime(value[:7], '%Y-%m'))
+  except ValueError:
+    abort(400)
+
+
+def feed_months():
+  current = month_of(datetime.now())
+  first = request.args.get('from')
+  first = parse_month(first) if first else current - app.config['CALENDAR_PAST_MONTHS']
+  last = request.args.get('to')
+  last = parse_month(last) if last else current + app.config['CALENDAR_FUTURE_MONTHS']
+  if last < first or last - first >= app.config['CALENDAR_MAX_MONTHS']:
+    abort(400)
+  return range(first, last + 1)
+
+#----------------------------------------------------------------------------#
+# Rendering
+#----------------------------------------------------------------------------#
+
+def ics_text(value):
+  # RFC 5545 TEXT escaping
+  return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_time(value):
+  return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def ics_line(name, value):
+  # content lines are folded at 75 octets, without splitting a character
+  line, lines, size = [], [], 0
+  for char in f'{name}:{value}':
+    width = len(char.encode('utf-8'))
+    if size + width > 75:
+      lines.append(''.join(line))
+      line, size = [' '], 1
+    line.append(char)
+    size += width
+  lines.append(''.join(line))
+  return '\r\n'.join(lines) + '\r\n'
+
+
+def render_ics(shows):
+  lines = []
+  for show in shows:
+    start_time = local_as_utc(show.start_time)
+    lines += [
+      'BEGIN:VEVENT\r\n',
+      ics_line('UID', f'show-{show.id}@fyyur'),
+      ics_line('DTSTAMP', ics_time(as_utc(show.updated_at) or start_time)),
+      ics_line('DTSTART', ics_time(start_time)),
+      ics_line('DTEND', ics_time(local_as_utc(show.end_time))),
+      ics_line('SUMMARY', ics_text(f'{show.artist_name} at {show.venue_name}')),
+      ics_line('LOCATION', ics_text(', '.join(part for part in (show.address, show.city, show.state) if part))),
+      'END:VEVENT\r\n',
+    ]
+  return ''.join(lines)
+
+
+def render_json(shows):
+  # the events of the month, comma-separated, for the "data" list
+  return ','.join(dumps({
+    "id": show.id,
+    "start_time": show.start_time,
+    "end_time": show.end_time,
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "address": show.address,
+    "city": show.city,
+    "state": show.state,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+  }).decode('utf-8') for show in shows)
+
+RENDER = {'ics': render_ics, 'json': render_json}
+
+#----------------------------------------------------------------------------#
+# Feeds
+#----------------------------------------------------------------------------#
+
+def cacheable():
+  return page_cache is not None and not replica_may_lag()
+
+
+def feed_name(feed, entity_id):
+  name = page_cache.get(feed.namespace(entity_id), 'name') if page_cache is not None else None
+  if name is None:
+    row = db.session.query(feed.model.name).filter(feed.model.id == entity_id).first()
+    if row is None:
+      abort(404)
+    name = row.name or ''
+    if cacheable():
+      page_cache.set(feed.namespace(entity_id), 'name', name)
+  return name
+
+
+def load_shows(feed, entity_id, first, last):
+  # the shows of months first..last, one range scan
+  return db.session.query(Show.id, Show.start_time, Show.end_time, Show.updated_at,
+                          Show.venue_id, Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+                          Show.artist_id, Artist.name.label('artist_name')) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(feed.entity_fk == entity_id,
+            Show.start_time >= month_start(first), Show.start_time < month_start(last + 1)) \
+    .order_by(Show.start_time, Show.id) \
+    .all()
+
+
+def feed_chunks(feed, entity_id, months, format):
+  # one rendered chunk per month, from the cache or rendered from the shows
+  # of the months missing there
+  key, chunks = None, {}
+  if page_cache is not None:
+    # chunks are orphaned when an entity of the feed changes
+    key = f'{format}:{page_cache.version(feed.namespace(entity_id))}'
+    for month in months:
+      chunks[month] = page_cache.get(feed.namespace(entity_id, month), key)
+  missing = [month for month in months if chunks.get(month) is None]
+  if missing:
+    shows = {}
+    for show in load_shows(feed, entity_id, missing[0], missing[-1]):
+      shows.setdefault(month_of(show.start_time), []).append(show)
+    store = cacheable()
+    for month in missing:
+      chunks[month] = RENDER[format](shows.get(month, []))
+      if store:
+        page_cache.set(feed.namespace(entity_id, month), key, chunks[month])
+  return [chunks[month] for month in months]
+
+
+def calendar_feed(feed, entity_id, format):
+  name = feed_name(feed, entity_id)
+  months = feed_months()
+  chunks = feed_chunks(feed, entity_id, months, format)
+  if format == 'ics':
+    body = ''.join([
+      'BEGIN:VCALENDAR\r\n',
+      'VERSION:2.0\r\n',
+      'PRODID:-//Fyyur//Shows//EN\r\n',
+      'CALSCALE:GREGORIAN\r\n',
+      ics_line('X-WR-CALNAME', ics_text(name)),
+      *chunks,
+      'END:VCALENDAR\r\n',
+    ])
+    response = Response(body, mimetype='text/calendar')
+  else:
+    body = '{"name":%s,"from":"%s","to":"%s","data":[%s]}' % (
+      dumps(name).decode('utf-8'),
+      calendar_month(month_start(months[0])),
+      calendar_month(month_start(months[-1])),
+      ','.join(chunk for chunk in chunks if chunk))
+    response = Response(body, mimetype='application/json')
+  response.add_etag()
+  return response.make_conditional(request)
+
+#----------------------------------------------------------------------------#
+# Routes
+#----------------------------------------------------------------------------#
+
+@app.route('/venues/<int:venue_id>/calendar.<any(ics, json):format>')
+@query_budget(2)  # the name and the shows, when not cached
+@read_replica
+def venue_calendar(venue_id, format):
+  return calendar_feed(VENUE_FEED, venue_id, format)
+
+
+@app.route('/artists/<int:artist_id>/calendar.<any(ics, json):format>')
+@query_budget(2)  # the name and the shows, when not cached
+@read_replica
+def artist_calendar(artist_id, format):
+  return calendar_feed(ARTIST_FEED, artist_id, format)
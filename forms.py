@@ -1,25 +1,40 @@
 from datetime import datetime
-from flask_wtf import Form
+from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, ValidationError
-from wtforms.validators import DataRequired, AnyOf, URL, Optional
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, Regexp
 import phonenumbers as pn
 
-class ShowForm(Form):
-    artist_id = SelectField(
-        'artist_id', validators=[DataRequired()],
-        choices=[]
+def is_valid_phone(number):
+    # as entered (with a country code), or as a US number without one;
+    # shared by the forms and the bulk importer
+    for candidate in (number, '+1' + number):
+        try:
+            if pn.is_valid_number(pn.parse(candidate)):
+                return True
+        except pn.NumberParseException:
+            pass
+    return False
+
+class ShowForm(FlaskForm):
+    # ids, picked from the names suggested as the user types (see choices.py)
+    artist_id = StringField(
+        'artist_id', validators=[DataRequired(), Regexp(r'^\s*\d+\s*$', message='Pick an artist from the list.')]
     )
-    venue_id = SelectField(
-        'venue_id', validators=[DataRequired()],
-        choices=[]
+    venue_id = StringField(
+        'venue_id', validators=[DataRequired(), Regexp(r'^\s*\d+\s*$', message='Pick a venue from the list.')]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # SHOW_DEFAULT_MINUTES after start_time when left empty (see bookings.py)
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
 
-class VenueForm(Form):
+class VenueForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -89,14 +104,8 @@ class VenueForm(Form):
         'phone', validators=[DataRequired()]
     )
     def validate_phone(self, phone):
-        try:
-            input_number = pn.parse(phone.data)
-            if not (pn.is_valid_number(input_number)):
-                raise ValidationError('Invalid phone number.')
-        except:
-            input_number = pn.parse("+1"+phone.data)
-            if not (pn.is_valid_number(input_number)):
-                raise ValidationError('Invalid phone number.')
+        if not is_valid_phone(phone.data):
+            raise ValidationError('Invalid phone number.')
 
     image_link = StringField(
         'image_link', validators=[Optional(),URL()]
@@ -144,7 +153,7 @@ class VenueForm(Form):
         'facebook_link', validators=[URL()]
     )
 
-class ArtistForm(Form):
+class ArtistForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -211,14 +220,8 @@ class ArtistForm(Form):
         'phone', validators=[DataRequired()]
     )
     def validate_phone(self, phone):
-        try:
-            input_number = pn.parse(phone.data)
-            if not (pn.is_valid_number(input_number)):
-                raise ValidationError('Invalid phone number.')
-        except:
-            input_number = pn.parse("+1"+phone.data)
-            if not (pn.is_valid_number(input_number)):
-                raise ValidationError('Invalid phone number.')
+        if not is_valid_phone(phone.data):
+            raise ValidationError('Invalid phone number.')
 
     image_link = StringField(
         'image_link', validators=[Optional(), URL()]
@@ -0,0 +1,282 @@
+#----------------------------------------------------------------------------#
+# Venue locations and "near me" searches.
+#
+# A venue's latitude / longitude is the centroid of its city, looked up in
+# a local table (CITY_CENTROIDS, a CSV of city,state,latitude,longitude):
+# set when a venue is written, and for the venues already there by
+#
+#   flask geocode [--all]
+#
+# No geocoding service is called; venues in cities missing from the table
+# have no location and are never near anything.
+#
+#   GET /venues/near?lat=37.77&lng=-122.42[&km=25][&upcoming=1]
+#   GET /venues/near?city=San Francisco&state=CA
+#
+# lists the venues within km (NEAR_DEFAULT_KM) of the point, nearest first,
+# optionally only those with upcoming shows. On Postgres with the
+# earthdistance extension (migration 7b2d4f6e1a93) this is one query on a
+# GiST index. Otherwise the candidates come from a per-process grid index
+# of venue locations, GEO_CELL_DEGREES square cells loaded with one
+# column-only query, and the venues are read by id, nearest first. The grid
+# is dropped when a commit adds, moves or deletes a venue (and by the bulk
+# importer and `flask geocode`); other workers catch up within
+# GEO_INDEX_TTL seconds.
+#----------------------------------------------------------------------------#
+
+import csv
+import math
+import threading
+import time
+
+import click
+from flask import render_template, request, abort
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import app, db, Venue
+from sqlstats import query_budget
+from replicas import read_replica
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+NEAR_BATCH = 500  # venues read per query on the grid path
+
+centroids = None  # (city casefolded, state) -> (latitude, longitude)
+
+
+def get_centroids():
+  global centroids
+  if centroids is None:
+    with open(app.config['CITY_CENTROIDS'], newline='', encoding='utf-8') as f:
+      centroids = {(row['city'].strip().casefold(), row['state'].strip().upper()):
+                   (float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f)}
+  return centroids
+
+
+def locate(city, state):
+  # (latitude, longitude) of a city, or (None, None)
+  return get_centroids().get(((city or '').strip().casefold(), (state or '').strip().upper()), (None, None))
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+  # haversine
+  lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+  a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+@event.listens_for(Session, 'before_flush')
+def set_venue_locations(session, flush_context, instances):
+  for entity in session.new | session.dirty:
+    if not isinstance(entity, Venue):
+      continue
+    state = inspect(entity)
+    if entity in session.new or state.attrs.city.history.has_changes() or state.attrs.state.history.has_changes():
+      entity.latitude, entity.longitude = locate(entity.city, entity.state)
+
+#----------------------------------------------------------------------------#
+# Grid index
+#----------------------------------------------------------------------------#
+
+class GridIndex:
+
+  def __init__(self, rows, cell_degrees, ttl):
+    self.cell = cell_degrees
+    self.columns = math.ceil(360 / cell_degrees)
+    self.cells = {}  # (row, column) -> [(venue_id, latitude, longitude)]
+    for venue_id, latitude, longitude in rows:
+      self.cells.setdefault(self.cell_of(latitude, longitude), []).append((venue_id, latitude, longitude))
+    self.expires_at = time.monotonic() + ttl
+
+  def cell_of(self, latitude, longitude):
+    return int(latitude // self.cell), int((longitude + 180) // self.cell) % self.columns
+
+  def near(self, latitude, longitude, km):
+    # [(distance in km, venue_id)] within km of the point, nearest first
+    dlat = km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90), min(latitude + dlat, 90)
+    widest = max(abs(south), abs(north))
+    dlng = dlat / math.cos(math.radians(widest)) if widest < 89.9 else 180
+    if dlng >= 180:
+      columns = range(self.columns)
+    else:
+      first, last = int((longitude - dlng + 180) // self.cell), int((longitude + dlng + 180) // self.cell)
+      columns = {column % self.columns for column in range(first, last + 1)}
+    found = []
+    for row in range(int(south // self.cell), int(north // self.cell) + 1):
+      for column in columns:
+        for venue_id, venue_latitude, venue_longitude in self.cells.get((row, column), ()):
+          distance = distance_km(latitude, longitude, venue_latitude, venue_longitude)
+          if distance <= km:
+            found.append((distance, venue_id))
+    found.sort()
+    return found
+
+
+grid_index = None
+grid_index_lock = threading.Lock()
+
+
+def get_grid_index():
+  global grid_index
+  index = grid_index
+  if index is None or index.expires_at < time.monotonic():
+    with grid_index_lock:
+      index = grid_index
+      if index is None or index.expires_at < time.monotonic():
+        rows = db.session.query(Venue.id, Venue.latitude, Venue.longitude) \
+          .filter(Venue.latitude.isnot(None), Venue.longitude.isnot(None)).all()
+        index = grid_index = GridIndex(rows, app.config['GEO_CELL_DEGREES'], app.config['GEO_INDEX_TTL'])
+  return index
+
+
+def drop_locations():
+  # venue locations written without the ORM: reloaded on the next search
+  global grid_index
+  grid_index = None
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_location_changes(session, flush_context):
+  if grid_index is None:
+    return
+  for entity in session.new | session.deleted | session.dirty:
+    if not isinstance(entity, Venue):
+      continue
+    state = inspect(entity)
+    moved = state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()
+    if entity in session.new or entity in session.deleted or moved:
+      session.info['locations_changed'] = True
+      return
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_location_changes(session):
+  if session.info.pop('locations_changed', False):
+    drop_locations()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_location_changes(session, previous_transaction):
+  session.info.pop('locations_changed', None)
+
+#----------------------------------------------------------------------------#
+# Searches
+#----------------------------------------------------------------------------#
+
+earthdistance = None
+
+
+def using_earthdistance():
+  # Postgres with the earthdistance extension installed; checked once
+  global earthdistance
+  if earthdistance is None:
+    earthdistance = db.engine.dialect.name == 'postgresql' and bool(db.session.execute(
+      db.text("SELECT count(*) FROM pg_extension WHERE extname = 'earthdistance'")).scalar())
+  return earthdistance
+
+
+def venue_item(row, distance):
+  return {
+    "id": row.id,
+    "name": row.name,
+    "city": row.city,
+    "state": row.state,
+    "num_upcoming_shows": row.upcoming_shows_count,
+    "distance_km": distance,
+  }
+
+
+def venue_columns():
+  return db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count)
+
+
+def near_venues(latitude, longitude, km, upcoming, limit):
+  # venues within km of the point, nearest first (then by id)
+  if using_earthdistance():
+    point = db.func.ll_to_earth(latitude, longitude)
+    location = db.func.ll_to_earth(Venue.latitude, Venue.longitude)
+    distance = db.func.earth_distance(point, location)
+    query = venue_columns().add_columns(distance.label('distance')) \
+      .filter(db.func.earth_box(point, km * 1000).op('@>')(location), distance <= km * 1000)
+    if upcoming:
+      query = query.filter(Venue.upcoming_shows_count > 0)
+    return [venue_item(row, row.distance / 1000) for row in query.order_by(distance, Venue.id).limit(limit)]
+
+  candidates = get_grid_index().near(latitude, longitude, km)
+  venues = []
+  for start in range(0, len(candidates), NEAR_BATCH):
+    distances = {venue_id: distance for distance, venue_id in candidates[start:start + NEAR_BATCH]}
+    query = venue_columns().filter(Venue.id.in_(distances))
+    if upcoming:
+      query = query.filter(Venue.upcoming_shows_count > 0)
+    rows = sorted(query, key=lambda row: (distances[row.id], row.id))
+    venues.extend(venue_item(row, distances[row.id]) for row in rows)
+    if len(venues) >= limit:
+      break
+  return venues[:limit]
+
+#----------------------------------------------------------------------------#
+# Views
+#----------------------------------------------------------------------------#
+
+@app.route('/venues/near')
+@query_budget(2)  # one more when the grid index is (re)loaded
+@read_replica
+def venues_near():
+  # venues near ?lat=&lng= (the browser's location) or near a ?city=&state=
+  search = {
+    "city": request.args.get('city', '').strip(),
+    "state": request.args.get('state', '').strip().upper(),
+    "km": request.args.get('km', app.config['NEAR_DEFAULT_KM'], type=float),
+    "upcoming": request.args.get('upcoming') == '1',
+  }
+  latitude = request.args.get('lat', type=float)
+  longitude = request.args.get('lng', type=float)
+  if latitude is None or longitude is None:
+    latitude, longitude = locate(search["city"], search["state"]) if search["city"] else (None, None)
+  if not 0 < search["km"] <= app.config['NEAR_MAX_KM']:
+    abort(400)
+  venues = None
+  if latitude is not None and longitude is not None:
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+      abort(400)
+    venues = near_venues(latitude, longitude, search["km"], search["upcoming"], app.config['NEAR_RESULTS'])
+  return render_template('pages/venues_near.html', search=search, venues=venues,
+                         states=sorted({state for city, state in get_centroids()}))
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('geocode')
+@click.option('--all', 'everything', is_flag=True, help='Geocode every venue, not only those without a location.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Venues per transaction.')
+def geocode_command(everything, chunk_size):
+  """Set venue locations from the city centroid table."""
+  table = Venue.__table__
+  query = db.session.query(Venue.id, Venue.city, Venue.state).order_by(Venue.id)
+  if not everything:
+    query = query.filter(Venue.latitude.is_(None))
+  rows = query.all()
+  located, unknown = 0, set()
+  update = table.update().where(table.c.id == db.bindparam('venue_id')) \
+    .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'))
+  for start in range(0, len(rows), chunk_size):
+    values = []
+    for venue_id, city, state in rows[start:start + chunk_size]:
+      latitude, longitude = locate(city, state)
+      if latitude is None:
+        unknown.add((city, state))
+      else:
+        located += 1
+      values.append({"venue_id": venue_id, "latitude": latitude, "longitude": longitude})
+    db.session.execute(update, values)
+    db.session.commit()
+  drop_locations()
+  click.echo(f'{located} of {len(rows)} venues located')
+  if unknown:
+    click.echo(f'cities not in {app.config["CITY_CENTROIDS"]}: '
+               + ', '.join(f'{city}, {state}' for city, state in sorted(unknown, key=str)))
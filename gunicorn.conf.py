@@ -0,0 +1,60 @@
+#----------------------------------------------------------------------------#
+# gunicorn settings (gunicorn -c gunicorn.conf.py wsgi:app), from the
+# environment:
+#
+#   PORT / BIND               where to listen (default 0.0.0.0:8000)
+#   WEB_CONCURRENCY           worker processes (default 2 x CPUs + 1)
+#   GUNICORN_WORKER_CLASS     'gthread' (default) or 'sync'
+#   GUNICORN_THREADS          threads per gthread worker (default 4)
+#   GUNICORN_MAX_REQUESTS     restart a worker after this many requests
+#
+# Requests spend most of their time waiting on the database, so threaded
+# workers serve several at once; each thread needs a pooled connection, so
+# keep GUNICORN_THREADS within DB_POOL_SIZE + DB_MAX_OVERFLOW, and workers x
+# that within the database's max_connections.
+#
+# The app is imported once, in the master, and shared by the forked workers
+# (preload_app): workers start in milliseconds and share the imported code.
+#----------------------------------------------------------------------------#
+
+import glob
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f'0.0.0.0:{os.environ.get("PORT", "8000")}')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+  # metrics of the previous run's workers (see metrics.py); only the
+  # snapshot files are removed, whatever else the directory holds
+  directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')) + \
+        glob.glob(os.path.join(directory, 'metrics_*.json.tmp')):
+      os.remove(path)
+
+
+def post_fork(server, worker):
+  # connections opened by the master while preloading must not be shared
+  # with the workers; each worker opens its own
+  from models import app, db
+  with app.app_context():
+    for engine in db.engines.values():
+      engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+  if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,388 @@
+#----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows from CSV or JSONL.
+#
+#   flask import venues venues.csv
+#   flask import shows shows.jsonl --chunk-size 5000
+#
+# Rows are validated with the rules of VenueForm / ArtistForm / ShowForm,
+# read off the form classes without instantiating them, and inserted with
+# one executemany per table and chunk, each chunk in its own transaction.
+# Rejected rows are written, with their line number and errors, to a side
+# file in the input's format (<file>.rejected.<ext> by default), so that
+# they can be fixed and imported again.
+#
+# Columns are the form fields. Genres are a comma-separated string in CSV
+# and a list (or a string) in JSONL; seeking_talent / seeking_venue are
+# "Yes" or "No" (JSONL also takes booleans); start_time and end_time
+# (optional) are in the form's format ("YYYY-MM-DD HH:MM:SS") or ISO 8601;
+# artist_id and venue_id must exist, and a show must not overlap another of
+# its venue or artist, in the database or earlier in the file (see
+# bookings.py). Overlaps are checked a chunk at a time, before its insert:
+# the schedules of the chunk's venues and of its artists over the time it
+# covers are read with one query each, and then kept up to date with the
+# chunk's own shows; earlier chunks are in the database by then, and a chunk
+# whose insert fails leaves nothing behind. The import is not meant to run
+# alongside bookings of the same venues and artists.
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from sqlalchemy.exc import SQLAlchemyError
+from wtforms.fields import DateTimeField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import DataRequired, Optional, URL
+
+from models import app, db, Venue, Artist, Show, venue_genres, artist_genres, get_or_create_genres
+from forms import VenueForm, ArtistForm, ShowForm, is_valid_phone
+from counters import count_shows
+from cache import invalidate, show_pages
+from search import reindex
+from choices import drop_names
+from geo import locate, drop_locations
+from bookings import Conflict, SIDES, max_duration, show_end_time, check_times, booked_schedules, conflict_message
+
+# the forms' validate_<field> methods, as plain functions
+INLINE_CHECKS = {'phone': (is_valid_phone, 'Invalid phone number.')}
+
+#----------------------------------------------------------------------------#
+# Validation
+#----------------------------------------------------------------------------#
+
+class FieldRule:
+
+  def __init__(self, name, unbound, form_class):
+    validators = unbound.kwargs.get('validators') or []
+    self.name = name
+    self.field_class = unbound.field_class
+    self.required = any(isinstance(validator, DataRequired) for validator in validators)
+    self.optional = any(isinstance(validator, Optional) for validator in validators)
+    self.urls = [validator for validator in validators if isinstance(validator, URL)]
+    choices = unbound.kwargs.get('choices')
+    # ShowForm fills its id choices from the database at request time; the
+    # importer checks those against the database instead
+    self.choices = {value for value, label in choices} if choices else None
+    self.formats = unbound.kwargs.get('format', '%Y-%m-%d %H:%M:%S')
+    if isinstance(self.formats, str):
+      self.formats = [self.formats]
+    self.check = INLINE_CHECKS.get(name) if hasattr(form_class, f'validate_{name}') else None
+
+  def clean(self, value):
+    # (cleaned value, error message or None)
+    if self.field_class is SelectMultipleField:
+      if isinstance(value, str):
+        value = value.split(',')
+      value = [item.strip() for item in value or [] if item and item.strip()]
+    elif isinstance(value, bool):
+      value = 'Yes' if value else 'No'
+    elif value is not None:
+      value = str(value).strip()
+
+    if not value:
+      if self.required:
+        return None, 'This field is required.'
+      if self.optional:
+        return None, None
+      value = value if value is not None else ''
+
+    for validator in self.urls:
+      match = validator.regex.match(value)
+      if not match or not validator.validate_hostname(match.group('host')):
+        return value, 'Invalid URL.'
+    if self.choices is not None:
+      invalid = [item for item in (value if isinstance(value, list) else [value]) if item not in self.choices]
+      if invalid:
+        return value, f"'{invalid[0]}' is not a valid choice for this field."
+    if self.field_class is DateTimeField:
+      value = parse_datetime(value, self.formats)
+      if value is None:
+        return None, 'Not a valid datetime value.'
+    if self.check is not None:
+      check, message = self.check
+      if not check(value):
+        return value, message
+    return value, None
+
+
+def parse_datetime(value, formats):
+  for format in formats:
+    try:
+      return datetime.strptime(value, format)
+    except ValueError:
+      pass
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    return None
+
+
+def form_rules(form_class):
+  return [FieldRule(name, unbound, form_class)
+          for name, unbound in vars(form_class).items() if isinstance(unbound, UnboundField)]
+
+
+def validate_row(rules, row):
+  # (cleaned values by field, errors by field)
+  data, errors = {}, {}
+  for rule in rules:
+    data[rule.name], error = rule.clean(row.get(rule.name))
+    if error:
+      errors[rule.name] = error
+  return data, errors
+
+#----------------------------------------------------------------------------#
+# Inserts, one chunk per transaction
+#----------------------------------------------------------------------------#
+
+class EntityImport:
+  # venues or artists, with their genres
+
+  def __init__(self, model, form_class, genre_table, seeking_field):
+    self.model = model
+    self.rules = form_rules(form_class)
+    self.genre_table = genre_table
+    self.seeking_field = seeking_field
+    self.entity_fk = f'{model.__name__.lower()}_id'
+
+  def validate(self, row):
+    return validate_row(self.rules, row)
+
+  def check(self, chunk):
+    return chunk, []
+
+  def insert(self, rows):
+    table = self.model.__table__
+    values = []
+    for data in rows:
+      data = {name: value for name, value in data.items() if name != 'genres'}
+      data[self.seeking_field] = data[self.seeking_field] == 'Yes'
+      if self.model is Venue:
+        data['latitude'], data['longitude'] = locate(data['city'], data['state'])
+      values.append(data)
+    ids = db.session.scalars(table.insert().returning(table.c.id, sort_by_parameter_order=True), values).all()
+
+    genres = get_or_create_genres({name for data in rows for name in data['genres']})
+    db.session.flush()
+    genre_ids = {genre.name: genre.id for genre in genres}
+    db.session.execute(self.genre_table.insert(), [
+      {self.entity_fk: entity_id, "genre_id": genre_ids[name]}
+      for entity_id, data in zip(ids, rows) for name in dict.fromkeys(data['genres'])
+    ])
+    reindex(self.model, ids)
+    drop_names(self.model)
+    if self.model is Venue:
+      drop_locations()
+    return ids
+
+  def pages(self, ids):
+    return [f'{self.model.__name__.lower()}s']
+
+
+class ShowImport:
+
+  def __init__(self):
+    self.rules = form_rules(ShowForm)
+    self.venue_ids = {venue_id for venue_id, in db.session.query(Venue.id)}
+    self.artist_ids = {artist_id for artist_id, in db.session.query(Artist.id)}
+    self.now = datetime.now()
+
+  def validate(self, row):
+    data, errors = validate_row(self.rules, row)
+    for name, existing in (('venue_id', self.venue_ids), ('artist_id', self.artist_ids)):
+      if name in errors:
+        continue
+      try:
+        data[name] = int(data[name])
+      except ValueError:
+        errors[name] = 'Not a valid id.'
+        continue
+      if data[name] not in existing:
+        errors[name] = f'{name[:-3].capitalize()} {data[name]} does not exist.'
+    if not errors:
+      data['end_time'] = show_end_time(data['start_time'], data['end_time'])
+      message = check_times(data['start_time'], data['end_time'])
+      if message:
+        errors['end_time'] = message
+    return data, errors
+
+  def check(self, chunk):
+    # (accepted, [(line, row, errors)] refused): the shows of the chunk that
+    # overlap none in the database nor one accepted before them
+    after = min(data['start_time'] for line, row, data in chunk) - max_duration()
+    before = max(data['end_time'] for line, row, data in chunk)
+    schedules = {side: booked_schedules(entity_fk, {data[f'{side}_id'] for line, row, data in chunk}, after, before)
+                 for side, entity_fk in SIDES}
+    accepted, refused = [], []
+    for line, row, data in chunk:
+      conflict = None
+      for side, entity_fk in SIDES:
+        show = schedules[side][data[f'{side}_id']].conflict(data['start_time'], data['end_time'])
+        if show is not None:
+          conflict = Conflict(0, side, *show)
+          break
+      if conflict is not None:
+        refused.append((line, row, {f'{conflict.side}_id': conflict_message(conflict)}))
+        continue
+      for side, entity_fk in SIDES:
+        schedules[side][data[f'{side}_id']].add(data['start_time'], data['end_time'])
+      accepted.append((line, row, data))
+    return accepted, refused
+
+  def insert(self, rows):
+    for data in rows:
+      data['is_past'] = data['start_time'] <= self.now
+    db.session.execute(Show.__table__.insert(), rows)
+    count_shows([(data['venue_id'], data['artist_id'], data['is_past']) for data in rows])
+    return rows
+
+  def pages(self, rows):
+    pages = set()
+    for data in rows:
+      pages.update(show_pages(data["venue_id"], data["artist_id"], data["start_time"]))
+    return list(pages)
+
+
+def importer_for(kind):
+  if kind == 'venues':
+    return EntityImport(Venue, VenueForm, venue_genres, 'seeking_talent')
+  if kind == 'artists':
+    return EntityImport(Artist, ArtistForm, artist_genres, 'seeking_venue')
+  return ShowImport()
+
+
+def import_rows(kind, rows, chunk_size=1000, reject=None, progress=None):
+  # rows: (line number, row dict or None if unreadable); reject(line, row,
+  # errors) is called for every rejected row and progress(stats) after every
+  # chunk. Returns the stats.
+  importer = importer_for(kind)
+  stats = {"read": 0, "imported": 0, "rejected": 0}
+  pages = set()
+
+  def rejected(line, row, errors):
+    stats["rejected"] += 1
+    if reject is not None:
+      reject(line, row, errors)
+
+  def flush(chunk):
+    accepted, refused = chunk, []
+    try:
+      accepted, refused = importer.check(chunk)
+      inserted = importer.insert([data for line, row, data in accepted]) if accepted else None
+      db.session.commit()
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      for line, row, data in accepted:
+        rejected(line, row, {"chunk": f'Insert failed: {getattr(e, "orig", e)}'})
+    else:
+      stats["imported"] += len(accepted)
+      if inserted is not None:
+        pages.update(importer.pages(inserted))
+    for line, row, errors in refused:
+      rejected(line, row, errors)
+    if progress is not None:
+      progress(stats)
+
+  chunk = []
+  for line, row in rows:
+    stats["read"] += 1
+    if row is None:
+      rejected(line, row, {"row": 'Unreadable row.'})
+      continue
+    data, errors = importer.validate(row)
+    if errors:
+      rejected(line, row, errors)
+      continue
+    chunk.append((line, row, data))
+    if len(chunk) >= chunk_size:
+      flush(chunk)
+      chunk = []
+  if chunk:
+    flush(chunk)
+  invalidate(*pages)
+  return stats
+
+#----------------------------------------------------------------------------#
+# Files
+#----------------------------------------------------------------------------#
+
+def read_csv(path):
+  with open(path, newline='', encoding='utf-8') as f:
+    reader = csv.DictReader(f)
+    for row in reader:
+      yield reader.line_num, row
+
+
+def read_jsonl(path):
+  with open(path, encoding='utf-8') as f:
+    for line_number, line in enumerate(f, 1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError:
+        row = None
+      yield line_number, row if isinstance(row, dict) else None
+
+
+class RejectsFile:
+  # opened on the first rejected row, in the format of the input
+
+  def __init__(self, path, input_format):
+    self.path = path
+    self.input_format = input_format
+    self.file = None
+    self.writer = None
+
+  def write(self, line, row, errors):
+    errors = '; '.join(f'{name}: {message}' for name, message in errors.items())
+    if self.input_format == 'csv':
+      if self.writer is None:
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['_line', '_errors'] + list(row or {}))
+      self.writer.writerow([line, errors] + list((row or {}).values()))
+    else:
+      if self.file is None:
+        self.file = open(self.path, 'w', encoding='utf-8')
+      self.file.write(json.dumps(dict(row or {}, _line=line, _errors=errors), default=str) + '\n')
+
+  def close(self):
+    if self.file is not None:
+      self.file.close()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format; defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per transaction.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows; defaults to <file>.rejected.<ext>.')
+def import_command(kind, path, input_format, chunk_size, rejects_path):
+  """Import venues, artists or shows from a CSV or JSONL file."""
+  root, extension = os.path.splitext(path)
+  input_format = input_format or ('jsonl' if extension.lower() in ('.jsonl', '.json') else 'csv')
+  rejects = RejectsFile(rejects_path or f'{root}.rejected.{input_format}', input_format)
+  started = time.perf_counter()
+
+  def progress(stats):
+    rate = stats["read"] / max(time.perf_counter() - started, 1e-9)
+    click.echo(f'{kind}: {stats["read"]} read, {stats["imported"]} imported, '
+               f'{stats["rejected"]} rejected ({rate:.0f} rows/s)', err=True)
+
+  rows = read_csv(path) if input_format == 'csv' else read_jsonl(path)
+  try:
+    stats = import_rows(kind, rows, chunk_size, rejects.write, progress)
+  finally:
+    rejects.close()
+  click.echo(f'{stats["imported"]} {kind} imported, {stats["rejected"]} rejected')
+  if stats["rejected"]:
+    click.echo(f'rejected rows written to {rejects.path}')
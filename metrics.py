@@ -0,0 +1,261 @@
+#----------------------------------------------------------------------------#
+# Prometheus metrics, served at /metrics in the text exposition format.
+#
+#   fyyur_http_requests_total{endpoint,method,status}    counter
+#   fyyur_http_request_duration_seconds{endpoint}        histogram
+#   fyyur_http_requests_in_flight                        gauge
+#   fyyur_template_render_seconds{template}              histogram
+#   fyyur_db_queries_total{endpoint}                     counter
+#   fyyur_db_duration_seconds{endpoint}                  histogram
+#   fyyur_page_cache_requests_total{result}              counter
+#
+# Endpoints are Flask endpoint names (venues, show_venue, api.list_shows,
+# ...); requests that match no route are counted as "unmatched". DB time
+# is the per-request SQL time of sqlstats.py, page cache hits come from
+# cache.py.
+#
+# Every process keeps its own metrics. With several workers (gunicorn),
+# set PROMETHEUS_MULTIPROC_DIR to a directory shared by all of them, whose
+# metrics_*.json files are removed before the server starts (see
+# gunicorn.conf.py): each worker then writes its metrics to
+# <dir>/metrics_<pid>.json every METRICS_FLUSH_INTERVAL seconds, and
+# /metrics adds up the files of all workers, past and present, so that
+# counters survive worker restarts. Call mark_process_dead(pid) from
+# gunicorn's child_exit hook to drop a dead worker's gauges.
+#----------------------------------------------------------------------------#
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request, before_render_template, template_rendered
+
+from models import app
+from pool import Histogram
+from sqlstats import request_stats
+import cache
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+METRICS = {
+  # name: (type, help, histogram buckets)
+  'fyyur_http_requests_total': ('counter', 'HTTP requests served.', None),
+  'fyyur_http_request_duration_seconds': ('histogram', 'Time to serve a request, body included.', LATENCY_BUCKETS),
+  'fyyur_http_requests_in_flight': ('gauge', 'Requests being served.', None),
+  'fyyur_template_render_seconds': ('histogram', 'Time to render a template.', LATENCY_BUCKETS),
+  'fyyur_db_queries_total': ('counter', 'SQL statements executed by requests.', None),
+  'fyyur_db_duration_seconds': ('histogram', 'SQL time per request.', DB_BUCKETS),
+  'fyyur_page_cache_requests_total': ('counter', 'Rendered page cache lookups.', None),
+}
+
+
+class Registry:
+  # the metrics of this process; labels are tuples of (name, value) pairs
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+    self.pid = None  # set by the first request (start_process)
+
+  def reset(self):
+    self.pid = os.getpid()
+    self.values = {}      # (name, labels) -> counter or gauge value
+    self.histograms = {}  # (name, labels) -> Histogram
+    self.changed = False
+
+  def add(self, name, amount=1, labels=()):
+    with self.lock:
+      self.values[name, labels] = self.values.get((name, labels), 0) + amount
+      self.changed = True
+
+  def observe(self, name, value, labels=()):
+    histogram = self.histograms.get((name, labels))
+    if histogram is None:
+      with self.lock:
+        histogram = self.histograms.setdefault((name, labels), Histogram(METRICS[name][2]))
+    histogram.observe(value)
+    self.changed = True
+
+  def snapshot(self):
+    # JSON-friendly: [[name, labels, value or histogram snapshot], ...]
+    with self.lock:
+      values = list(self.values.items())
+      histograms = list(self.histograms.items())
+      self.changed = False
+    samples = [[name, list(labels), value] for (name, labels), value in values]
+    samples += [[name, list(labels), histogram.snapshot()] for (name, labels), histogram in histograms]
+    if cache.page_cache is not None:
+      stats = cache.page_cache.stats
+      samples.append(['fyyur_page_cache_requests_total', [['result', 'hit']], stats["hits"]])
+      samples.append(['fyyur_page_cache_requests_total', [['result', 'miss']], stats["misses"]])
+    return samples
+
+registry = Registry()
+
+#----------------------------------------------------------------------------#
+# Multiprocess mode
+#----------------------------------------------------------------------------#
+
+def process_file(directory, pid):
+  return os.path.join(directory, f'metrics_{pid}.json')
+
+
+def write_snapshot(directory):
+  path = process_file(directory, registry.pid)
+  with open(path + '.tmp', 'w') as f:
+    json.dump(registry.snapshot(), f)
+  os.replace(path + '.tmp', path)
+
+
+def flush_periodically(directory, interval):
+  while True:
+    time.sleep(interval)
+    if registry.changed:
+      write_snapshot(directory)
+
+
+def start_process():
+  # on the first request of every worker: forget what a preloading parent
+  # may have recorded, and start writing this worker's file
+  registry.reset()
+  directory = app.config['METRICS_MULTIPROC_DIR']
+  if directory:
+    threading.Thread(target=flush_periodically, args=(directory, app.config['METRICS_FLUSH_INTERVAL']),
+                     daemon=True, name='metrics-flush').start()
+    atexit.register(write_snapshot, directory)
+
+
+def mark_process_dead(pid, directory=None):
+  # keep a dead worker's counters and histograms, but not its gauges
+  path = process_file(directory or app.config['METRICS_MULTIPROC_DIR'], pid)
+  try:
+    with open(path) as f:
+      samples = json.load(f)
+  except (OSError, ValueError):
+    return
+  samples = [sample for sample in samples if METRICS[sample[0]][0] != 'gauge']
+  with open(path + '.tmp', 'w') as f:
+    json.dump(samples, f)
+  os.replace(path + '.tmp', path)
+
+
+def collect():
+  # samples of every process, added up: {(name, labels): value or histogram}
+  directory = app.config['METRICS_MULTIPROC_DIR']
+  if not directory:
+    snapshots = [registry.snapshot()]
+  else:
+    write_snapshot(directory)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+      try:
+        with open(path) as f:
+          snapshots.append(json.load(f))
+      except (OSError, ValueError):
+        continue  # a worker that just exited
+  merged = {}
+  for samples in snapshots:
+    for name, labels, value in samples:
+      key = (name, tuple(tuple(label) for label in labels))
+      if isinstance(value, dict):
+        total = merged.setdefault(key, {"buckets": {}, "count": 0, "sum": 0.0})
+        for bound, count in value["buckets"].items():
+          total["buckets"][bound] = total["buckets"].get(bound, 0) + count
+        total["count"] += value["count"]
+        total["sum"] += value["sum"]
+      else:
+        merged[key] = merged.get(key, 0) + value
+  return merged
+
+#----------------------------------------------------------------------------#
+# Exposition
+#----------------------------------------------------------------------------#
+
+def label_text(labels):
+  if not labels:
+    return ''
+  escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels}
+  return '{' + ','.join(f'{name}="{value}"' for name, value in escaped.items()) + '}'
+
+
+def number_text(value):
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(merged):
+  lines = []
+  for name, (kind, help_text, buckets) in METRICS.items():
+    samples = sorted((labels, value) for (sample_name, labels), value in merged.items() if sample_name == name)
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    if kind == 'gauge' and not samples:
+      samples = [((), 0)]
+    for labels, value in samples:
+      if kind != 'histogram':
+        lines.append(f'{name}{label_text(labels)} {number_text(value)}')
+        continue
+      for bound, count in value["buckets"].items():
+        lines.append(f'{name}_bucket{label_text(labels + (("le", bound),))} {count}')
+      lines.append(f'{name}_count{label_text(labels)} {value["count"]}')
+      lines.append(f'{name}_sum{label_text(labels)} {number_text(value["sum"])}')
+  return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Request hooks
+#----------------------------------------------------------------------------#
+
+@app.before_request
+def start_request_metrics():
+  if registry.pid != os.getpid():
+    start_process()
+  g.metrics_started = time.perf_counter()
+  registry.add('fyyur_http_requests_in_flight')
+
+
+@app.after_request
+def record_status(response):
+  g.metrics_status = response.status_code
+  return response
+
+
+@app.teardown_request
+def record_request_metrics(error=None):
+  # runs once the body has been sent, streamed bodies included
+  started = g.pop('metrics_started', None)
+  if started is None:
+    return
+  endpoint = request.endpoint or 'unmatched'
+  status = g.get('metrics_status', 500)
+  registry.add('fyyur_http_requests_in_flight', -1)
+  registry.add('fyyur_http_requests_total', labels=(('endpoint', endpoint), ('method', request.method), ('status', str(status))))
+  registry.observe('fyyur_http_request_duration_seconds', time.perf_counter() - started, (('endpoint', endpoint),))
+  stats = request_stats()
+  if stats["count"]:
+    registry.add('fyyur_db_queries_total', stats["count"], (('endpoint', endpoint),))
+    registry.observe('fyyur_db_duration_seconds', stats["seconds"], (('endpoint', endpoint),))
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+  g.setdefault('render_started', []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+  started = g.get('render_started')
+  if started:
+    registry.observe('fyyur_template_render_seconds', time.perf_counter() - started.pop(),
+                     (('template', template.name or 'unnamed'),))
+
+#----------------------------------------------------------------------------#
+# Endpoint
+#----------------------------------------------------------------------------#
+
+@app.route('/metrics')
+def metrics():
+  return Response(exposition(collect()), mimetype='text/plain; version=0.0.4')
@@ -79,6 +79,11 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # batch migrations recreate tables; with foreign keys enforced
+            # (see models.py) dropping the old table would cascade deletes
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
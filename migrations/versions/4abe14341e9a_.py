@@ -0,0 +1,48 @@
+"""denormalized upcoming/past show counters
+
+Revision ID: 4abe14341e9a
+Revises: e83f1a4c5d27
+Create Date: 2026-10-18 14:37:16.660382
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4abe14341e9a'
+down_revision = 'e83f1a4c5d27'
+branch_labels = None
+depends_on = None
+
+COUNTED_BY = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('is_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_Show_not_past_start_time', 'Show', ['start_time'], unique=False,
+                    postgresql_where=sa.text('NOT is_past'), sqlite_where=sa.text('NOT is_past'))
+    for table, entity_fk in COUNTED_BY:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill; `flask check-show-counters --rebuild` does the same
+    # start_time is naive local time, like datetime.now() in the app
+    op.get_bind().execute(sa.text('UPDATE "Show" SET is_past = (start_time <= :now)'), {'now': datetime.now()})
+    for table, entity_fk in COUNTED_BY:
+        op.execute(sa.text(
+            f'UPDATE "{table}" SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{entity_fk} = "{table}".id AND NOT "Show".is_past), '
+            f'past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{entity_fk} = "{table}".id AND "Show".is_past)'))
+
+
+def downgrade():
+    for table, entity_fk in COUNTED_BY:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+    op.drop_index('ix_Show_not_past_start_time', table_name='Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('is_past')
@@ -0,0 +1,43 @@
+"""full-text search vectors for venues and artists
+
+Revision ID: 5e1c0a7b2f94
+Revises: 9d74d23d438b
+Create Date: 2026-10-18 10:41:07.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1c0a7b2f94'
+down_revision = '9d74d23d438b'
+branch_labels = None
+depends_on = None
+
+# must match search.search_vector_expression()
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english'::regconfig, coalesce(name, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, concat_ws(' ', nullif(city, ''), nullif(state, ''), nullif(genres, ''))), 'B') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(seeking_description, '')), 'C')
+"""
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    column_type = postgresql.TSVECTOR() if is_postgres else sa.Text()
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', column_type, nullable=True))
+        if is_postgres:
+            op.execute(f'UPDATE "{table}" SET search_vector = {SEARCH_VECTOR_SQL}')
+            op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                            unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    for table in ('Artist', 'Venue'):
+        if is_postgres:
+            op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,37 @@
+"""latitude and longitude on Venue
+
+Revision ID: 7b2d4f6e1a93
+Revises: 3c5e8a9d7b21
+Create Date: 2026-10-18 20:41:09.730182
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2d4f6e1a93'
+down_revision = '3c5e8a9d7b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    # fill them in with `flask geocode`. On Postgres, venues near a point are
+    # found with earthdistance on a GiST index; other databases use the
+    # in-process grid index of geo.py.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+    op.execute('CREATE INDEX "ix_Venue_location_earth" ON "Venue" USING gist (ll_to_earth(latitude, longitude))')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_Venue_location_earth', table_name='Venue')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
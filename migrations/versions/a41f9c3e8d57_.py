@@ -0,0 +1,37 @@
+"""end_time on Show
+
+Revision ID: a41f9c3e8d57
+Revises: 7b2d4f6e1a93
+Create Date: 2026-10-18 22:16:48.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41f9c3e8d57'
+down_revision = '7b2d4f6e1a93'
+branch_labels = None
+depends_on = None
+
+# SHOW_DEFAULT_MINUTES when this migration was written
+DEFAULT_MINUTES = 180
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows last the default duration
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f"""UPDATE "Show" SET end_time = start_time + interval '{DEFAULT_MINUTES} minutes'""")
+    else:
+        # keep the microseconds SQLAlchemy writes, so that times compare as strings
+        op.execute(f"""UPDATE "Show" SET end_time = datetime(start_time, '+{DEFAULT_MINUTES} minutes')
+                       || substr(start_time, 20)""")
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
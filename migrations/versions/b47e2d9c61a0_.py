@@ -0,0 +1,84 @@
+"""normalize genres into Genre and venue_genres/artist_genres
+
+Revision ID: b47e2d9c61a0
+Revises: 5e1c0a7b2f94
+Create Date: 2026-10-18 11:58:23.904611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e2d9c61a0'
+down_revision = '5e1c0a7b2f94'
+branch_labels = None
+depends_on = None
+
+ENTITY_TABLES = (('Venue', 'venue_genres', 'venue_id'), ('Artist', 'artist_genres', 'artist_id'))
+
+
+def parse_genres(value):
+    # '{Jazz,"Rock n Roll"}' (a Postgres array literal stored as text) -> names
+    if not value:
+        return []
+    names = (name.strip().strip('"').strip() for name in value.strip('{}').split(','))
+    return [name for name in names if name]
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, genre_table, entity_fk in ENTITY_TABLES:
+        op.create_table(genre_table,
+        sa.Column(entity_fk, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([entity_fk], [f'{table}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(entity_fk, 'genre_id')
+        )
+        op.create_index(f'ix_{genre_table}_genre_id', genre_table, ['genre_id', entity_fk], unique=False)
+
+    # move the existing genre strings into the new tables
+    connection = op.get_bind()
+    entity_genres = {}
+    for table, genre_table, entity_fk in ENTITY_TABLES:
+        rows = connection.execute(sa.text(f'SELECT id, genres FROM "{table}"'))
+        entity_genres[table] = [(entity_id, parse_genres(value)) for entity_id, value in rows]
+
+    names = sorted({name for rows in entity_genres.values() for _, row_names in rows for name in row_names})
+    if names:
+        op.bulk_insert(genre, [{'name': name} for name in names])
+    genre_ids = dict((name, genre_id) for genre_id, name in connection.execute(sa.text('SELECT id, name FROM "Genre"')))
+
+    for table, genre_table, entity_fk in ENTITY_TABLES:
+        links = [{entity_fk: entity_id, 'genre_id': genre_ids[name]}
+                 for entity_id, row_names in entity_genres[table] for name in set(row_names)]
+        if links:
+            op.bulk_insert(sa.table(genre_table, sa.column(entity_fk), sa.column('genre_id')), links)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    for table, genre_table, entity_fk in ENTITY_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+        entity_genres = {}
+        rows = connection.execute(sa.text(
+            f'SELECT {genre_table}.{entity_fk}, "Genre".name FROM {genre_table} '
+            f'JOIN "Genre" ON "Genre".id = {genre_table}.genre_id ORDER BY "Genre".name'))
+        for entity_id, name in rows:
+            entity_genres.setdefault(entity_id, []).append(name)
+        for entity_id, names in entity_genres.items():
+            value = '{' + ','.join(f'"{name}"' if ' ' in name else name for name in names) + '}'
+            connection.execute(sa.text(f'UPDATE "{table}" SET genres = :genres WHERE id = :id'),
+                               {'genres': value, 'id': entity_id})
+        op.drop_index(f'ix_{genre_table}_genre_id', table_name=genre_table)
+        op.drop_table(genre_table)
+    op.drop_table('Genre')
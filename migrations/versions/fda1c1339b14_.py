@@ -0,0 +1,33 @@
+"""updated_at on Venue, Artist and Show
+
+Revision ID: fda1c1339b14
+Revises: 4abe14341e9a
+Create Date: 2026-10-18 15:52:08.204117
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fda1c1339b14'
+down_revision = '4abe14341e9a'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        # existing rows count as modified now (naive UTC, like the model default)
+        op.get_bind().execute(sa.text(f'UPDATE "{table}" SET updated_at = :now'), {'now': datetime.utcnow()})
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -3,10 +3,15 @@
 #----------------------------------------------------------------------------#
 
 from flask import Flask
-from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from datetime import datetime, timedelta
+import sqlite3
+
+from pool import InstrumentedQueuePool
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -15,16 +20,76 @@ from datetime import datetime
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+def pool_options(database_uri):
+    # pool sizing from DB_POOL_OPTIONS; checkouts are instrumented (see
+    # pool.py). Flask-SQLAlchemy gives in-memory SQLite a StaticPool instead.
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return dict(app.config['DB_POOL_OPTIONS'], poolclass=InstrumentedQueuePool)
+
+db = SQLAlchemy(app, engine_options=pool_options(app.config['SQLALCHEMY_DATABASE_URI']))
 
 # TODO: connect to a local postgresql database
-migrate = Migrate(app, db)
+if app.config['MIGRATIONS']:
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite (used in development) only honours ON DELETE CASCADE with this on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
+def get_or_create_genres(names):
+    # Genre rows for the given names, creating the missing ones in the session
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    genres = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))}
+    for name in names:
+        if name not in genres:
+            genres[name] = Genre(name=name)
+            db.session.add(genres[name])
+    return [genres[name] for name in names]
+
+# the (genre_id, <entity>_id) indexes serve "all venues/artists in a genre"
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE"), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE"), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete="CASCADE"), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id'),
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # /shows?city=, then the shows of each venue on ix_Show_venue_id_start_time
+        db.Index('ix_Venue_city', 'city'),
+        # substring search on name (pg_trgm, see migration 9d74d23d438b)
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_Venue_search_vector', 'search_vector',
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -34,26 +99,53 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # the centroid of the venue's city, set on write (see geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # full-text document, maintained on write (see search.py)
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql')))
+
+    # maintained on write and by the roll-over job (see counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # last write to the row, for the page ETags (see conditional.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    shows = db.relationship('Show', backref='venue', lazy=True)
+    # shows are removed by the ON DELETE CASCADE on Show.venue_id
+    shows = db.relationship('Show', backref='venue', lazy=True, passive_deletes=True)
+
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
 
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
+# "near me" searches on Postgres (earthdistance, see migration 7b2d4f6e1a93)
+db.Index('ix_Venue_location_earth', db.func.ll_to_earth(Venue.latitude, Venue.longitude),
+         postgresql_using='gist').ddl_if(dialect='postgresql')
+
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # substring search on name (pg_trgm, see migration 9d74d23d438b)
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_Artist_search_vector', 'search_vector',
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -61,21 +153,62 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    # full-text document, maintained on write (see search.py)
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql')))
 
-    shows = db.relationship('Show', backref='artist', lazy=True)
+    # maintained on write and by the roll-over job (see counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # last write to the row, for the page ETags (see conditional.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # shows are removed by the ON DELETE CASCADE on Show.artist_id
+    shows = db.relationship('Show', backref='artist', lazy=True, passive_deletes=True)
+
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
 
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
+def default_end_time(context):
+  # for inserts that leave it out; the views, the API and the importer set
+  # end_time themselves (see bookings.show_end_time). The parameters are
+  # those of the row being inserted, also in an executemany. Without a
+  # start_time there is no default, and the NOT NULL constraint refuses the
+  # row.
+  start_time = context.get_current_parameters().get('start_time')
+  if start_time is None:
+    return None
+  return start_time + timedelta(minutes=app.config['SHOW_DEFAULT_MINUTES'])
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Show(db.Model):
   __tablename__ = 'Show'
+  __table_args__ = (
+    # per-venue / per-artist show lookups, split on start_time
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    # the global /shows listing, keyset-ordered on (start_time, id)
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    # shows not yet rolled over to past, for the roll-over job
+    db.Index('ix_Show_not_past_start_time', 'start_time',
+             postgresql_where=db.text('NOT is_past'), sqlite_where=db.text('NOT is_past')),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+  # SHOW_DEFAULT_MINUTES after start_time unless given; shows of a venue or
+  # an artist may not overlap (see bookings.py)
+  end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
 
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete="CASCADE"), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete="CASCADE"), nullable=False)
+  # which counter the show is in as of the last roll-over (see counters.py)
+  is_past = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+  # last write to the row, for the page ETags (see conditional.py)
+  updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
   def __repr__(self):
     return f'<Show {self.id} {self.start_time} artist_id={artist_id} venue_id={venue_id}>'
@@ -0,0 +1,114 @@
+#----------------------------------------------------------------------------#
+# Database connection pool instrumentation.
+#
+# The engine's pool is an InstrumentedQueuePool (see models.py), a QueuePool
+# that also records how long each checkout waited for a connection, how many
+# checkouts timed out, and how many connections were opened and invalidated
+# (e.g. by pool_pre_ping or a disconnect). pool_stats() combines these with
+# the pool's current state; it is served at /pool/stats.
+#
+# Pool sizing comes from DB_POOL_OPTIONS in config.py.
+#----------------------------------------------------------------------------#
+
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class Histogram:
+  # cumulative-bucket histogram, in the shape Prometheus expects
+
+  def __init__(self, buckets):
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+    self.sum = 0.0
+    self.lock = threading.Lock()
+
+  def observe(self, value):
+    with self.lock:
+      self.counts[bisect.bisect_left(self.buckets, value)] += 1
+      self.sum += value
+
+  def snapshot(self):
+    with self.lock:
+      counts, total = list(self.counts), self.sum
+    cumulative, running = {}, 0
+    for bound, count in zip(self.buckets + (float('inf'),), counts):
+      running += count
+      cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+    return {"buckets": cumulative, "count": running, "sum": total}
+
+
+# seconds; a checkout that does not wait takes a few microseconds
+CHECKOUT_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class PoolMetrics:
+
+  def __init__(self):
+    self.checkout_wait = Histogram(CHECKOUT_WAIT_BUCKETS)
+    self.counters = {"checkouts": 0, "timeouts": 0, "connects": 0, "invalidations": 0, "soft_invalidations": 0}
+    self.lock = threading.Lock()
+
+  def increment(self, name):
+    with self.lock:
+      self.counters[name] += 1
+
+  def snapshot(self):
+    with self.lock:
+      counters = dict(self.counters)
+    return dict(counters, checkout_wait_seconds=self.checkout_wait.snapshot())
+
+
+class InstrumentedQueuePool(QueuePool):
+
+  def __init__(self, *args, **kwargs):
+    recreated = kwargs.get('_dispatch') is not None
+    super().__init__(*args, **kwargs)
+    self.metrics = PoolMetrics()
+    if not recreated:
+      # a recreated pool (engine.dispose()) inherits these listeners from
+      # the pool it replaces, along with its metrics (see recreate())
+      metrics = self.metrics
+      event.listen(self, 'connect', lambda *args: metrics.increment('connects'))
+      event.listen(self, 'invalidate', lambda *args: metrics.increment('invalidations'))
+      event.listen(self, 'soft_invalidate', lambda *args: metrics.increment('soft_invalidations'))
+
+  def recreate(self):
+    pool = super().recreate()
+    pool.metrics = self.metrics
+    return pool
+
+  def connect(self):
+    # the wait covers queueing for a free connection as well as opening an
+    # overflow connection and the pre-ping
+    start = time.perf_counter()
+    try:
+      connection = super().connect()
+    except exc.TimeoutError:
+      self.metrics.increment('timeouts')
+      raise
+    finally:
+      self.metrics.checkout_wait.observe(time.perf_counter() - start)
+    self.metrics.increment('checkouts')
+    return connection
+
+
+def pool_stats(engine):
+  pool = engine.pool
+  stats = {"pool": type(pool).__name__}
+  if isinstance(pool, QueuePool):
+    stats.update({
+      "size": pool.size(),
+      "max_overflow": pool._max_overflow,
+      "checked_out": pool.checkedout(),
+      "checked_in": pool.checkedin(),
+      # negative until pool_size connections have been opened
+      "overflow": max(pool.overflow(), 0),
+    })
+  if isinstance(pool, InstrumentedQueuePool):
+    stats.update(pool.metrics.snapshot())
+  return stats
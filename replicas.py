@@ -0,0 +1,97 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# DATABASE_REPLICA_URLS (comma-separated) adds read replicas as the binds
+# replica_0, replica_1, ... The SELECTs of views marked @read_replica run
+# on one of them, picked per request. Everything else goes to the primary
+# (SQLALCHEMY_DATABASE_URI): other views, commands, flushes and
+# INSERT / UPDATE / DELETE statements.
+#
+# Replicas lag behind the primary. After a request that wrote to the
+# database, that client reads from the primary for READ_YOUR_WRITES_SECONDS
+# (tracked in its session cookie), so that it sees its own changes. For the
+# same window, pages read from a replica are not stored in the page cache
+# (see cache.py); a page rendered right after an invalidation could
+# otherwise be cached with the replica's stale data.
+#----------------------------------------------------------------------------#
+
+import random
+import time
+
+from flask import g, request, session, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import app, db
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# when this process last wrote to the primary
+last_write = 0.0
+
+
+def replica_engines():
+  return [engine for key, engine in db.engines.items() if isinstance(key, str) and key.startswith('replica_')]
+
+
+def read_replica(view):
+  # marks a read-only view; goes right below @app.route, like @query_budget
+  view.read_replica = True
+  return view
+
+
+def reading_own_writes():
+  return session.get('primary_until', 0) > time.time()
+
+
+def replica_may_lag():
+  # whether this request reads from a replica that may not have caught up
+  # with this process's latest write yet
+  return g.get('replica') is not None and time.time() < last_write + app.config['READ_YOUR_WRITES_SECONDS']
+
+#----------------------------------------------------------------------------#
+# Request hooks
+#----------------------------------------------------------------------------#
+
+@app.before_request
+def choose_replica():
+  view = app.view_functions.get(request.endpoint)
+  if request.method in SAFE_METHODS and getattr(view, 'read_replica', False) and not reading_own_writes():
+    engines = replica_engines()
+    if engines:
+      g.replica = random.choice(engines)
+
+
+@app.after_request
+def stick_to_primary(response):
+  global last_write
+  if g.get('database_written'):
+    last_write = time.time()
+    session['primary_until'] = last_write + app.config['READ_YOUR_WRITES_SECONDS']
+  return response
+
+#----------------------------------------------------------------------------#
+# Session events
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'do_orm_execute')
+def route_to_replica(orm_execute_state):
+  if not has_request_context():
+    return
+  if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+    g.database_written = True
+    return
+  replica = g.get('replica')
+  if replica is None or not orm_execute_state.is_select or orm_execute_state.statement._for_update_arg is not None:
+    return
+  # a SELECT that autoflushes pending changes must see them
+  session_ = orm_execute_state.session
+  if session_.new or session_.dirty or session_.deleted:
+    return
+  orm_execute_state.bind_arguments['bind'] = replica
+
+
+@event.listens_for(Session, 'after_flush')
+def note_write(session_, flush_context):
+  if has_request_context():
+    g.database_written = True
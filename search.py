@@ -0,0 +1,341 @@
+#----------------------------------------------------------------------------#
+# Full-text search over venues and artists.
+#
+# Each venue and artist is indexed on its name (weight A), city, state and
+# genres (weight B) and seeking_description (weight C).
+#
+# On Postgres the index is the `search_vector` tsvector column, recomputed at
+# flush time for every new or modified venue/artist (including genre-only
+# changes) and served by a GIN index (migration 5e1c0a7b2f94). Any other database (SQLite in development)
+# uses an in-process inverted index instead, built on first use and updated
+# from the session when a transaction commits; other workers catch up when
+# they rebuild theirs, within SEARCH_INDEX_TTL seconds.
+#
+# Every query term is a prefix match and all terms must match; results are
+# ranked by the weights of the fields they matched in, then by id.
+#----------------------------------------------------------------------------#
+
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import app, db, Venue, Artist, Genre, venue_genres, artist_genres
+
+# Postgres' default ts_rank weights for D, C, B, A (0.1, 0.2, 0.4, 1.0),
+# scaled to integers for the in-process index
+WEIGHTS = {'A': 10, 'B': 4, 'C': 2, 'D': 1}
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+ENTITY_TYPES = {Venue: 'venue', Artist: 'artist'}
+
+GENRE_TABLES = {Venue: venue_genres, Artist: artist_genres}
+
+
+def tokenize(text):
+  return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def document_fields(entity, genre_names):
+  # (text, weight) pairs that make up the searchable document of an entity
+  return [
+    (entity.name, 'A'),
+    (' '.join(filter(None, [entity.city, entity.state] + genre_names)), 'B'),
+    (entity.seeking_description, 'C'),
+  ]
+
+
+def changed_entities(session):
+  # (entity_type, entity) for every new or modified venue/artist in the session
+  for entity in session.new | session.dirty:
+    entity_type = ENTITY_TYPES.get(type(entity))
+    if entity_type and session.is_modified(entity):
+      yield entity_type, entity
+
+
+def using_postgres():
+  return db.engine.dialect.name == 'postgresql'
+
+#----------------------------------------------------------------------------#
+# Postgres: tsvector column
+#----------------------------------------------------------------------------#
+
+TS_CONFIG = db.literal_column("'english'::regconfig")
+
+
+def search_vector_expression(entity):
+  vector = None
+  for text, weight in document_fields(entity, entity.genre_names):
+    part = db.func.setweight(db.func.to_tsvector(TS_CONFIG, text or ''),
+                             db.literal_column(f"'{weight}'"))
+    vector = part if vector is None else vector.op('||')(part)
+  return vector
+
+
+@event.listens_for(Session, 'before_flush')
+def set_search_vectors(session, flush_context, instances):
+  # done per session rather than per row so that a change to an entity's
+  # genres alone still rewrites its vector
+  if session.get_bind().dialect.name != 'postgresql':
+    return
+  for entity_type, entity in list(changed_entities(session)):
+    entity.search_vector = search_vector_expression(entity)
+
+
+def search_vector_sql(model):
+  # the same document as search_vector_expression, computed by the database
+  # from the row's columns and genres (for rows not written through the ORM)
+  genre_table = GENRE_TABLES[model]
+  entity_fk = genre_table.c[f'{ENTITY_TYPES[model]}_id']
+  genres = db.select(db.func.string_agg(Genre.name, db.literal_column("' '"))) \
+    .select_from(genre_table.join(Genre, genre_table.c.genre_id == Genre.id)) \
+    .where(entity_fk == model.id) \
+    .scalar_subquery()
+  fields = [
+    (model.name, 'A'),
+    (db.func.concat_ws(' ', model.city, model.state, genres), 'B'),
+    (model.seeking_description, 'C'),
+  ]
+  vector = None
+  for text, weight in fields:
+    part = db.func.setweight(db.func.to_tsvector(TS_CONFIG, db.func.coalesce(text, '')),
+                             db.literal_column(f"'{weight}'"))
+    vector = part if vector is None else vector.op('||')(part)
+  return vector
+
+
+def to_tsquery_text(search_term):
+  # "jazz san fr" -> "jazz:* & san:* & fr:*"; tokens are [a-z0-9] only, so
+  # nothing in the user's input can break the tsquery syntax.
+  return ' & '.join(token + ':*' for token in tokenize(search_term))
+
+
+def search_postgres(search_term, limit, offset):
+  query = db.func.to_tsquery(TS_CONFIG, to_tsquery_text(search_term))
+  selects = []
+  for model, entity_type in ENTITY_TYPES.items():
+    selects.append(db.select(
+      db.literal(entity_type).label('type'), model.id, model.name, model.city, model.state,
+      db.func.ts_rank(model.search_vector, query).label('rank')
+    ).where(model.search_vector.bool_op('@@')(query)))
+  hits = db.union_all(*selects).subquery()
+  rows = db.session.execute(
+    db.select(hits.c.type, hits.c.id, hits.c.name, hits.c.city, hits.c.state)
+      .order_by(hits.c.rank.desc(), hits.c.id, hits.c.type)
+      .limit(limit)
+      .offset(offset)
+  )
+  return [dict(row._mapping) for row in rows]
+
+#----------------------------------------------------------------------------#
+# Other databases: in-process inverted index
+#----------------------------------------------------------------------------#
+
+class InvertedIndex:
+
+  def __init__(self, ttl):
+    self.postings = {}   # token -> {document key: weight}
+    self.tokens = []     # sorted vocabulary, for prefix lookups
+    self.documents = {}  # key -> (tokens, entry)
+    self.lock = threading.Lock()
+    self.expires_at = time.monotonic() + ttl
+
+  def add(self, key, entry, fields):
+    token_weights = {}
+    for text, weight in fields:
+      for token in tokenize(text):
+        token_weights[token] = max(token_weights.get(token, 0), WEIGHTS[weight])
+    with self.lock:
+      self._remove(key)
+      for token, weight in token_weights.items():
+        posting = self.postings.get(token)
+        if posting is None:
+          posting = self.postings[token] = {}
+          bisect.insort(self.tokens, token)
+        posting[key] = weight
+      self.documents[key] = (token_weights.keys(), entry)
+
+  def remove(self, key):
+    with self.lock:
+      self._remove(key)
+
+  def _remove(self, key):
+    document = self.documents.pop(key, None)
+    if document is None:
+      return
+    for token in document[0]:
+      posting = self.postings[token]
+      del posting[key]
+      if not posting:
+        del self.postings[token]
+        del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+  def _term_postings(self, term):
+    # postings of every token starting with `term`
+    postings = []
+    tokens = self.tokens
+    position = bisect.bisect_left(tokens, term)
+    while position < len(tokens) and tokens[position].startswith(term):
+      postings.append(self.postings[tokens[position]])
+      position += 1
+    return postings
+
+  def search(self, search_term, limit, offset):
+    terms = set(tokenize(search_term))
+    if not terms:
+      return []
+    with self.lock:
+      # start from the most selective term and only probe the others for
+      # the surviving candidates.
+      term_postings = sorted((self._term_postings(term) for term in terms),
+                             key=lambda postings: sum(map(len, postings)))
+      scores = merge_postings(term_postings[0])
+      for postings in term_postings[1:]:
+        if len(postings) == 1:
+          posting = postings[0]
+          scores = {key: score + weight for key, score in scores.items()
+                    if (weight := posting.get(key))}
+        else:
+          narrowed = {}
+          for key, score in scores.items():
+            weight = max([posting.get(key, 0) for posting in postings], default=0)
+            if weight:
+              narrowed[key] = score + weight
+          scores = narrowed
+
+      # rank by score, ties broken by document key; only the score levels
+      # that reach the requested page are collected and ordered.
+      wanted = offset + limit
+      keys = []
+      for level in sorted(set(scores.values()), reverse=True):
+        level_keys = [key for key, score in scores.items() if score == level]
+        keys.extend(heapq.nsmallest(wanted - len(keys), level_keys))
+        if len(keys) >= wanted:
+          break
+      return [dict(self.documents[key][1]) for key in keys[offset:]]
+
+
+def merge_postings(postings):
+  # best weight per document across several postings (read-only when there
+  # is just one)
+  if len(postings) == 1:
+    return postings[0]
+  scores = {}
+  for posting in postings:
+    for key, weight in posting.items():
+      if weight > scores.get(key, 0):
+        scores[key] = weight
+  return scores
+
+
+memory_index = None
+memory_index_lock = threading.Lock()
+
+
+ENTITY_CODES = {'artist': 0, 'venue': 1}
+
+
+def index_key(entity_type, entity_id):
+  # document keys are ints so that ordering ties is cheap: id, then type
+  return entity_id * 2 + ENTITY_CODES[entity_type]
+
+
+def index_entry(entity_type, entity):
+  return {
+    "type": entity_type,
+    "id": entity.id,
+    "name": entity.name,
+    "city": entity.city,
+    "state": entity.state,
+  }
+
+
+def get_memory_index():
+  global memory_index
+  index = memory_index
+  if index is None or index.expires_at < time.monotonic():
+    with memory_index_lock:
+      index = memory_index
+      if index is None or index.expires_at < time.monotonic():
+        index = InvertedIndex(app.config['SEARCH_INDEX_TTL'])
+        for model, entity_type in ENTITY_TYPES.items():
+          genre_table = GENRE_TABLES[model]
+          entity_fk = genre_table.c[f'{entity_type}_id']
+          genre_names = {}
+          for entity_id, name in db.session.query(entity_fk, Genre.name).join(Genre, genre_table.c.genre_id == Genre.id):
+            genre_names.setdefault(entity_id, []).append(name)
+          rows = db.session.query(model.id, model.name, model.city, model.state, model.seeking_description)
+          for row in rows:
+            index.add(index_key(entity_type, row.id), index_entry(entity_type, row),
+                      document_fields(row, genre_names.get(row.id, [])))
+        memory_index = index
+  return index
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_search_changes(session, flush_context):
+  # snapshot changed documents now, while their attributes are loaded; they
+  # are applied to the index only once the transaction commits.
+  if memory_index is None:
+    return
+  pending = session.info.setdefault('search_pending', {})
+  for entity_type, entity in changed_entities(session):
+    pending[index_key(entity_type, entity.id)] = (index_entry(entity_type, entity),
+                                                  document_fields(entity, entity.genre_names))
+  for entity in session.deleted:
+    entity_type = ENTITY_TYPES.get(type(entity))
+    if entity_type:
+      pending[index_key(entity_type, entity.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_search_changes(session):
+  pending = session.info.pop('search_pending', None)
+  if not pending or memory_index is None:
+    return
+  for key, document in pending.items():
+    if document is None:
+      memory_index.remove(key)
+    else:
+      memory_index.add(key, *document)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_search_changes(session, previous_transaction):
+  session.info.pop('search_pending', None)
+
+def reindex(model, ids):
+  # documents of rows inserted or updated without the ORM (bulk import);
+  # call inside the writing transaction
+  global memory_index
+  if using_postgres():
+    db.session.execute(model.__table__.update()
+                         .where(model.id.in_(ids))
+                         .values(search_vector=search_vector_sql(model)))
+  else:
+    # rebuilt from the database on the next search
+    memory_index = None
+
+#----------------------------------------------------------------------------#
+# Entry point
+#----------------------------------------------------------------------------#
+
+def search_catalog(search_term, page, per_page):
+  # one ranked page of venues and artists matching every term of search_term
+  offset = (page - 1) * per_page
+  if not tokenize(search_term):
+    hits = []
+  elif using_postgres():
+    hits = search_postgres(search_term, per_page + 1, offset)
+  else:
+    hits = get_memory_index().search(search_term, per_page + 1, offset)
+  return {
+    "data": hits[:per_page],
+    "page": page,
+    "has_next": len(hits) > per_page
+  }
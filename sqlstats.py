@@ -0,0 +1,133 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL statistics.
+#
+# Every statement executed on any engine is counted and timed. Within a
+# request the totals are sent back in a Server-Timing header:
+#
+#   Server-Timing: db;dur=4.21;desc="3 queries", app;dur=9.87
+#
+# Statements slower than SLOW_QUERY_MS are logged with the endpoint and
+# their parameters. Views declare how many statements they may run with
+# @query_budget(n); requests over budget are logged, and
+# check_query_budget() fails a test or benchmark when a route exceeds it.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import app
+
+# capture lists of check_query_budget() / captured_queries() in progress
+recorders = []
+recorders_lock = threading.Lock()
+
+
+def request_stats():
+  stats = g.get('sql_stats')
+  if stats is None:
+    stats = g.sql_stats = {"count": 0, "seconds": 0.0}
+  return stats
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+  elapsed = time.perf_counter() - conn.info['query_started'].pop()
+  if has_request_context():
+    stats = request_stats()
+    stats["count"] += 1
+    stats["seconds"] += elapsed
+  if recorders:
+    with recorders_lock:
+      for recorder in recorders:
+        recorder.append(statement)
+  if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+    log_slow_query(elapsed, statement, parameters, executemany)
+
+
+@event.listens_for(Engine, 'handle_error')
+def drop_query_timer(context):
+  started = context.connection.info.get('query_started') if context.connection is not None else None
+  if started:
+    started.pop()
+
+
+def log_slow_query(elapsed, statement, parameters, executemany):
+  endpoint = request.endpoint if has_request_context() else 'cli'
+  if executemany:
+    parameters = f'<{len(parameters)} parameter sets>'
+  app.logger.warning('slow query (%.1f ms) in %s: %s; parameters: %.500r',
+                     elapsed * 1000, endpoint, ' '.join(statement.split()), parameters)
+
+#----------------------------------------------------------------------------#
+# Request hooks
+#----------------------------------------------------------------------------#
+
+@app.before_request
+def start_request_timer():
+  g.request_started = time.perf_counter()
+
+
+@app.after_request
+def add_server_timing(response):
+  # a streamed body (/shows with STREAM_SHOWS) runs its queries after this
+  stats = request_stats()
+  budget = getattr(app.view_functions.get(request.endpoint), 'query_budget', None)
+  if budget is not None and stats["count"] > budget:
+    app.logger.warning('%s ran %d queries, over its budget of %d', request.endpoint, stats["count"], budget)
+  if app.config['SERVER_TIMING']:
+    total = time.perf_counter() - g.get('request_started', time.perf_counter())
+    queries = '1 query' if stats["count"] == 1 else f'{stats["count"]} queries'
+    response.headers.add('Server-Timing', f'db;dur={stats["seconds"] * 1000:.2f};desc="{queries}"')
+    response.headers.add('Server-Timing', f'app;dur={total * 1000:.2f}')
+  return response
+
+#----------------------------------------------------------------------------#
+# Query budgets
+#----------------------------------------------------------------------------#
+
+def query_budget(queries):
+  # the most statements the view may run; goes right below @app.route
+  def decorator(view):
+    view.query_budget = queries
+    return view
+  return decorator
+
+
+@contextmanager
+def captured_queries():
+  # the statements executed inside the block, from any thread
+  statements = []
+  with recorders_lock:
+    recorders.append(statements)
+  try:
+    yield statements
+  finally:
+    with recorders_lock:
+      recorders.remove(statements)
+
+
+def check_query_budget(client, url, budget=None, **kwargs):
+  # GET url with the test client and raise AssertionError when it runs more
+  # statements than budget (default: the budget declared by its view)
+  if budget is None:
+    endpoint, view_args = app.url_map.bind('localhost').match(urlsplit(url).path)
+    budget = getattr(app.view_functions[endpoint], 'query_budget', None)
+    assert budget is not None, f'{endpoint} declares no query budget'
+  with captured_queries() as statements:
+    response = client.get(url, **kwargs)
+    response.get_data()  # streamed bodies run their queries here
+  assert len(statements) <= budget, \
+    f'{url} ran {len(statements)} queries, over its budget of {budget}:\n' + '\n'.join(statements)
+  return response
@@ -2,3 +2,46 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Inputs with a data-typeahead URL (the artist and venue of the create-show
+// form) fill their <datalist> with the names starting with what is typed;
+// picking one puts its id in the input.
+document.querySelectorAll('input[data-typeahead]').forEach(function (input) {
+  var options = document.getElementById(input.getAttribute('list'));
+  var timer;
+  input.addEventListener('input', function () {
+    var term = input.value.trim();
+    clearTimeout(timer);
+    if (!term || /^\d+$/.test(term)) {
+      return;
+    }
+    timer = setTimeout(function () {
+      fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(term))
+        .then(function (response) { return response.json(); })
+        .then(function (names) {
+          options.innerHTML = '';
+          names.forEach(function (entry) {
+            var option = document.createElement('option');
+            option.value = entry.id;
+            option.textContent = entry.name;
+            options.appendChild(option);
+          });
+        });
+    }, 150);
+  });
+});
+
+// "Use my location" on the venues-near page: search around the browser's
+// position instead of a city.
+document.querySelectorAll('button[data-locate]').forEach(function (button) {
+  button.addEventListener('click', function () {
+    var form = button.form;
+    navigator.geolocation.getCurrentPosition(function (position) {
+      form.elements.lat.value = position.coords.latitude.toFixed(5);
+      form.elements.lng.value = position.coords.longitude.toFixed(5);
+      form.elements.city.disabled = true;
+      form.elements.state.disabled = true;
+      form.submit();
+    });
+  });
+});
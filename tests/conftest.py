@@ -0,0 +1,108 @@
+#----------------------------------------------------------------------------#
+# Test fixtures.
+#
+# The app is configured from the environment when it is imported, so these
+# are set first: a throwaway SQLite file as the primary and another as its
+# read replica (see replicas.py), and no page cache, so that every request
+# runs its queries (the page_cache fixture turns on an in-memory one). Each
+# test starts from empty tables; replicate() copies the primary to the
+# replica, which otherwise lags behind it.
+#
+#   python -m pytest -q
+#----------------------------------------------------------------------------#
+
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+directory = tempfile.mkdtemp(prefix='fyyur-tests-')
+PRIMARY = os.path.join(directory, 'primary.db')
+REPLICA = os.path.join(directory, 'replica.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + PRIMARY
+os.environ['DATABASE_REPLICA_URLS'] = 'sqlite:///' + REPLICA
+os.environ['CACHE_BACKEND'] = 'none'
+
+from app import app as flask_app
+from models import db, Venue, Artist, Show, Genre
+from counters import rebuild_show_counters
+import cache
+import replicas
+
+flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+
+# the venue form, as posted to /venues/create and /venues/<id>/edit
+VENUE_FORM = {
+  "name": "Replica Lag Lounge",
+  "city": "Springfield",
+  "state": "CA",
+  "address": "1 Lag Street",
+  "phone": "415-555-0199",
+  "genres": ["Jazz"],
+  "image_link": "",
+  "facebook_link": "https://www.facebook.com/replicalag",
+  "website": "",
+  "seeking_talent": "No",
+  "seeking_description": "",
+}
+
+
+def replicate():
+  source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+  source.backup(target)
+  source.close()
+  target.close()
+
+
+@pytest.fixture
+def app():
+  with flask_app.app_context():
+    db.drop_all()
+    db.create_all()
+  replicate()
+  yield flask_app
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+
+@pytest.fixture
+def page_cache(monkeypatch):
+  # pages read from the replica within READ_YOUR_WRITES_SECONDS of a write
+  # are not stored, also when that write was made by an earlier test
+  monkeypatch.setattr(replicas, 'last_write', 0.0)
+  page_cache = cache.PageCache(cache.MemoryBackend(1000, 300))
+  monkeypatch.setattr(cache, 'page_cache', page_cache)
+  return page_cache
+
+
+def add_shows(venue_count, artist_count, shows, genres=('Jazz', 'Blues')):
+  # venue_count venues and artist_count artists; venue 1 and artist 1 play
+  # every one of the shows, half of them past, each with another artist or
+  # venue. Returns after replicating.
+  with flask_app.app_context():
+    genre_rows = [Genre(name=name) for name in genres]
+    venues = [Venue(name=f'Venue {n}', city='Springfield', state='CA', address=f'{n} Main Street',
+                    genres=genre_rows) for n in range(1, venue_count + 1)]
+    artists = [Artist(name=f'Artist {n}', city='Springfield', state='CA', genres=genre_rows[:1])
+               for n in range(1, artist_count + 1)]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for n in range(shows):
+      start_time = now + timedelta(days=2 * n - shows)
+      db.session.add(Show(venue_id=venues[0].id, artist_id=artists[n % artist_count].id, start_time=start_time))
+      db.session.add(Show(venue_id=venues[n % venue_count].id, artist_id=artists[0].id,
+                          start_time=start_time + timedelta(days=1)))
+    db.session.commit()
+    rebuild_show_counters()
+  replicate()
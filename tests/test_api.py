@@ -0,0 +1,82 @@
+#----------------------------------------------------------------------------#
+# JSON API (see api.py): paging, errors and recurring shows.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_shows, replicate
+from counters import check_show_counters
+from models import db, Show
+
+START = datetime(2030, 1, 7, 20, 0)  # a Monday
+
+
+def residency(venue_id, artist_id, start_time, weeks, **fields):
+  return dict({"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time.isoformat(),
+               "weeks": weeks}, **fields)
+
+
+def count_shows(app):
+  with app.app_context():
+    return db.session.query(db.func.count(Show.id)).scalar()
+
+
+def test_pages_follow_the_cursor_through_every_show(client):
+  add_shows(5, 5, 12)
+  ids, url = [], '/api/v1/shows?limit=5&fields=id,start_time'
+  while url:
+    page = client.get(url).get_json()
+    assert len(page["data"]) <= 5
+    ids.extend(show["id"] for show in page["data"])
+    url = page["next_cursor"] and f'/api/v1/shows?limit=5&fields=id,start_time&after={page["next_cursor"]}'
+  assert len(ids) == len(set(ids)) == 24
+
+
+@pytest.mark.parametrize('url, status', [('/api/v1/shows?after=not-a-cursor', 400),
+                                         ('/api/v1/venues?fields=id,password', 400),
+                                         ('/api/v1/artists/999', 404)])
+def test_errors_are_json(client, url, status):
+  add_shows(2, 2, 2)
+  response = client.get(url)
+  assert response.status_code == status and response.get_json()["error"]
+
+
+def test_a_residency_is_created_at_once(app, client):
+  add_shows(3, 3, 0)
+  response = client.post('/api/v1/shows/recurring', json=residency(1, 1, START, 4, weekdays=['MO', 'FR']))
+  assert response.status_code == 201
+  created = response.get_json()["data"]
+  assert [show["start_time"] for show in created] == [
+    (START + timedelta(days=days)).isoformat() for days in (0, 4, 7, 11, 14, 18, 21, 25)]
+  assert count_shows(app) == 8
+  with app.app_context():
+    assert not check_show_counters()
+
+
+def test_an_overlapping_residency_creates_nothing(app, client):
+  add_shows(3, 3, 0)
+  assert client.post('/api/v1/shows/recurring', json=residency(1, 1, START, 4)).status_code == 201
+  replicate()
+
+  # artist 1 again, at another venue, an hour into its third show
+  response = client.post('/api/v1/shows/recurring', json=residency(
+    2, 1, START - timedelta(days=7, hours=-1), 6))
+  assert response.status_code == 409
+  conflicts = response.get_json()["conflicts"]
+  assert len(conflicts) == 4 and all(conflict["reason"].startswith('The artist') for conflict in conflicts)
+  assert count_shows(app) == 4
+  with app.app_context():
+    assert not check_show_counters()
+
+
+@pytest.mark.parametrize('fields, status', [({"weeks": 0}, 400), ({"weekdays": ['XX']}, 400),
+                                            ({"venue_id": 999}, 404),
+                                            ({"end_time": START.isoformat()}, 400),
+                                            ({"start_time": '2030-01-07T20:00:00+01:00'}, 400)])
+def test_an_invalid_residency_is_refused(app, client, fields, status):
+  add_shows(3, 3, 0)
+  response = client.post('/api/v1/shows/recurring', json=dict(residency(1, 1, START, 4), **fields))
+  assert response.status_code == status and response.get_json()["error"]
+  assert count_shows(app) == 0
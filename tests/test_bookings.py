@@ -0,0 +1,27 @@
+#----------------------------------------------------------------------------#
+# Booking conflict checks (see bookings.py).
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+import bookings
+from bookings import find_conflicts
+from conftest import add_shows
+from models import db, Show
+
+START = datetime(2030, 1, 7, 12, 0)
+
+
+def test_shows_longer_than_a_lowered_limit_still_conflict(app, monkeypatch):
+  add_shows(2, 2, 0)
+  with app.app_context():
+    # booked while SHOW_MAX_MINUTES allowed a ten hour show
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=START, end_time=START + timedelta(hours=10)))
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'SHOW_MAX_MINUTES', 180)
+    monkeypatch.setattr(bookings, 'longest_show', None)
+    conflicts = find_conflicts(1, 2, [(START + timedelta(hours=8), START + timedelta(hours=9))])
+    assert [(conflict.side, conflict.start_time) for conflict in conflicts] == [('venue', START)]
+    assert not find_conflicts(1, 2, [(START + timedelta(hours=10), START + timedelta(hours=11))])
+    # while no new show may be longer than the setting
+    assert bookings.check_times(START, START + timedelta(hours=4)) is not None
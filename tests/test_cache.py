@@ -0,0 +1,61 @@
+#----------------------------------------------------------------------------#
+# Rendered page cache invalidation (see cache.py), with an in-memory cache.
+#
+# Pages are read by a client that has written nothing, so that they come
+# from the replica and may be cached; replicate() stands in for the replica
+# catching up after a write.
+#----------------------------------------------------------------------------#
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from conftest import PRIMARY, VENUE_FORM, add_shows, replicate
+from counters import rebuild_show_counters
+from models import db, Show
+
+
+def test_editing_a_venue_refreshes_its_cached_pages(app, page_cache):
+  add_shows(3, 3, 4)
+  reader = app.test_client()
+  for url in ('/venues', '/venues/1', '/artists/1'):
+    assert 'Venue 1' in reader.get(url).get_data(as_text=True)
+    assert 'Venue 1' in reader.get(url).get_data(as_text=True)
+  assert page_cache.stats["hits"] == 3
+
+  assert app.test_client().post('/venues/1/edit', data=dict(VENUE_FORM, name='Renamed Hall')).status_code == 302
+  replicate()
+  for url in ('/venues', '/venues/1', '/artists/1'):
+    page = reader.get(url).get_data(as_text=True)
+    assert 'Renamed Hall' in page and 'Venue 1<' not in page, url
+
+
+def test_rebuilding_the_counters_refreshes_every_page(app, page_cache):
+  add_shows(3, 3, 4)
+  reader = app.test_client()
+  before = reader.get('/artists/2').get_data(as_text=True)
+  assert reader.get('/artists/2').get_data(as_text=True) == before
+
+  # shows removed behind the app's back, then counted again
+  connection = sqlite3.connect(PRIMARY)
+  connection.execute('DELETE FROM "Show" WHERE artist_id = 2')
+  connection.commit()
+  connection.close()
+  with app.app_context():
+    rebuild_show_counters()
+  replicate()
+  after = reader.get('/artists/2').get_data(as_text=True)
+  assert after != before and '0 Upcoming Shows' in after and '0 Past Shows' in after
+
+
+def test_detail_pages_are_cached_until_their_next_show_starts(app, page_cache):
+  add_shows(3, 3, 0)
+  starts_in = 120
+  with app.app_context():
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime.now() + timedelta(seconds=starts_in)))
+    db.session.add(Show(venue_id=1, artist_id=2, start_time=datetime.now() + timedelta(days=2)))
+    db.session.commit()
+  replicate()
+  assert app.test_client().get('/venues/1').status_code == 200
+  expires_at, page = next(iter(page_cache.backend.entries.values()))
+  assert expires_at - time.monotonic() <= starts_in
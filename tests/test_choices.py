@@ -0,0 +1,20 @@
+#----------------------------------------------------------------------------#
+# Artist / venue name lookups of the create-show form (see choices.py).
+#----------------------------------------------------------------------------#
+
+import pytest
+
+from conftest import add_shows
+from models import db, Venue, Artist
+
+
+@pytest.mark.parametrize('model, url', [(Venue, '/venues/typeahead'), (Artist, '/artists/typeahead')])
+def test_rows_without_a_name_are_left_out(app, client, model, url):
+  add_shows(3, 3, 0)
+  with app.app_context():
+    db.session.add(model(name=None, city='Springfield', state='CA', address='1 Main Street')
+                   if model is Venue else model(name=None, city='Springfield', state='CA'))
+    db.session.commit()
+  response = client.get(f'{url}?q={model.__name__}')
+  assert response.status_code == 200
+  assert [item["name"] for item in response.get_json()] == [f'{model.__name__} {n}' for n in (1, 2, 3)]
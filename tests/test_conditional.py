@@ -0,0 +1,36 @@
+#----------------------------------------------------------------------------#
+# Conditional requests of the read pages (see conditional.py).
+#----------------------------------------------------------------------------#
+
+import pytest
+
+from conftest import add_shows, replicate
+
+# a date after any the pages could have been modified at
+FAR_FUTURE = 'Thu, 01 Jan 2099 00:00:00 GMT'
+
+
+@pytest.mark.parametrize('url', ['/venues', '/artists', '/shows', '/venues/1', '/artists/1'])
+def test_an_unchanged_page_is_answered_304(client, url):
+  add_shows(3, 3, 4)
+  etag = client.get(url).headers['ETag']
+  response = client.get(url, headers={"If-None-Match": etag})
+  assert response.status_code == 304 and not response.get_data()
+
+
+@pytest.mark.parametrize('url, deleted', [('/venues', '/venues/3/delete'), ('/artists', '/artists/3/delete'),
+                                          ('/shows', '/venues/3/delete'), ('/venues/1', '/artists/3/delete'),
+                                          ('/artists/1', '/venues/3/delete')])
+def test_a_page_is_sent_again_after_a_delete(app, client, url, deleted):
+  add_shows(3, 3, 4)
+  response = client.get(url)
+  assert response.headers.get('Last-Modified') is None
+  etag = response.headers['ETag']
+  name = 'Venue 3' if deleted.startswith('/venues') else 'Artist 3'
+  assert name in response.get_data(as_text=True)
+
+  assert app.test_client().post(deleted).status_code == 302
+  replicate()
+  for headers in ({"If-None-Match": etag}, {"If-Modified-Since": FAR_FUTURE}):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200 and name not in response.get_data(as_text=True)
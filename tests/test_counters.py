@@ -0,0 +1,42 @@
+#----------------------------------------------------------------------------#
+# Show counters and the roll-over job (see counters.py).
+#----------------------------------------------------------------------------#
+
+import threading
+from datetime import datetime, timedelta
+
+from conftest import add_shows
+from counters import roll_over_shows, check_show_counters
+from models import db, Venue, Show
+
+
+def test_rolling_over_twice_moves_each_show_once(app):
+  add_shows(4, 4, 20)
+  later = datetime.now() + timedelta(days=30)
+  with app.app_context():
+    due = db.session.query(Show).filter(Show.is_past == False).count()
+    assert roll_over_shows(later) == due > 0
+    assert roll_over_shows(later) == 0
+    assert not check_show_counters()
+    assert db.session.query(db.func.sum(Venue.upcoming_shows_count)).scalar() == 0
+
+
+def test_overlapping_roll_overs_move_each_show_once(app):
+  add_shows(10, 10, 100)
+  later = datetime.now() + timedelta(days=200)
+  with app.app_context():
+    due = db.session.query(Show).filter(Show.is_past == False).count()
+  moved = []
+
+  def roll_over():
+    with app.app_context():
+      moved.append(roll_over_shows(later))
+
+  threads = [threading.Thread(target=roll_over) for _ in range(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert sum(moved) == due
+  with app.app_context():
+    assert not check_show_counters()
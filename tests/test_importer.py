@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------#
+# Overlap checks of the bulk show import (see importer.py).
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+import importer
+from conftest import add_shows
+from importer import import_rows
+from models import db, Show
+from sqlstats import captured_queries
+
+START = datetime(2030, 1, 7, 20, 0)
+
+
+def show_row(venue_id, artist_id, start_time, hours=3):
+  return {"venue_id": str(venue_id), "artist_id": str(artist_id),
+          "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S'),
+          "end_time": (start_time + timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def run_import(rows, chunk_size=1000):
+  refused = {}
+  stats = import_rows('shows', enumerate(rows, 2), chunk_size=chunk_size,
+                      reject=lambda line, row, errors: refused.update({line: errors}))
+  return stats, refused
+
+
+def test_overlaps_in_the_database_and_in_the_file_are_refused(app):
+  add_shows(5, 5, 0)
+  with app.app_context():
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=START, end_time=START + timedelta(hours=3)))
+    db.session.commit()
+    stats, refused = run_import([
+      show_row(1, 2, START + timedelta(hours=1)),       # venue 1 is booked
+      show_row(2, 3, START + timedelta(days=1)),
+      show_row(3, 3, START + timedelta(days=1, hours=2)),  # artist 3, earlier in the file
+      show_row(3, 3, START + timedelta(days=1, hours=3)),  # back to back
+    ])
+    assert stats["imported"] == 2
+    assert set(refused) == {2, 4}
+    assert 'venue_id' in refused[2] and 'artist_id' in refused[4]
+
+
+def test_a_failed_chunk_leaves_no_bookings_behind(app, monkeypatch):
+  add_shows(5, 5, 0)
+  insert = importer.ShowImport.insert
+  calls = []
+
+  def fail_first_chunk(self, rows):
+    calls.append(len(rows))
+    if len(calls) == 1:
+      raise OperationalError('INSERT', {}, Exception('disk I/O error'))
+    return insert(self, rows)
+
+  monkeypatch.setattr(importer.ShowImport, 'insert', fail_first_chunk)
+  with app.app_context():
+    stats, refused = run_import([
+      show_row(1, 1, START),
+      show_row(2, 2, START),
+      show_row(1, 1, START + timedelta(hours=1)),  # overlaps the failed chunk only
+      show_row(2, 2, START + timedelta(hours=1)),
+    ], chunk_size=2)
+    assert stats["imported"] == 2
+    assert set(refused) == {2, 3} and all('chunk' in errors for errors in refused.values())
+    assert db.session.query(Show.start_time).order_by(Show.venue_id).all() == [(START + timedelta(hours=1),)] * 2
+
+
+def test_overlaps_are_checked_with_a_fixed_number_of_queries_per_chunk(app):
+  add_shows(50, 50, 0)
+  rows = [show_row(n % 50 + 1, n % 50 + 1, START + timedelta(days=n // 50)) for n in range(1000)]
+  with app.app_context():
+    with captured_queries() as statements:
+      stats, refused = run_import(rows)
+    assert stats["imported"] == 1000 and not refused
+    checks = [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')
+              and '"Show"' in statement]
+    assert len(checks) == 2, '\n'.join(checks)
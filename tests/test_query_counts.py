@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Query counts of the read routes (see sqlstats.py).
+#
+# A page that goes back to loading its shows, artists or venues one query
+# per row (N+1) fails here: the detail pages must run the same fixed number
+# of statements however many shows they list, and every list, detail and
+# search route must stay within its declared @query_budget.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+from conftest import add_shows
+from sqlstats import captured_queries, check_query_budget
+
+# the page validator (see conditional.py), the venue or artist with its
+# genres, and its shows with the other side of each
+DETAIL_QUERIES = 3
+
+BUDGETED_ROUTES = [
+  '/venues',
+  '/artists',
+  '/shows',
+  '/venues/1',
+  '/artists/1',
+  '/venues/search?search_term=Venue',
+  '/artists/search?search_term=Artist',
+  '/search?q=jazz',
+  '/api/v1/venues',
+  '/api/v1/artists/1',
+  '/api/v1/shows',
+]
+
+
+@pytest.mark.parametrize('url', ['/venues/1', '/artists/1'])
+@pytest.mark.parametrize('shows', [2, 50])
+def test_detail_pages_run_a_fixed_number_of_queries(client, url, shows):
+  add_shows(10, 10, shows)
+  with captured_queries() as statements:
+    response = client.get(url)
+  assert response.status_code == 200
+  assert response.get_data(as_text=True).count('Artist ' if url.startswith('/venues') else 'Venue ') >= shows
+  assert len(statements) == DETAIL_QUERIES, '\n'.join(statements)
+
+
+@pytest.mark.parametrize('url', BUDGETED_ROUTES)
+def test_routes_stay_within_their_query_budget(client, url):
+  add_shows(30, 30, 60)
+  assert check_query_budget(client, url).status_code == 200
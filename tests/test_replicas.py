@@ -0,0 +1,83 @@
+#----------------------------------------------------------------------------#
+# Read replica routing (see replicas.py), with two SQLite files as the
+# primary and its replica (see conftest.py).
+#----------------------------------------------------------------------------#
+
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import event
+
+import replicas
+from conftest import PRIMARY, VENUE_FORM, add_shows
+from models import db
+
+
+@pytest.fixture
+def statements(app):
+  # the statements run on the primary and on the replica
+  recorded = {"primary": [], "replica": []}
+  with app.app_context():
+    engines = {"primary": db.engine, "replica": db.engines['replica_0']}
+  listeners = {name: (lambda conn, cursor, statement, *args, name=name: recorded[name].append(statement))
+               for name in engines}
+  for name, engine in engines.items():
+    event.listen(engine, 'before_cursor_execute', listeners[name])
+  add_shows(5, 5, 4)
+  yield recorded
+  for name, engine in engines.items():
+    event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+def clear(statements):
+  for recorded in statements.values():
+    del recorded[:]
+
+
+@pytest.mark.parametrize('url', ['/venues', '/venues/1', '/artists', '/artists/1', '/shows',
+                                 '/venues/search?search_term=Venue', '/api/v1/shows',
+                                 '/venues/near?lat=37.77&lng=-122.42'])
+def test_reads_go_to_the_replica(client, statements, url):
+  clear(statements)
+  assert client.get(url).status_code == 200
+  assert statements["replica"] and not statements["primary"]
+
+
+def test_writes_go_to_the_primary(client, statements):
+  clear(statements)
+  assert client.post('/venues/create', data=VENUE_FORM).status_code == 200
+  assert any(statement.lstrip().upper().startswith('INSERT') for statement in statements["primary"])
+  assert all(statement.lstrip().upper().startswith('SELECT') for statement in statements["replica"])
+  connection = sqlite3.connect(PRIMARY)
+  assert connection.execute('SELECT count(*) FROM "Venue" WHERE name = ?', (VENUE_FORM["name"],)).fetchone() == (1,)
+  connection.close()
+
+
+def test_writer_reads_its_writes_from_the_primary(app, client, statements):
+  reader = app.test_client()
+  assert client.post('/venues/create', data=VENUE_FORM).status_code == 200
+
+  # the replica has not caught up: the writer reads from the primary
+  clear(statements)
+  assert VENUE_FORM["name"] in client.get('/venues').get_data(as_text=True)
+  assert statements["primary"] and not statements["replica"]
+  # others still read from the replica
+  clear(statements)
+  assert VENUE_FORM["name"] not in reader.get('/venues').get_data(as_text=True)
+  assert statements["replica"] and not statements["primary"]
+
+  # once READ_YOUR_WRITES_SECONDS have passed, the writer is back on the replica
+  with client.session_transaction() as session:
+    assert session['primary_until'] > time.time()
+    session['primary_until'] = time.time() - 1
+  clear(statements)
+  assert client.get('/venues').status_code == 200
+  assert statements["replica"] and not statements["primary"]
+
+
+def test_reads_fall_back_to_the_primary_without_replicas(client, statements, monkeypatch):
+  monkeypatch.setattr(replicas, 'replica_engines', lambda: [])
+  clear(statements)
+  assert client.get('/venues/1').status_code == 200
+  assert statements["primary"] and not statements["replica"]
@@ -0,0 +1,21 @@
+#----------------------------------------------------------------------------#
+# Production entry point:
+#
+#   SECRET_KEY=... DATABASE_URL=... gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Importing app registers every route, hook and command on the application
+# created in models.py, configured from the environment (config.py).
+# Migrations are run separately, with `flask db upgrade`.
+#----------------------------------------------------------------------------#
+
+import os
+
+if not os.environ.get('SECRET_KEY'):
+  raise RuntimeError('SECRET_KEY is not set. It signs the session cookie (and so flash messages) '
+                     'and must be the same in every worker and across restarts.')
+
+os.environ.setdefault('MIGRATIONS', '0')
+
+from app import app
+
+application = app